@@ -0,0 +1,471 @@
+# bench/fake_discord.py
+"""負荷試験用のローカル Discord（REST + ゲートウェイ）
+
+本物の bot（main.create_bot）をそのまま繋ぐための最小限の実装。
+- REST: bot が使うルートだけ（メッセージ送信・チャンネル作成・ロール付与・インタラクション応答など）
+- ゲートウェイ: HELLO / IDENTIFY / READY / GUILD_CREATE / heartbeat と、こちらからのイベント送信
+- 遅延と 429 を注入できる（429 は discord.py が待って再送する形式で返す）
+フレームは非圧縮のテキストで送る（discord.py はテキストフレームをそのまま JSON として読む）。
+"""
+import asyncio
+import itertools
+import json
+import random
+import re
+import time
+from collections import defaultdict, deque
+
+from aiohttp import WSMsgType, web
+
+DISCORD_EPOCH = 1420070400000
+_seq = itertools.count()
+
+
+def snowflake() -> int:
+    ms = int(time.time() * 1000) - DISCORD_EPOCH
+    return (ms << 22) | (next(_seq) & 0x3FFFFF)
+
+
+def iso_now() -> str:
+    return time.strftime("%Y-%m-%dT%H:%M:%S+00:00", time.gmtime())
+
+
+def user_payload(user_id, name, bot=False):
+    return {"id": str(user_id), "username": name, "discriminator": "0", "global_name": name,
+            "avatar": None, "bot": bot, "public_flags": 0}
+
+
+def member_payload(user_id, name, roles=(), bot=False):
+    return {"user": user_payload(user_id, name, bot), "roles": [str(r) for r in roles], "nick": None,
+            "joined_at": iso_now(), "deaf": False, "mute": False, "flags": 0, "pending": False}
+
+
+def role_payload(role_id, name, permissions="0", position=0):
+    return {"id": str(role_id), "name": name, "permissions": permissions, "position": position, "color": 0,
+            "hoist": False, "managed": False, "mentionable": False, "icon": None, "unicode_emoji": None, "flags": 0}
+
+
+def channel_payload(channel_id, guild_id, name, type=0, parent_id=None, position=0, overwrites=()):
+    return {"id": str(channel_id), "guild_id": str(guild_id), "name": name, "type": type, "position": position,
+            "parent_id": str(parent_id) if parent_id else None, "permission_overwrites": list(overwrites),
+            "topic": None, "nsfw": False, "rate_limit_per_user": 0, "last_message_id": None, "flags": 0}
+
+
+def json_response(data, status=200, headers=None):
+    # discord.py は Content-Type が "application/json" ちょうどの時だけ JSON として読む（charset 付きは不可）
+    return web.Response(body=json.dumps(data).encode(), status=status,
+                        headers={"Content-Type": "application/json", **(headers or {})})
+
+
+class RestStats:
+    def __init__(self):
+        self.requests = 0
+        self.rate_limited = 0
+        self.unknown = defaultdict(int)
+        self.by_route = defaultdict(int)
+
+
+class FakeDiscord:
+    """1 ギルド分の状態を持つ偽 Discord
+
+    latency: REST 応答前の遅延（秒, (min, max)）
+    rate_limit_ratio: REST 呼び出しのうち 429 を返す割合
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, latency=(0.0, 0.0), rate_limit_ratio=0.0,
+                 retry_after=0.25, members=0, seed=None):
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.rate_limit_ratio = rate_limit_ratio
+        self.retry_after = retry_after
+        self.random = random.Random(seed)
+        self.stats = RestStats()
+
+        # ギルドの初期状態
+        self.application_id = snowflake()
+        self.bot_user_id = self.application_id
+        self.guild_id = snowflake()
+        self.owner_id = snowflake()  # 管理コマンドを打つユーザー（ギルドオーナー）
+        self.roles = {
+            self.guild_id: role_payload(self.guild_id, "@everyone", "0"),
+        }
+        self.verify_role_id = snowflake()
+        self.admin_role_id = snowflake()
+        self.roles[self.verify_role_id] = role_payload(self.verify_role_id, "verified", "0", 1)
+        self.roles[self.admin_role_id] = role_payload(self.admin_role_id, "staff", "0", 2)
+        self.category_id = snowflake()
+        self.panel_channel_id = snowflake()
+        self.general_channel_id = snowflake()
+        self.log_channel_id = snowflake()
+        self.channels = {
+            self.category_id: channel_payload(self.category_id, self.guild_id, "tickets", type=4),
+            self.panel_channel_id: channel_payload(self.panel_channel_id, self.guild_id, "panel"),
+            self.general_channel_id: channel_payload(self.general_channel_id, self.guild_id, "general"),
+            self.log_channel_id: channel_payload(self.log_channel_id, self.guild_id, "ticket-log"),
+        }
+        self.members = {
+            self.owner_id: member_payload(self.owner_id, "owner"),
+            self.bot_user_id: member_payload(self.bot_user_id, "ticket-bot", bot=True),
+        }
+        self.users = [snowflake() for _ in range(members)]  # トラフィック用のユーザー（キャッシュには載せない）
+
+        # 記録
+        self.messages = defaultdict(list)  # channel_id -> [message payload]
+        self.message_listeners = []        # callback(channel_id, payload)
+        self.interaction_listeners = []    # callback(interaction_id, kind, payload)
+        self.followups = defaultdict(int)  # token -> 件数
+        self.role_grants = 0
+        self.channels_created = 0
+
+        self._sockets = set()
+        self._ready = asyncio.Event()
+        self._runner = None
+        self._gateway_seq = 0
+
+    # ---------- 起動 / 停止 ----------
+    @property
+    def base_url(self):
+        return f"http://{self.host}:{self.port}"
+
+    async def start(self):
+        app = web.Application(middlewares=[self._middleware], client_max_size=64 * 1024 * 1024)
+        app.router.add_get("/gateway", self._ws_handler)
+        app.router.add_route("*", "/api/v10/{tail:.*}", self._rest_handler)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+        self.port = self._runner.addresses[0][1]  # port=0 の時は OS が選んだ番号
+        return self
+
+    async def stop(self):
+        for ws in list(self._sockets):
+            await ws.close()
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+    def patch_discord(self):
+        """discord.py の API 送信先をこのサーバーに向ける"""
+        import discord.gateway
+        import discord.http
+        import discord.webhook.async_
+        import yarl
+        base = f"{self.base_url}/api/v10"
+        discord.http.Route.BASE = base
+        discord.webhook.async_.Route.BASE = base
+        # シャードなしの Client は /gateway/bot を聞かずに既定の URL へ繋ぐ
+        discord.gateway.DiscordWebSocket.DEFAULT_GATEWAY = yarl.URL(f"ws://{self.host}:{self.port}/gateway")
+
+    async def wait_ready(self, timeout=30):
+        await asyncio.wait_for(self._ready.wait(), timeout)
+
+    # ---------- REST ----------
+    @web.middleware
+    async def _middleware(self, request, handler):
+        if request.path.startswith("/api/"):
+            self.stats.requests += 1
+            lo, hi = self.latency
+            if hi > 0:
+                await asyncio.sleep(self.random.uniform(lo, hi))
+            if (self.rate_limit_ratio and request.path not in ("/api/v10/users/@me", "/api/v10/gateway/bot")
+                    and self.random.random() < self.rate_limit_ratio):
+                self.stats.rate_limited += 1
+                # Via が無い 429 は Cloudflare の BAN 扱いになるので付ける
+                return json_response(
+                    {"message": "You are being rate limited.", "retry_after": self.retry_after, "global": False},
+                    status=429,
+                    headers={"Via": "1.1 google", "Retry-After": str(self.retry_after),
+                             "X-RateLimit-Scope": "user", "X-RateLimit-Limit": "5",
+                             "X-RateLimit-Remaining": "0", "X-RateLimit-Reset-After": str(self.retry_after),
+                             "X-RateLimit-Bucket": "fake"},
+                )
+        return await handler(request)
+
+    ROUTES = [
+        ("GET", r"/users/@me", "_get_me"),
+        ("GET", r"/oauth2/applications/@me", "_get_app"),
+        ("GET", r"/gateway/bot", "_get_gateway"),
+        ("POST", r"/channels/(\d+)/messages", "_post_message"),
+        ("GET", r"/channels/(\d+)/messages", "_get_messages"),
+        ("PATCH", r"/channels/(\d+)/messages/(\d+)", "_edit_message"),
+        ("DELETE", r"/channels/(\d+)", "_delete_channel"),
+        ("PUT", r"/channels/(\d+)/permissions/(\d+)", "_no_content"),
+        ("POST", r"/guilds/(\d+)/channels", "_create_channel"),
+        ("GET", r"/guilds/(\d+)/members/(\d+)", "_get_member"),
+        ("PUT", r"/guilds/(\d+)/members/(\d+)/roles/(\d+)", "_add_role"),
+        ("POST", r"/interactions/(\d+)/([^/]+)/callback", "_interaction_callback"),
+        ("POST", r"/webhooks/(\d+)/([^/]+)", "_followup"),
+        ("PATCH", r"/webhooks/(\d+)/([^/]+)/messages/([^/]+)", "_edit_followup"),
+    ]
+    _compiled = [(m, re.compile(p + "$"), h) for m, p, h in ROUTES]
+
+    async def _rest_handler(self, request):
+        path = "/" + request.match_info["tail"]
+        for method, pattern, name in self._compiled:
+            if method == request.method:
+                m = pattern.match(path)
+                if m:
+                    self.stats.by_route[f"{method} {pattern.pattern[:-1]}"] += 1
+                    return await getattr(self, name)(request, *m.groups())
+        self.stats.unknown[f"{request.method} {path}"] += 1
+        return json_response({"message": "404: Not Found", "code": 0}, status=404)
+
+    @staticmethod
+    async def _read_payload(request):
+        # multipart（添付ファイル付き）は payload_json を取り出す
+        if request.content_type.startswith("multipart/"):
+            payload = {}
+            reader = await request.multipart()
+            async for part in reader:
+                if part.name == "payload_json":
+                    payload = json.loads(await part.text())
+                else:
+                    await part.read()  # 中身は捨てる
+            return payload
+        if request.can_read_body:
+            try:
+                return await request.json()
+            except Exception:
+                return {}
+        return {}
+
+    async def _get_me(self, request):
+        return json_response(user_payload(self.bot_user_id, "ticket-bot", bot=True))
+
+    async def _get_app(self, request):
+        return json_response({
+            "id": str(self.application_id), "name": "ticket-bot", "icon": None, "description": "",
+            "rpc_origins": [], "bot_public": True, "bot_require_code_grant": False,
+            "owner": user_payload(self.owner_id, "owner"), "team": None, "verify_key": "0" * 64,
+            "flags": 0, "summary": "", "tags": [], "redirect_uris": [],
+        })
+
+    async def _get_gateway(self, request):
+        return json_response({
+            "url": f"ws://{self.host}:{self.port}/gateway", "shards": 1,
+            "session_start_limit": {"total": 1000, "remaining": 1000, "reset_after": 0, "max_concurrency": 1},
+        })
+
+    def _message(self, channel_id, payload, author_id=None):
+        author_id = author_id or self.bot_user_id
+        msg = {
+            "id": str(snowflake()), "channel_id": str(channel_id), "guild_id": str(self.guild_id),
+            "author": user_payload(author_id, "ticket-bot", bot=True),
+            "content": payload.get("content") or "", "timestamp": iso_now(), "edited_timestamp": None,
+            "tts": False, "mention_everyone": False, "mentions": [], "mention_roles": [], "attachments": [],
+            "embeds": payload.get("embeds") or [], "components": payload.get("components") or [],
+            "pinned": False, "type": 0, "flags": payload.get("flags", 0),
+        }
+        return msg
+
+    async def _post_message(self, request, channel_id):
+        payload = await self._read_payload(request)
+        msg = self._message(channel_id, payload)
+        self.messages[int(channel_id)].append(msg)
+        for cb in self.message_listeners:
+            cb(int(channel_id), msg)
+        return json_response(msg)
+
+    async def _get_messages(self, request, channel_id):
+        msgs = self.messages.get(int(channel_id), [])
+        limit = int(request.query.get("limit", 100))
+        after = request.query.get("after")
+        if after:
+            msgs = [m for m in msgs if int(m["id"]) > int(after)][:limit]
+        else:
+            msgs = list(reversed(msgs))[:limit]  # 新しい順
+        return json_response(msgs)
+
+    async def _edit_message(self, request, channel_id, message_id):
+        payload = await self._read_payload(request)
+        return json_response(self._message(channel_id, payload) | {"id": message_id})
+
+    async def _no_content(self, request, *args):
+        return web.Response(status=204)
+
+    async def _create_channel(self, request, guild_id):
+        payload = await self._read_payload(request)
+        cid = snowflake()
+        ch = channel_payload(cid, self.guild_id, payload.get("name", "channel"), payload.get("type", 0),
+                             payload.get("parent_id"), overwrites=payload.get("permission_overwrites") or ())
+        self.channels[cid] = ch
+        self.channels_created += 1
+        await self.dispatch("CHANNEL_CREATE", ch)
+        return json_response(ch)
+
+    async def _delete_channel(self, request, channel_id):
+        ch = self.channels.pop(int(channel_id), None)
+        if ch is None:
+            return json_response({"message": "Unknown Channel", "code": 10003}, status=404)
+        await self.dispatch("CHANNEL_DELETE", ch)
+        return json_response(ch)
+
+    async def _get_member(self, request, guild_id, user_id):
+        member = self.members.get(int(user_id)) or member_payload(int(user_id), f"user{user_id}")
+        return json_response(member)
+
+    async def _add_role(self, request, guild_id, user_id, role_id):
+        self.role_grants += 1
+        return web.Response(status=204)
+
+    async def _interaction_callback(self, request, interaction_id, token):
+        payload = await self._read_payload(request)
+        for cb in self.interaction_listeners:
+            cb(int(interaction_id), payload.get("type"), payload)
+        if request.query.get("with_response") in ("1", "true"):
+            return json_response({"interaction": {
+                "id": interaction_id, "type": 3, "response_message_id": None,
+                "response_message_loading": payload.get("type") == 5, "response_message_ephemeral": True,
+            }})
+        return web.Response(status=204)
+
+    async def _followup(self, request, application_id, token):
+        payload = await self._read_payload(request)
+        self.followups[token] += 1
+        return json_response(self._message(self.panel_channel_id, payload))
+
+    async def _edit_followup(self, request, application_id, token, message_id):
+        payload = await self._read_payload(request)
+        return json_response(self._message(self.panel_channel_id, payload))
+
+    # ---------- ゲートウェイ ----------
+    def guild_payload(self):
+        return {
+            "id": str(self.guild_id), "name": "load-test", "icon": None, "owner_id": str(self.owner_id),
+            "roles": list(self.roles.values()), "channels": list(self.channels.values()),
+            "members": list(self.members.values()), "member_count": len(self.members) + len(self.users),
+            "large": False, "unavailable": False, "features": [], "emojis": [], "stickers": [], "threads": [],
+            "presences": [], "voice_states": [], "stage_instances": [], "guild_scheduled_events": [],
+            "verification_level": 0, "default_message_notifications": 0, "explicit_content_filter": 0,
+            "mfa_level": 0, "premium_tier": 0, "nsfw_level": 0, "afk_timeout": 300, "system_channel_flags": 0,
+            "preferred_locale": "ja", "joined_at": iso_now(), "premium_subscription_count": 0,
+        }
+
+    async def _send(self, ws, op, d=None, t=None):
+        payload = {"op": op, "d": d, "s": None, "t": t}
+        if op == 0:
+            self._gateway_seq += 1
+            payload["s"] = self._gateway_seq
+        await ws.send_str(json.dumps(payload))
+
+    async def dispatch(self, event, data):
+        for ws in list(self._sockets):
+            try:
+                await self._send(ws, 0, data, event)
+            except ConnectionResetError:
+                self._sockets.discard(ws)
+
+    async def _ws_handler(self, request):
+        ws = web.WebSocketResponse(max_msg_size=0)
+        await ws.prepare(request)
+        await self._send(ws, 10, {"heartbeat_interval": 41250})
+        try:
+            async for msg in ws:
+                if msg.type != WSMsgType.TEXT:
+                    continue
+                data = json.loads(msg.data)
+                op = data.get("op")
+                if op == 1:
+                    await self._send(ws, 11)
+                elif op == 2:
+                    self._sockets.add(ws)
+                    await self._send(ws, 0, {
+                        "v": 10, "user": user_payload(self.bot_user_id, "ticket-bot", bot=True),
+                        "guilds": [{"id": str(self.guild_id), "unavailable": True}],
+                        "session_id": "fake-session", "resume_gateway_url": f"ws://{self.host}:{self.port}/gateway",
+                        "application": {"id": str(self.application_id), "flags": 0},
+                    }, "READY")
+                    await self._send(ws, 0, self.guild_payload(), "GUILD_CREATE")
+                    self._ready.set()
+                elif op == 8:
+                    await self._send(ws, 0, {
+                        "guild_id": str(self.guild_id), "members": list(self.members.values()),
+                        "chunk_index": 0, "chunk_count": 1, "nonce": data["d"].get("nonce"),
+                    }, "GUILD_MEMBERS_CHUNK")
+        finally:
+            self._sockets.discard(ws)
+        return ws
+
+    # ---------- トラフィック生成 ----------
+    def user_message(self, channel_id, user_id, content, name=None):
+        return {
+            "id": str(snowflake()), "channel_id": str(channel_id), "guild_id": str(self.guild_id),
+            "author": user_payload(user_id, name or f"user{user_id}"),
+            "member": {k: v for k, v in member_payload(user_id, name or f"user{user_id}").items() if k != "user"},
+            "content": content, "timestamp": iso_now(), "edited_timestamp": None, "tts": False,
+            "mention_everyone": False, "mentions": [], "mention_roles": [], "attachments": [], "embeds": [],
+            "components": [], "pinned": False, "type": 0, "flags": 0,
+        }
+
+    async def send_message(self, channel_id, user_id, content, name=None):
+        msg = self.user_message(channel_id, user_id, content, name)
+        await self.dispatch("MESSAGE_CREATE", msg)
+        return msg
+
+    async def click(self, message, custom_id, user_id, roles=()):
+        """ボタンを押す（INTERACTION_CREATE を送り、interaction_id を返す）"""
+        iid = snowflake()
+        channel_id = int(message["channel_id"])
+        channel = self.channels.get(channel_id) or channel_payload(channel_id, self.guild_id, "unknown")
+        member = member_payload(user_id, f"user{user_id}", roles)
+        member["permissions"] = "0"
+        await self.dispatch("INTERACTION_CREATE", {
+            "id": str(iid), "application_id": str(self.application_id), "type": 3,
+            "token": f"tok-{iid}", "version": 1, "guild_id": str(self.guild_id),
+            "channel_id": str(channel_id), "channel": channel, "member": member, "message": message,
+            "data": {"custom_id": custom_id, "component_type": 2}, "locale": "ja", "guild_locale": "ja",
+            "app_permissions": "0", "entitlements": [], "attachment_size_limit": 8 * 1024 * 1024, "authorizing_integration_owners": {}, "context": 0,
+        })
+        return iid
+
+    @staticmethod
+    def custom_ids(message):
+        return [c["custom_id"] for row in message.get("components", []) for c in row.get("components", [])
+                if "custom_id" in c]
+
+    def wait_message(self, channel_id, predicate=lambda m: True, timeout=10):
+        """channel_id に条件を満たすメッセージが送られるのを待つ"""
+        loop = asyncio.get_running_loop()
+        fut = loop.create_future()
+
+        def listener(cid, msg):
+            if cid == channel_id and not fut.done() and predicate(msg):
+                fut.set_result(msg)
+
+        self.message_listeners.append(listener)
+
+        async def waiter():
+            try:
+                return await asyncio.wait_for(fut, timeout)
+            finally:
+                self.message_listeners.remove(listener)
+        return waiter()
+
+
+class LatencyRecorder:
+    """送信時刻から応答までの時間を種類ごとに集める"""
+
+    def __init__(self):
+        self.pending = {}                 # key -> (kind, 送信時刻)
+        self.samples = defaultdict(list)  # kind -> [秒]
+        self.sent = defaultdict(int)
+        self.fifo = defaultdict(deque)    # channel_id -> 送信時刻（順番で対応づけるもの）
+
+    def start(self, key, kind):
+        self.pending[key] = (kind, time.perf_counter())
+        self.sent[kind] += 1
+
+    def finish(self, key):
+        item = self.pending.pop(key, None)
+        if item is not None:
+            kind, t0 = item
+            self.samples[kind].append(time.perf_counter() - t0)
+
+    def start_fifo(self, channel_id, kind):
+        self.fifo[channel_id].append(time.perf_counter())
+        self.sent[kind] += 1
+
+    def finish_fifo(self, channel_id, kind):
+        q = self.fifo.get(channel_id)
+        if q:
+            self.samples[kind].append(time.perf_counter() - q.popleft())
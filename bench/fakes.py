@@ -0,0 +1,146 @@
+# bench/fakes.py
+"""ネットワーク無しで Cog / utils を動かすための最小限の偽 discord オブジェクト"""
+import bisect
+import itertools
+from datetime import datetime, timedelta, timezone
+
+_ids = itertools.count(1_000_000_000_000_000)
+
+
+def next_id():
+    return next(_ids)
+
+
+class FakePermissions:
+    def __init__(self, administrator=False, manage_guild=False):
+        self.administrator = administrator
+        self.manage_guild = manage_guild
+
+
+class FakeRole:
+    def __init__(self, guild, role_id=None, name="role"):
+        self.id = role_id or next_id()
+        self.guild = guild
+        self.name = name
+        self.mention = f"<@&{self.id}>"
+
+
+class FakeMember:
+    def __init__(self, guild, member_id=None, name="user", roles=(), bot=False, permissions=None):
+        self.id = member_id or next_id()
+        self.guild = guild
+        self.name = name
+        self.display_name = name
+        self.bot = bot
+        self.roles = list(roles)
+        self.guild_permissions = permissions or FakePermissions()
+        self.mention = f"<@{self.id}>"
+
+    def __str__(self):
+        return self.name
+
+
+class FakeAttachment:
+    def __init__(self, url):
+        self.url = url
+
+
+class FakeMessage:
+    def __init__(self, channel, author, content, created_at, message_id=None, attachments=(), embeds=0):
+        self.id = message_id or next_id()
+        self.channel = channel
+        self.guild = channel.guild
+        self.author = author
+        self.content = content
+        self.created_at = created_at
+        self.attachments = [FakeAttachment(u) for u in attachments]
+        self.embeds = [None] * embeds
+
+    def is_system(self):
+        return False
+
+
+class FakeChannel:
+    """history() はメモリ上のメッセージを返す。send() は送信内容を数えるだけ"""
+
+    def __init__(self, guild, name="ticket-1-user", channel_id=None):
+        self.id = channel_id or next_id()
+        self.guild = guild
+        self.name = name
+        self.mention = f"<#{self.id}>"
+        self.messages = []
+        self._ids = []  # messages の ID（昇順。after= の検索用）
+        self.sent = 0
+
+    def fill(self, count, authors, attachment_every=25, embed_every=40):
+        start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+        base = next_id()
+        for i in range(count):
+            author = authors[i % len(authors)]
+            attachments = [f"https://cdn.example.invalid/{base + i}/file.png"] if attachment_every and i % attachment_every == 0 else ()
+            self.messages.append(FakeMessage(
+                self, author,
+                f"メッセージ {i}: <テスト> & サポートの内容です。\n2 行目の本文 {i * 7}",
+                start + timedelta(seconds=i),
+                message_id=base + i * 2,
+                attachments=attachments,
+                embeds=1 if embed_every and i % embed_every == 0 else 0,
+            ))
+        self._ids = [m.id for m in self.messages]
+        # 採番を進めておく（後続の ID と重ならないように）
+        for _ in range(count * 2):
+            next_id()
+        return self
+
+    async def history(self, limit=None, oldest_first=None, after=None, before=None):
+        msgs = self.messages
+        if after is not None:
+            msgs = msgs[bisect.bisect_right(self._ids, after.id):]
+        if not oldest_first:
+            msgs = list(reversed(msgs))
+        if limit is not None:
+            msgs = msgs[:limit]
+        for m in msgs:
+            yield m
+
+    async def send(self, *args, **kwargs):
+        self.sent += 1
+
+
+class FakeGuild:
+    def __init__(self, guild_id=None, name="bench-guild"):
+        self.id = guild_id or next_id()
+        self.name = name
+        self.filesize_limit = 8 * 1024 * 1024
+        self.roles = []
+        self.default_role = FakeRole(self, self.id, "@everyone")
+
+    def add_roles(self, count):
+        self.roles.extend(FakeRole(self, name=f"role-{i}") for i in range(count))
+        return self.roles
+
+    def get_role(self, role_id):
+        for r in self.roles:
+            if r.id == role_id:
+                return r
+        return None
+
+
+class FakeIntents:
+    def __init__(self, members=True):
+        self.members = members
+
+
+class FakeBot:
+    """Cog のコンストラクタ / cog_load が触る属性だけ"""
+
+    def __init__(self):
+        self.intents = FakeIntents()
+        self.guilds = []
+        self.listeners = {}
+
+    def add_listener(self, func, name=None):
+        self.listeners.setdefault(name or func.__name__, []).append(func)
+
+    def get_cog(self, name):
+        return None
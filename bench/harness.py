@@ -0,0 +1,161 @@
+# bench/harness.py
+import asyncio
+import gc
+import inspect
+import json
+import os
+import platform
+import statistics
+import time
+import tracemalloc
+
+BASELINE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines")
+
+
+class Case:
+    """ベンチマーク 1 件
+
+    fn は 1 回の呼び出し（同期 / async どちらでも）。ops は 1 回で処理する件数（メッセージ数など）。
+    setup / teardown は計測に含めない。
+    """
+
+    def __init__(self, name, fn, ops=1, repeat=200, warmup=5, setup=None, teardown=None):
+        self.name = name
+        self.fn = fn
+        self.ops = ops
+        self.repeat = repeat
+        self.warmup = warmup
+        self.setup = setup
+        self.teardown = teardown
+
+
+async def _call(fn):
+    result = fn()
+    if inspect.isawaitable(result):
+        result = await result
+    return result
+
+
+def _percentile(sorted_values, q):
+    if not sorted_values:
+        return 0.0
+    k = (len(sorted_values) - 1) * q
+    lo = int(k)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+
+async def run_case(case: Case) -> dict:
+    if case.setup is not None:
+        await _call(case.setup)
+    try:
+        for _ in range(case.warmup):
+            await _call(case.fn)
+
+        # 時間計測（tracemalloc は遅くなるので別に測る）
+        gc.collect()
+        samples = []
+        total_start = time.perf_counter()
+        for _ in range(case.repeat):
+            start = time.perf_counter()
+            await _call(case.fn)
+            samples.append(time.perf_counter() - start)
+        total = time.perf_counter() - total_start
+
+        # ピークメモリ（1 回分）
+        gc.collect()
+        tracemalloc.start()
+        try:
+            await _call(case.fn)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+    finally:
+        if case.teardown is not None:
+            await _call(case.teardown)
+
+    samples.sort()
+    return {
+        "name": case.name,
+        "calls": case.repeat,
+        "ops_per_call": case.ops,
+        "throughput": case.ops * case.repeat / total if total > 0 else 0.0,  # ops/s
+        "mean": statistics.fmean(samples),
+        "p50": _percentile(samples, 0.50),
+        "p95": _percentile(samples, 0.95),
+        "p99": _percentile(samples, 0.99),
+        "max": samples[-1],
+        "peak_kb": peak / 1024,
+    }
+
+
+async def run_cases(cases, verbose=True):
+    results = []
+    for case in cases:
+        res = await run_case(case)
+        results.append(res)
+        if verbose:
+            print(format_result(res), flush=True)
+    return results
+
+
+def _ms(seconds):
+    return f"{seconds * 1000:9.3f}ms"
+
+
+def format_result(r) -> str:
+    return (
+        f"{r['name']:<36} {r['throughput']:>12.1f} ops/s  "
+        f"p50 {_ms(r['p50'])} p95 {_ms(r['p95'])} p99 {_ms(r['p99'])}  peak {r['peak_kb']:>10.1f}KB"
+    )
+
+
+# -------------------------
+# ベースライン
+# -------------------------
+def baseline_path(name) -> str:
+    return os.path.join(BASELINE_DIR, f"{name}.json")
+
+
+def save_baseline(name, results):
+    os.makedirs(BASELINE_DIR, exist_ok=True)
+    payload = {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "results": {r["name"]: r for r in results},
+    }
+    with open(baseline_path(name), "w", encoding="utf-8") as f:
+        json.dump(payload, f, ensure_ascii=False, indent=2)
+    return baseline_path(name)
+
+
+def load_baseline(name):
+    with open(baseline_path(name), "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def compare(results, baseline, threshold=0.2):
+    """ベースラインとの差分を表示し、悪化したケース名を返す
+
+    スループットが threshold 以上落ちた / p95 が threshold 以上伸びた / ピークメモリが threshold 以上増えたら悪化。
+    """
+    old = baseline["results"]
+    regressions = []
+    for r in results:
+        b = old.get(r["name"])
+        if b is None:
+            print(f"{r['name']:<36} （ベースラインなし）")
+            continue
+        d_tp = r["throughput"] / b["throughput"] - 1 if b["throughput"] else 0.0
+        d_p95 = r["p95"] / b["p95"] - 1 if b["p95"] else 0.0
+        d_mem = r["peak_kb"] / b["peak_kb"] - 1 if b["peak_kb"] else 0.0
+        bad = d_tp < -threshold or d_p95 > threshold or d_mem > threshold
+        if bad:
+            regressions.append(r["name"])
+        print(f"{r['name']:<36} throughput {d_tp:+7.1%}  p95 {d_p95:+7.1%}  peak {d_mem:+7.1%}{'  ⚠️' if bad else ''}")
+    return regressions
+
+
+def run(coro):
+    return asyncio.run(coro)
@@ -0,0 +1,203 @@
+# bench/loadtest.py
+"""本物の bot（main.create_bot, 3 Cog）をローカルの偽 Discord に繋いで負荷をかける
+
+    python -m bench.loadtest --tickets 2000 --verifies 2000 --greetings 5000 --rate 200
+    python -m bench.loadtest --latency-ms 20:120 --rate-limit 0.02 --json result.json
+
+インタラクション（チケット作成 / 認証ボタン）は INTERACTION_CREATE を送ってから
+応答（/callback）が届くまで、あいさつは MESSAGE_CREATE から返信の送信までを測る。
+Discord はインタラクションに 3 秒以内の応答を求めるので、それを超えたものは失敗として数える。
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from bench.fake_discord import FakeDiscord, LatencyRecorder  # noqa: E402
+from bench.harness import _percentile  # noqa: E402
+
+ACK_DEADLINE = 3.0
+GREETINGS = ("おはよう", "おやすみ", "こんにちは", "こんばんは", "ただいま", "いってきます")
+
+
+def write_configs(fake):
+    # ギルド設定は起動前にファイルで用意（チケットカテゴリ・ログ・認証ロール）
+    gid = str(fake.guild_id)
+    with open("ticket_config.json", "w", encoding="utf-8") as f:
+        json.dump({"guilds": {gid: {
+            "log_channel_id": fake.log_channel_id, "ticket_count": 0, "verify_role_id": fake.verify_role_id,
+            "ticket_category_id": fake.category_id, "admin_role_ids": [fake.admin_role_id], "whitelist_user_ids": [],
+        }}, "tickets": {}}, f)
+    with open("config.json", "w", encoding="utf-8") as f:
+        json.dump({"guilds": {gid: {"verify_role": fake.verify_role_id, "verify_log": fake.log_channel_id}}}, f)
+
+
+async def post_panel(fake, command):
+    waiter = fake.wait_message(fake.panel_channel_id, lambda m: FakeDiscord.custom_ids(m))
+    await fake.send_message(fake.panel_channel_id, fake.owner_id, command, "owner")
+    return await waiter
+
+
+def summarize(kind, rec, deadline=None):
+    samples = sorted(rec.samples.get(kind, []))
+    sent = rec.sent.get(kind, 0)
+    late = sum(1 for s in samples if deadline is not None and s > deadline)
+    missing = sent - len(samples)
+    return {
+        "sent": sent,
+        "answered": len(samples),
+        "missing": missing,
+        "late": late,
+        "failure_rate": (missing + late) / sent if sent else 0.0,
+        "p50": _percentile(samples, 0.50),
+        "p95": _percentile(samples, 0.95),
+        "p99": _percentile(samples, 0.99),
+        "max": samples[-1] if samples else 0.0,
+    }
+
+
+def print_report(report):
+    print("\n===== 結果 =====")
+    print(f"送信レート: {report['rate']:.0f}/s  所要: {report['elapsed']:.1f}s")
+    for kind, s in report["kinds"].items():
+        print(
+            f"{kind:<10} 送信 {s['sent']:>6}  応答 {s['answered']:>6}  未応答 {s['missing']:>5}  "
+            f"3s超 {s['late']:>5}  失敗率 {s['failure_rate']:6.2%}  "
+            f"p50 {s['p50'] * 1000:8.1f}ms  p95 {s['p95'] * 1000:8.1f}ms  p99 {s['p99'] * 1000:8.1f}ms  max {s['max'] * 1000:8.1f}ms"
+        )
+    rest = report["rest"]
+    print(f"REST: {rest['requests']}件 / 429 注入 {rest['rate_limited']}件 / 未対応ルート {sum(rest['unknown'].values())}件")
+    for route, n in sorted(rest["unknown"].items(), key=lambda kv: -kv[1])[:10]:
+        print(f"  未対応: {route} x{n}")
+    print(f"作成チャンネル {report['channels_created']} / ロール付与 {report['role_grants']} / followup {report['followups']}")
+
+
+async def run_load(args):
+    fake = FakeDiscord(latency=(args.latency[0] / 1000, args.latency[1] / 1000), rate_limit_ratio=args.rate_limit,
+                       retry_after=args.retry_after, members=max(args.tickets, args.verifies, 1), seed=args.seed)
+    await fake.start()
+    fake.patch_discord()
+    write_configs(fake)
+
+    from main import create_bot
+    bot = create_bot(profile=args.profile, metrics_port=None)
+    bot_task = asyncio.create_task(bot.start("fake-token"))
+    rec = LatencyRecorder()
+    try:
+        ready = asyncio.create_task(bot.wait_until_ready())
+        done, _ = await asyncio.wait({ready, bot_task}, timeout=args.startup_timeout, return_when=asyncio.FIRST_COMPLETED)
+        if bot_task in done:
+            ready.cancel()
+            bot_task.result()  # 起動失敗（例外をそのまま出す）
+        if ready not in done:
+            ready.cancel()
+            raise TimeoutError("bot が READY になりませんでした")
+        ticket_panel = await post_panel(fake, "!setticket")
+        verify_panel = await post_panel(fake, "!setverify")
+        ticket_button = FakeDiscord.custom_ids(ticket_panel)[0]
+        verify_button = FakeDiscord.custom_ids(verify_panel)[0]
+
+        fake.interaction_listeners.append(lambda iid, type, payload: rec.finish(iid))
+        general = fake.general_channel_id
+        fake.message_listeners.append(lambda cid, msg: rec.finish_fifo(cid, "greeting") if cid == general else None)
+
+        rnd = random.Random(args.seed)
+        users = list(fake.users)
+        events = (
+            [("ticket", users[i % len(users)]) for i in range(args.tickets)]
+            + [("verify", users[i % len(users)]) for i in range(args.verifies)]
+            + [("greeting", users[i % len(users)]) for i in range(args.greetings)]
+        )
+        rnd.shuffle(events)
+
+        start = time.perf_counter()
+        for i, (kind, user) in enumerate(events):
+            if bot_task.done():
+                bot_task.result()  # 途中で bot が落ちた
+            delay = start + i / args.rate - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            if kind == "ticket":
+                rec.start(await fake.click(ticket_panel, ticket_button, user), "ticket")
+            elif kind == "verify":
+                rec.start(await fake.click(verify_panel, verify_button, user), "verify")
+            else:
+                rec.start_fifo(general, "greeting")
+                await fake.send_message(general, user, rnd.choice(GREETINGS))
+
+        # 残りの応答を待つ
+        deadline = time.perf_counter() + args.drain
+        while (rec.pending or any(rec.fifo.values())) and time.perf_counter() < deadline:
+            await asyncio.sleep(0.1)
+        elapsed = time.perf_counter() - start
+    finally:
+        await bot.close()
+        try:
+            await asyncio.wait_for(bot_task, 30)
+        except Exception:
+            pass
+        await fake.stop()
+
+    return {
+        "rate": args.rate,
+        "elapsed": elapsed,
+        "kinds": {
+            "ticket": summarize("ticket", rec, ACK_DEADLINE),
+            "verify": summarize("verify", rec, ACK_DEADLINE),
+            "greeting": summarize("greeting", rec),
+        },
+        "rest": {"requests": fake.stats.requests, "rate_limited": fake.stats.rate_limited,
+                 "unknown": dict(fake.stats.unknown), "by_route": dict(fake.stats.by_route)},
+        "channels_created": fake.channels_created,
+        "role_grants": fake.role_grants,
+        "followups": sum(fake.followups.values()),
+    }
+
+
+def _latency(value):
+    lo, _, hi = value.partition(":")
+    return float(lo), float(hi or lo)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="偽 Discord を使ったエンドツーエンド負荷試験")
+    parser.add_argument("--tickets", type=int, default=1000, help="チケット作成クリック数")
+    parser.add_argument("--verifies", type=int, default=1000, help="認証クリック数")
+    parser.add_argument("--greetings", type=int, default=3000, help="あいさつメッセージ数")
+    parser.add_argument("--rate", type=float, default=100.0, help="1 秒あたりのイベント数")
+    parser.add_argument("--latency-ms", dest="latency", type=_latency, default=(0.0, 0.0), help="REST の遅延 MIN:MAX（ミリ秒）")
+    parser.add_argument("--rate-limit", type=float, default=0.0, help="429 を返す割合（0〜1）")
+    parser.add_argument("--retry-after", type=float, default=0.25, help="429 の retry_after（秒）")
+    parser.add_argument("--profile", choices=("full", "lean"), default=None, help="ゲートウェイプロファイル")
+    parser.add_argument("--drain", type=float, default=30.0, help="送信後に応答を待つ最大秒数")
+    parser.add_argument("--startup-timeout", type=float, default=30.0)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", metavar="PATH", help="結果を JSON で保存")
+    args = parser.parse_args(argv)
+
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix="ticket-load-") as tmp:
+        os.chdir(tmp)  # 設定・チケットログ・トランスクリプトは一時ディレクトリに作る
+        try:
+            report = asyncio.run(run_load(args))
+        finally:
+            os.chdir(cwd)
+
+    print_report(report)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    failed = any(k["failure_rate"] > 0 for k in report["kinds"].values())
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,383 @@
+# bench/run.py
+"""オフラインのマイクロベンチマーク
+
+    python -m bench.run                 # 全ケース（1k / 10k / 100k メッセージ）
+    python -m bench.run --quick         # 100k を除く
+    python -m bench.run --only config   # 名前に "config" を含むケースだけ
+    python -m bench.run --save main     # bench/baselines/main.json に保存
+    python -m bench.run --compare main  # main.json と比較（--fail-on-regression で悪化時に終了コード 1）
+
+ファイルを書くケースは一時ディレクトリの中で動かす（リポジトリの設定ファイルには触らない）。
+"""
+import argparse
+import glob
+import json
+import os
+import shutil
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from bench.fakes import FakeBot, FakeChannel, FakeGuild, FakeMember, FakeMessage, FakePermissions, next_id  # noqa: E402
+from bench.harness import Case, compare, load_baseline, run, run_cases, save_baseline  # noqa: E402
+
+MESSAGE_SIZES = (1_000, 10_000, 100_000)
+TICKET_SIZES = (1_000, 10_000, 100_000)
+
+
+def _repeat_for(n):
+    # 大きいケースは回数を減らす（合計時間を抑える）
+    return max(2, min(50, 200_000 // n // 4))
+
+
+def _remove(pattern):
+    for p in glob.glob(pattern):
+        try:
+            os.remove(p)
+        except OSError:
+            pass
+
+
+# -------------------------
+# トランスクリプト（generate_html_log_static）
+# -------------------------
+def transcript_cases(sizes):
+    from cogs.ticket import TicketCog
+    from utils.message_log import MessageLog, message_record
+
+    cases = []
+    for n in sizes:
+        guild = FakeGuild()
+        authors = [FakeMember(guild, name=f"user{i}") for i in range(5)]
+        channel = FakeChannel(guild, name=f"ticket-{n}-bench").fill(n, authors)
+
+        # 履歴 API から直接描画（ローカルログなし）
+        cases.append(Case(
+            f"transcript.history.{n // 1000}k",
+            lambda channel=channel: TicketCog.generate_html_log_static(channel),
+            ops=n, repeat=_repeat_for(n), warmup=1,
+            teardown=lambda channel=channel: _remove(f"ticket_{channel.name}-*.html"),
+        ))
+
+        # ライブログ（JSONL）から描画。履歴 API は差分なし
+        log = MessageLog(log_dir=os.path.join("ticket_logs", str(n)))
+
+        def setup(log=log, channel=channel):
+            _remove(log.path(channel.id))
+            log._append(channel.id, [message_record(m) for m in channel.messages])
+            log._last_id[channel.id] = channel.messages[-1].id
+
+        cases.append(Case(
+            f"transcript.log.{n // 1000}k",
+            lambda channel=channel, log=log: TicketCog.generate_html_log_static(channel, log),
+            ops=n, repeat=_repeat_for(n), warmup=1,
+            setup=setup,
+            teardown=lambda channel=channel, log=log: (_remove(f"ticket_{channel.name}-*.html"), log.remove(channel.id)),
+        ))
+    return cases
+
+
+# -------------------------
+# 設定（load_config / save_config）
+# -------------------------
+def config_cases(sizes):
+    import cogs.ticket as ticket
+    from utils.config_store import ConfigStore
+
+    cases = []
+    for n in sizes:
+        path = f"bench_ticket_config_{n}.json"
+        gid = next_id()
+        state = {}
+
+        def setup(n=n, path=path, gid=gid, state=state):
+            _remove(path)
+            store = ConfigStore(path, ticket.DEFAULT_CONFIG, ticket.GUILD_DEFAULTS, flush_delay=3600, max_delay=3600)
+            base = next_id()
+            store.data["tickets"] = {
+                str(base + i): {"guild_id": gid, "owner_id": base + i % 997, "number": i + 1,
+                                "state": "open" if i % 3 else "closed", "created_at": "2024-01-01T00:00:00"}
+                for i in range(n)
+            }
+            store._write_atomic(json.dumps(store.data, ensure_ascii=False, indent=2))
+            ticket._store = store
+            state["store"] = store
+
+        async def save(state=state):
+            cfg = ticket.load_config()
+            cfg["tickets"][next(iter(cfg["tickets"]))]["state"] = "open"
+            ticket.save_config(cfg)
+            await state["store"].flush()
+
+        async def teardown(path=path, state=state):
+            await state["store"].close()
+            ticket._store = None
+            _remove(path)
+
+        cases.append(Case(f"config.load.{n // 1000}k", ticket.load_config, repeat=10_000, setup=setup, teardown=teardown))
+        cases.append(Case(
+            f"config.load_disk.{n // 1000}k",
+            lambda path=path: ConfigStore(path, ticket.DEFAULT_CONFIG, ticket.GUILD_DEFAULTS),
+            repeat=_repeat_for(n), warmup=1, setup=setup, teardown=teardown,
+        ))
+        cases.append(Case(f"config.save.{n // 1000}k", save, repeat=_repeat_for(n), warmup=1, setup=setup, teardown=teardown))
+    return cases
+
+
+# -------------------------
+# 管理者判定（has_admin_role_member）
+# -------------------------
+def admin_cases():
+    from cogs.ticket import TicketCog
+
+    bot = FakeBot()
+    cog = TicketCog(bot)
+    guild = FakeGuild()
+    roles = guild.add_roles(50)
+    admin_roles = [r.id for r in roles[:5]]
+    cog.admin_index.rebuild(guild.id, {"admin_role_ids": admin_roles, "whitelist_user_ids": [next_id() for _ in range(100)]})
+    members = [
+        FakeMember(guild, name=f"m{i}", roles=roles[10 + i % 30: 10 + i % 30 + 8] + ([roles[i % 5]] if i % 10 == 0 else []),
+                   permissions=FakePermissions(administrator=(i % 97 == 0)))
+        for i in range(1000)
+    ]
+    member = members[1]
+
+    def cold():
+        cog.admin_index.invalidate_guild(guild.id)
+        for m in members:
+            cog.has_admin_role_member(m)
+
+    def hot():
+        for m in members:
+            cog.has_admin_role_member(m)
+
+    def teardown():
+        cog.exporter.executor.shutdown(wait=False)
+
+    return [
+        Case("admin.single_cached", lambda: cog.has_admin_role_member(member), repeat=100_000),
+        Case("admin.1000_members_cold", cold, ops=len(members), repeat=200),
+        Case("admin.1000_members_cached", hot, ops=len(members), repeat=200, teardown=teardown),
+    ]
+
+
+# -------------------------
+# Embed ビルダー
+# -------------------------
+def embed_cases():
+    from cogs.ticket import embed_log_notify, embed_save_complete, embed_ticket_closed, embed_ticket_created
+
+    guild = FakeGuild()
+    owner = FakeMember(guild, name="owner")
+    channel = FakeChannel(guild)
+    return [
+        Case("embed.ticket_created", lambda: embed_ticket_created(owner, 123), repeat=20_000),
+        Case("embed.ticket_closed", lambda: embed_ticket_closed(owner, 123), repeat=20_000),
+        Case("embed.save_complete", lambda: embed_save_complete(owner, 123), repeat=20_000),
+        Case("embed.log_notify", lambda: embed_log_notify("Ticket Created", owner, 123, channel), repeat=20_000),
+    ]
+
+
+# -------------------------
+# 自動返信（AutoReply.on_message → ルーター経由）
+# -------------------------
+def autoreply_cases():
+    from cogs.autoreply import AutoReply
+    from datetime import datetime, timezone
+
+    guild = FakeGuild()
+    channel = FakeChannel(guild)
+    user = FakeMember(guild, name="user")
+    bot_user = FakeMember(guild, name="bot", bot=True)
+    now = datetime.now(timezone.utc)
+    hit = FakeMessage(channel, user, "おはよう", now)
+    miss = FakeMessage(channel, user, "今日はいい天気ですね、よろしくお願いします", now)
+    from_bot = FakeMessage(channel, bot_user, "おはよう", now)
+
+    state = {}
+
+    async def setup(rules=None, state=state):
+        bot = FakeBot()
+        cog = AutoReply(bot)
+        if rules is not None:
+            cog.store.data["rules"] = rules
+            cog.reload_rules()
+        await cog.cog_load()
+        state["bot"], state["cog"] = bot, cog
+
+    async def teardown(state=state):
+        await state["cog"].cog_unload()
+        _remove("autoreply_rules.json")
+
+    def dispatch(message, state=state):
+        return lambda: state["bot"].router.dispatch(message)
+
+    many = [{"type": "contains", "pattern": f"キーワード{i}", "reply": f"返信{i}"} for i in range(300)]
+    many += [{"type": "prefix", "pattern": f"!cmd{i}", "reply": f"cmd{i}"} for i in range(100)]
+    many += [{"type": "regex", "pattern": rf"^order\s+#{i}\d+$", "reply": f"order{i}"} for i in range(50)]
+    many += [{"type": "exact", "pattern": "おはよう", "reply": "おっは〜！"}]
+
+    return [
+        Case("autoreply.default.hit", dispatch(hit), repeat=20_000, setup=setup, teardown=teardown),
+        Case("autoreply.default.miss", dispatch(miss), repeat=20_000, setup=setup, teardown=teardown),
+        Case("autoreply.default.bot", dispatch(from_bot), repeat=20_000, setup=setup, teardown=teardown),
+        Case("autoreply.450_rules.hit", dispatch(hit), repeat=20_000, setup=lambda: setup(many), teardown=teardown),
+        Case("autoreply.450_rules.miss", dispatch(miss), repeat=20_000, setup=lambda: setup(many), teardown=teardown),
+    ]
+
+
+# -------------------------
+# 添付の保存（AttachmentMirror → ローカル HTTP サーバー）
+# -------------------------
+def attachment_cases():
+    import asyncio
+    from aiohttp import web
+    from utils.attachments import AttachmentMirror, AttachmentStore
+
+    state = {}
+    unique = 50  # 200 URL 中、内容が異なるのは 50 個（残りはハッシュで重複排除）
+    bodies = [os.urandom(64 * 1024) + i.to_bytes(4, "big") for i in range(unique)]
+
+    async def serve(request):
+        await asyncio.sleep(0.005)  # CDN の往復の代わり
+        i = int(request.match_info["i"])
+        return web.Response(body=bodies[i % unique], content_type="image/png")
+
+    async def setup(state=state):
+        app = web.Application()
+        app.router.add_get("/files/{i}/image.png", serve)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        port = runner.addresses[0][1]
+        state["runner"] = runner
+        state["urls"] = [f"http://127.0.0.1:{port}/files/{i}/image.png" for i in range(200)]
+
+    async def teardown(state=state):
+        await state["runner"].cleanup()
+        shutil.rmtree("bench_attachments", ignore_errors=True)
+
+    def mirror(concurrency):
+        async def fn(state=state):
+            shutil.rmtree("bench_attachments", ignore_errors=True)
+            m = AttachmentMirror(AttachmentStore("bench_attachments"), concurrency=concurrency)
+            try:
+                keys = await m.mirror(state["urls"])
+            finally:
+                await m.close()
+            assert len(set(keys.values())) == unique, m.stats()
+        return fn
+
+    return [
+        Case(f"attachments.200_urls.c{c}", mirror(c), ops=200, repeat=5, warmup=1, setup=setup, teardown=teardown)
+        for c in (1, 8)
+    ]
+
+
+# -------------------------
+# 全文検索（TranscriptIndex）
+# -------------------------
+def search_cases(sizes):
+    import gzip
+    import random
+    from utils.search_index import TranscriptIndex
+
+    words = ["返金", "支払い", "エラー", "ログイン", "パスワード", "アカウント", "注文", "配送", "キャンセル",
+             "問い合わせ", "確認", "対応", "設定", "画面", "表示", "接続", "失敗", "更新", "請求書", "領収書"]
+    cases = []
+    for n in sizes:
+        state = {}
+        archive_dir = f"bench_transcripts_{n}"
+
+        async def setup(n=n, archive_dir=archive_dir, state=state):
+            # 1 チケット 50 メッセージの正本を n // 50 件作って登録
+            rnd = random.Random(n)
+            os.makedirs(archive_dir, exist_ok=True)
+            gid = 1
+            for t in range(n // 50):
+                cid = next_id()
+                path = os.path.join(archive_dir, f"ticket-{t + 1}-{cid}.jsonl.gz")
+                with gzip.open(path, "wt", encoding="utf-8") as f:
+                    f.write(json.dumps({"type": "meta", "channel_id": cid, "guild_id": gid, "number": t + 1,
+                                        "owner_id": 1000 + t % 300, "exported_at": "2024-01-01T00:00:00"}) + "\n")
+                    for i in range(50):
+                        text = "".join(rnd.choice(words) + rnd.choice(("が", "を", "の", "で", "、")) for _ in range(12))
+                        if rnd.random() < 0.002:
+                            text += " 製品シリアル番号を添付します"  # 珍しい語（実際の検索に近いヒット数）
+                        f.write(json.dumps({"id": next_id(), "ts": f"2024-{1 + t % 12:02d}-01T00:00:{i:02d}+00:00",
+                                            "author": "user", "author_id": 1, "content": text}, ensure_ascii=False) + "\n")
+            index = TranscriptIndex(os.path.join(archive_dir, "index.db"))
+            await index.open()
+            await index.reindex_all(archive_dir)
+            state["index"] = index
+
+        async def teardown(archive_dir=archive_dir, state=state):
+            await state["index"].close()
+            shutil.rmtree(archive_dir, ignore_errors=True)
+
+        def search(query, state=state, **kw):
+            return lambda: state["index"].search(1, query, **kw)
+
+        cases.append(Case(f"search.rare.{n // 1000}k", search("シリアル番号"), repeat=200, warmup=5, setup=setup))
+        # 全メッセージの 4 割前後に出る語（ほぼ最悪ケース）
+        cases.append(Case(f"search.dense.{n // 1000}k", search("請求書 パスワード"), repeat=50, warmup=2))
+        cases.append(Case(f"search.dense_owner.{n // 1000}k", search("領収書", owner_id=1001), repeat=50, warmup=2))
+        cases.append(Case(f"search.short_like.{n // 1000}k", search("返金"), repeat=20, warmup=1, teardown=teardown))
+    return cases
+
+
+def build_cases(quick=False):
+    sizes = tuple(n for n in MESSAGE_SIZES if not quick or n < 100_000)
+    ticket_sizes = tuple(n for n in TICKET_SIZES if not quick or n < 100_000)
+    return (
+        transcript_cases(sizes)
+        + config_cases(ticket_sizes)
+        + admin_cases()
+        + embed_cases()
+        + autoreply_cases()
+        + attachment_cases()
+        + search_cases(sizes)
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="チケット / トランスクリプト周りのオフラインベンチマーク")
+    parser.add_argument("--quick", action="store_true", help="100k のケースを除く")
+    parser.add_argument("--only", action="append", default=[], help="名前にこの文字列を含むケースだけ（複数可）")
+    parser.add_argument("--save", metavar="NAME", help="結果を bench/baselines/NAME.json に保存")
+    parser.add_argument("--compare", metavar="NAME", help="bench/baselines/NAME.json と比較")
+    parser.add_argument("--threshold", type=float, default=0.2, help="悪化とみなす変化率（既定 0.2 = 20%%）")
+    parser.add_argument("--fail-on-regression", action="store_true", help="悪化があれば終了コード 1")
+    args = parser.parse_args(argv)
+
+    baseline = load_baseline(args.compare) if args.compare else None
+
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix="ticket-bench-") as tmp:
+        os.chdir(tmp)
+        try:
+            cases = build_cases(args.quick)
+            if args.only:
+                cases = [c for c in cases if any(s in c.name for s in args.only)]
+            results = run(run_cases(cases))
+        finally:
+            os.chdir(cwd)
+
+    if args.save:
+        print(f"💾 ベースラインを保存しました: {save_baseline(args.save, results)}")
+    if baseline is not None:
+        print(f"\n--- {args.compare} との比較 ---")
+        regressions = compare(results, baseline, args.threshold)
+        if regressions and args.fail_on_regression:
+            print(f"⚠️ 悪化: {', '.join(regressions)}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,36 +1,112 @@
 # cogs/autoreply.py
 from discord.ext import commands
+import traceback
+
+from utils.config_store import get_config
+from utils.router import get_router
+from utils.rules import RuleSet
+
+RULES_FILE = "autoreply_rules.json"
+
+# 既定ルール（完全一致の短い挨拶群。UI は変えない）
+DEFAULT_RULES = {
+    "disabled_channels": [],
+    "rules": [
+        {"type": "exact", "pattern": "おはよう", "reply": "おっは〜！"},
+        {"type": "exact", "pattern": "おやすみ", "reply": "おっや〜！"},
+        {"type": "exact", "pattern": "こんにちは", "reply": "こんちゃ〜！"},
+        {"type": "exact", "pattern": "こんばんは", "reply": "ばんちゃ〜！"},
+        {"type": "exact", "pattern": "ただいま", "reply": "おかえり〜！"},
+        {"type": "exact", "pattern": "いってきます", "reply": "いってら〜！"},
+    ],
+}
 
 class AutoReply(commands.Cog):
-    """簡単な自動返信 Cog（挨拶系）"""
+    """簡単な自動返信 Cog（ルールは autoreply_rules.json から読み込み）"""
 
     def __init__(self, bot):
         self.bot = bot
+        # ルールファイルは設定サービスの "autoreply" セクション（外部編集も自動で反映）
+        self.store = get_config(bot).section("autoreply", RULES_FILE, DEFAULT_RULES)
+        self.ruleset = RuleSet([])
+        self.reload_rules()
+
+    def reload_rules(self, changed=None):
+        """メモリ上のルールをコンパイルし直す（失敗したら前のルールのまま）"""
+        data = self.store.data
+        try:
+            ruleset = RuleSet(data.get("rules", []), data.get("disabled_channels", []))
+        except Exception:
+            traceback.print_exc()
+            return False
+        self.ruleset = ruleset
+        if getattr(self.bot, "router", None) is not None and "autoreply" in self.bot.router.routes:
+            self._register_route()
+        return True
+
+    def _register_route(self):
+        # exact だけならルーター側の完全一致表で絞れる。それ以外は全メッセージを見る
+        rs = self.ruleset
+        only_exact = all(r.type == "exact" for r in rs.rules)
+        get_router(self.bot).register(
+            "autoreply",
+            self.on_routed_message,
+            exact=rs.exact.keys() if only_exact else None,
+            catch_all=not only_exact,
+        )
+
+    async def cog_load(self):
+        self._register_route()
+        get_config(self.bot).on_reload("autoreply", self.reload_rules)
+
+    async def cog_unload(self):
+        get_router(self.bot).unregister("autoreply")
+        get_config(self.bot).remove_listener("autoreply", self.reload_rules)
+        await self.store.close()
+
+    async def on_routed_message(self, routed):
+        # Bot / システムメッセージはルーターで除外済み、テキストも正規化済み
+        message = routed.message
+        rule = self.ruleset.match(routed.text, routed.channel_id, routed.author_id)
+        if rule is not None:
+            await message.channel.send(rule.reply)
+
+    # -------------------------
+    # 管理コマンド
+    # -------------------------
+    @commands.group(invoke_without_command=True)
+    @commands.has_permissions(administrator=True)
+    async def autoreply(self, ctx):
+        await ctx.send(f"サブコマンド: reload / on / off（ルール数: {len(self.ruleset.rules)}）")
+
+    @autoreply.command(name="reload")
+    @commands.has_permissions(administrator=True)
+    async def reload_cmd(self, ctx):
+        self.store.reload()
+        if self.reload_rules():
+            await ctx.send(f"自動返信ルールを再読み込みしました。（{len(self.ruleset.rules)}件）")
+        else:
+            await ctx.send("ルールファイルの読み込みに失敗しました。前のルールのまま動作します。")
+
+    @autoreply.command(name="off")
+    @commands.has_permissions(administrator=True)
+    async def off(self, ctx):
+        data = self.store.data
+        disabled = set(data.get("disabled_channels", []))
+        disabled.add(ctx.channel.id)
+        data["disabled_channels"] = sorted(disabled)
+        self.store.mark_dirty()
+        self.reload_rules()
+        await ctx.send(f"{ctx.channel.mention} で自動返信を無効にしました。")
+
+    @autoreply.command(name="on")
+    @commands.has_permissions(administrator=True)
+    async def on(self, ctx):
+        data = self.store.data
+        data["disabled_channels"] = [c for c in data.get("disabled_channels", []) if c != ctx.channel.id]
+        self.store.mark_dirty()
+        self.reload_rules()
+        await ctx.send(f"{ctx.channel.mention} で自動返信を有効にしました。")
 
-    @commands.Cog.listener()
-    async def on_message(self, message):
-        # 他の Cog やコマンド処理を邪魔しないために最初にチェック
-        if message.author.bot:
-            return
-
-        text = message.content.strip().lower()
-
-        # 完全一致の短い挨拶群（UI は変えない）
-        if text == "おはよう":
-            await message.channel.send("おっは〜！")
-        elif text == "おやすみ":
-            await message.channel.send("おっや〜！")
-        elif text == "こんにちは":
-            await message.channel.send("こんちゃ〜！")
-        elif text == "こんばんは":
-            await message.channel.send("ばんちゃ〜！")
-        elif text == "ただいま":
-            await message.channel.send("おかえり〜！")
-        elif text == "いってきます":
-            await message.channel.send("いってら〜！")
-
-        # これがないとコマンドが処理されない（重要）
-        await self.bot.process_commands(message)
-
-def setup(bot):
-    bot.add_cog(AutoReply(bot))
+async def setup(bot):
+    await bot.add_cog(AutoReply(bot))
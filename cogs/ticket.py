@@ -1,36 +1,109 @@
 # cogs/ticket.py
+import asyncio
 import discord
 from discord.ext import commands
 from discord.ui import View, Button
-import json
 import os
+import time
 from datetime import datetime, timezone
-import html
-import pathlib
 import traceback
 
+from utils.attachments import AttachmentMirror, AttachmentStore
+from utils.bulk import BulkJob
+from utils.config_store import ConfigStore, get_config
+from utils.ticket_repo import create_repository
+from utils.ticket_stats import TicketStats, format_duration
+from utils.export_worker import ExportJob, ExportWorker
+from utils.gateway import get_or_fetch_member
+from utils.log_sink import get_log_sink
+from utils.message_log import MessageLog
+from utils.metrics import report_error, timed
+from utils.router import get_router
+from utils.scheduler import DeadlineScheduler
+from utils.search_index import HIT_END, HIT_START, TranscriptIndex
+from utils.startup import get_timeline
+from utils.transcript import export_html, export_transcript, find_archives, render_html_parts
+from utils.verify_queue import get_verify_queue
+
 CONFIG_FILE = "ticket_config.json"
 
+DEFAULT_CONFIG = {
+    "guilds": {},  # guild_id -> GUILD_DEFAULTS と同じ形
+    "tickets": {},  # channel_id -> {guild_id, owner_id, number, state, created_at}
+    "storage": "json",  # "json" / "sqlite"（チケット保存先）
+    "sqlite_path": "tickets.db",
+    "upload_size_limit": 8 * 1024 * 1024,  # ログ添付 1 ファイルの上限（超えたら分割）
+    # 添付のローカル保存（CDN のリンク切れ対策）。保存時に並行ダウンロードして内容ハッシュで重複排除
+    "attachment_archive": False,
+    "attachment_dir": "attachments",
+    "attachment_concurrency": 4,
+    "search_index_path": "transcripts/index.db",  # 正本の全文検索（!ticketsearch）
+    # クローズからこの日数が過ぎたチケットは ticket_archive/ の月別ファイルへ移す（0 で無効）
+    "compact_after_days": 30,
+    "archive_dir": "ticket_archive",
+    # !ticketadmin bulk の同時実行数と、1 秒あたりに処理を始める件数（Discord のレート制限の予算）
+    "bulk_concurrency": 4,
+    "bulk_rate": 2.0,
+    # ライフサイクルの集計（!ticketstats）とイベントの追記ログ
+    "stats_path": "ticket_stats.json",
+    "event_log_path": "ticket_events.jsonl",
+}
+
+# ギルドごとの設定（data["guilds"][guild_id]）
+GUILD_DEFAULTS = {
+    "log_channel_id": None,
+    "ticket_count": 0,
+    "verify_role_id": None,
+    "ticket_category_id": None,
+    "admin_role_ids": [],  # 管理者ロールIDリスト
+    "whitelist_user_ids": [],  # 個別ホワイトリストユーID
+    "idle_remind_hours": 0,  # 最後の発言からこの時間で本人に催促（0 で無効）
+    "idle_close_hours": 0,  # 最後の発言からこの時間で自動クローズ（0 で無効）
+}
+
+# 最後の発言時刻を保存する間隔（秒）。再起動時の期限のずれはこれ以内
+ACTIVITY_SAVE_INTERVAL = 60
+# 古いクローズ済みチケットを保管先へ移す間隔（秒）
+COMPACT_INTERVAL = 6 * 3600
+
+# 設定ストア（bot 共通の設定サービスの "ticket" セクション。読み込みはメモリから）
+_store = None
+
+def get_store():
+    global _store
+    if _store is None:
+        # cog 外から単体で使う場合（ツール・ベンチマークなど）
+        _store = ConfigStore(CONFIG_FILE, DEFAULT_CONFIG, GUILD_DEFAULTS)
+    return _store
+
 def load_config():
-    if not os.path.exists(CONFIG_FILE):
-        default = {
-            "log_channel_id": None,
-            "ticket_count": 0,
-            "tickets": {},  # channel_id -> {owner_id, number, state, created_at}
-            "verify_role_id": None,
-            "ticket_category_id": None,
-            "admin_role_ids": [],  # 管理者ロールIDリスト
-            "whitelist_user_ids": []  # 個別ホワイトリストユーID
-        }
-        with open(CONFIG_FILE, "w", encoding="utf-8") as f:
-            json.dump(default, f, ensure_ascii=False, indent=2)
-        return default
-    with open(CONFIG_FILE, "r", encoding="utf-8") as f:
-        return json.load(f)
+    # ディスクは読まずにメモリ上の設定をそのまま返す
+    return get_store().data
+
+def guild_config(guild_id):
+    # ギルドごとの設定（無ければ既定値で作る）。保存は save_config で
+    return get_store().guild(guild_id)
 
 def save_config(cfg):
-    with open(CONFIG_FILE, "w", encoding="utf-8") as f:
-        json.dump(cfg, f, ensure_ascii=False, indent=2)
+    # 書き込みは ConfigStore がまとめて別スレッドで行う
+    get_store().mark_dirty()
+
+def _parse_duration(text):
+    # "30d" / "12h" / "45m" / 数字だけなら日数 → 秒
+    text = text.strip().lower()
+    unit = {"d": 86400, "h": 3600, "m": 60}.get(text[-1:])
+    if unit is None:
+        return float(text) * 86400
+    return float(text[:-1]) * unit
+
+def _epoch(iso):
+    # 保存した ISO 時刻（タイムゾーン無しは UTC）を time.time() と同じ秒数に
+    if not iso:
+        return None
+    dt = datetime.fromisoformat(iso)
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.timestamp()
 
 # -------------------------
 # Embed デザイン（UI は変えない）
@@ -75,38 +148,616 @@ def embed_log_notify(action: str, owner: discord.Member, ticket_no: int, channel
     e.set_footer(text=f"{datetime.now(timezone.utc).isoformat()} (UTC)")
     return e
 
+# チケットチャンネルの権限（作成のたびに作らず使い回す）
+HIDDEN_OVERWRITE = discord.PermissionOverwrite(read_messages=False)
+OWNER_OVERWRITE = discord.PermissionOverwrite(read_messages=True, send_messages=True)
+STAFF_OVERWRITE = discord.PermissionOverwrite(read_messages=True, send_messages=True)
+
+# -------------------------
+# 管理者判定キャッシュ
+# -------------------------
+class AdminIndex:
+    """管理者ロール / ホワイトリストをギルドごとの frozenset に持ち、判定結果もメンバーごとに覚える
+
+    ttl を指定すると判定は ttl 秒で期限切れ（メンバー intent なしでロール変更イベントが来ない時用）。
+    """
+
+    MAX_CACHED = 10000  # ギルドごとの判定キャッシュ上限
+
+    def __init__(self, ttl=None):
+        self.ttl = ttl
+        self._roles = {}  # guild_id -> frozenset[role_id]
+        self._users = {}  # guild_id -> frozenset[user_id]
+        self._decisions = {}  # guild_id -> {member_id: (bool, 判定時刻)}
+
+    def rebuild(self, guild_id, gcfg):
+        # addrole / removerole / whitelist_* の後に呼ぶ（そのギルドの分だけ作り直す）
+        self._roles[guild_id] = frozenset(gcfg.get("admin_role_ids") or ())
+        self._users[guild_id] = frozenset(gcfg.get("whitelist_user_ids") or ())
+        self._decisions.pop(guild_id, None)
+
+    def rebuild_all(self, cfg):
+        self._roles.clear()
+        self._users.clear()
+        self._decisions.clear()
+        for gid, gcfg in (cfg.get("guilds") or {}).items():
+            self.rebuild(int(gid), gcfg)
+
+    def invalidate_member(self, guild_id, member_id):
+        cache = self._decisions.get(guild_id)
+        if cache:
+            cache.pop(member_id, None)
+
+    def invalidate_guild(self, guild_id):
+        self._decisions.pop(guild_id, None)
+
+    def is_admin(self, member: discord.Member) -> bool:
+        gid = member.guild.id
+        cache = self._decisions.get(gid)
+        if cache is None:
+            cache = self._decisions[gid] = {}
+        now = time.monotonic()
+        hit = cache.get(member.id)
+        if hit is not None and (self.ttl is None or now - hit[1] < self.ttl):
+            return hit[0]
+        perms = member.guild_permissions
+        role_ids = self._roles.get(gid, frozenset())
+        decision = (
+            member.id in self._users.get(gid, ())
+            or perms.administrator
+            or perms.manage_guild
+            or not role_ids.isdisjoint(r.id for r in member.roles)
+        )
+        if len(cache) >= self.MAX_CACHED:
+            cache.clear()
+        cache[member.id] = (decision, now)
+        return decision
+
 # -------------------------
 # Cog 実装
 # -------------------------
 class TicketCog(commands.Cog):
     def __init__(self, bot):
+        global _store
         self.bot = bot
+        self.store = _store = get_config(bot).section("ticket", CONFIG_FILE, DEFAULT_CONFIG, GUILD_DEFAULTS)
+        # メンバー intent が無いと on_member_update が来ないので、判定は一定時間で取り直す
+        self.admin_index = AdminIndex(ttl=None if bot.intents.members else 60)
+        self.admin_index.rebuild_all(self.store.data)
+        self.tickets = create_repository(self.store)
+        self.message_log = MessageLog()
+        self.ticket_channels = set()  # ライブ記録対象のチャンネルID
+        self._overwrite_templates = {}  # guild_id -> {Role: PermissionOverwrite}
+        self._reconciled = False
+        self.exporter = ExportWorker(self.process_export)
+        # 放置チケットの期限（open のチケットだけ）
+        self.idle = DeadlineScheduler(self.on_idle_deadline, name="ticket-idle")
+        self._activity = {}  # channel_id -> (guild_id, 最後の発言, 保存済みの時刻)
+        self._reminded = set()  # 最後の発言以降に催促済みのチャンネル
+        self._compact_task = None
+        self._bulk_jobs = {}  # guild_id -> 実行中の BulkJob
+        self.stats = TicketStats(self.store.data.get("stats_path") or "ticket_stats.json",
+                                 self.store.data.get("event_log_path") or "ticket_events.jsonl")
+        self.search = TranscriptIndex(self.store.data.get("search_index_path") or "transcripts/index.db")
+        self.attachments = None
+        if self.store.data.get("attachment_archive"):
+            self.attachments = AttachmentMirror(
+                AttachmentStore(self.store.data.get("attachment_dir") or "attachments"),
+                concurrency=self.store.data.get("attachment_concurrency", 4),
+            )
+
+    async def cog_load(self):
+        get_config(self.bot).on_reload("ticket", self.on_config_reload)
+        await self.tickets.open()
+        await self.search.open()
+        self.ticket_channels.update(await self.tickets.channel_ids())
+        await self.rebuild_idle()
+        self.idle.start()
+        self._compact_task = asyncio.get_running_loop().create_task(self._compact_loop(), name="ticket-compact")
+        # チケットチャンネルのメッセージだけをルーターから受け取る（Bot の Embed も記録）
+        get_router(self.bot).register("ticket-capture", self.on_ticket_message, channels=self.ticket_channels, include_bots=True)
+        self.exporter.start()
+        # 永続 View（メッセージ ID を問わず custom_id で受ける）
+        for view in (TicketCog.VerifyView(), TicketCog.TicketView(),
+                     TicketCog.TicketManageView(is_open=True), TicketCog.TicketManageView(is_open=False)):
+            self.bot.add_view(view)
+
+    async def cog_unload(self):
+        # 終了時は保留中の変更を必ず書き出す
+        global _store
+        get_config(self.bot).remove_listener("ticket", self.on_config_reload)
+        get_router(self.bot).unregister("ticket-capture")
+        await self.exporter.stop()
+        await self.idle.stop()
+        if self._compact_task is not None:
+            self._compact_task.cancel()
+            self._compact_task = None
+        if self.attachments is not None:
+            await self.attachments.close()
+        await get_log_sink().close()
+        await self.tickets.close()
+        await self.search.close()
+        await self.stats.close()
+        await self.store.close()
+        _store = None
+
+    def on_config_reload(self, changed):
+        # ticket_config.json が外部で編集された時（変わったキーだけ反映）
+        if "guilds" in changed:
+            self.admin_index.rebuild_all(self.store.data)
+            self._overwrite_templates.clear()
+            self.reschedule_idle()
+        if "tickets" in changed and self.tickets.backend == "json":
+            self.ticket_channels.clear()
+            self.ticket_channels.update(int(cid) for cid in self.store.data.get("tickets", {}))
+
+    async def claim_legacy(self, guild_id):
+        """単一ギルド時代の設定とチケットを guild_id のものにする"""
+        moved = self.store.migrate_legacy(guild_id)
+        if moved:
+            self.invalidate_guild_settings(guild_id)
+        claimed = await self.tickets.claim_legacy(guild_id)
+        return moved, claimed
+
+    async def reconcile_tickets(self):
+        """保存済みチケットと実在チャンネルを突き合わせ、停止中に消されたものを一括で片付ける"""
+        started = time.perf_counter()
+        guilds = {g.id: g for g in self.bot.guilds if not g.unavailable}
+        tickets = await self.tickets.all()
+        # 見えていないギルド（別シャード・未参加）のチケットには触らない
+        orphan_tickets = [
+            t for t in tickets
+            if t.get("guild_id") in guilds and guilds[t["guild_id"]].get_channel(t["channel_id"]) is None
+        ]
+        orphans = [t["channel_id"] for t in orphan_tickets]
+        if orphans:
+            await self.tickets.delete_many(orphans)
+            for t in orphan_tickets:
+                self.record_event("deleted", t["guild_id"], t["channel_id"], t, state=t.get("state"))
+            self.ticket_channels.difference_update(orphans)
+            for cid in orphans:
+                self.message_log.remove(cid)
+                self.forget_idle(cid)
+        get_timeline(self.bot).span("チケット照合", started)
+        return len(tickets), len(orphans), time.perf_counter() - started
+
+    @commands.Cog.listener()
+    async def on_ready(self):
+        # 旧形式（トップレベル）の設定が残っていれば、参加ギルドが 1 つの時だけ自動で移す
+        if self.store.legacy_keys():
+            if len(self.bot.guilds) == 1:
+                gid = self.bot.guilds[0].id
+                moved, claimed = await self.claim_legacy(gid)
+                print(f"📦 旧形式のチケット設定をギルド {gid} に移行しました（チケット {claimed}件）")
+            else:
+                print("⚠️ 旧形式のチケット設定があります。対象ギルドで !ticketadmin claimlegacy を実行してください。")
+        # 照合は起動時に 1 回だけ（再接続の READY ではやらない）
+        if not self._reconciled:
+            self._reconciled = True
+            try:
+                total, removed, took = await self.reconcile_tickets()
+                print(f"🧹 チケット照合: {total}件中 {removed}件（チャンネル無し）を削除 / {took * 1000:.1f}ms")
+            except Exception:
+                traceback.print_exc()
+            try:
+                # 保管先へ移したクローズ済みも数える（compact は cog_load から動いている）
+                gids = [g.id for g in self.bot.guilds]
+                seeded = None
+                if self.stats.unseeded(gids):
+                    seeded = self.stats.seed(await self.tickets.all(archived=True), gids)
+                if seeded:
+                    print(f"📊 チケット集計を既存チケットから初期化しました（{len(seeded)}ギルド）")
+            except Exception:
+                traceback.print_exc()
+
+    # ---------- 古いクローズ済みチケットの退避 ----------
+    async def compact_closed(self, days=None):
+        """クローズから days 日過ぎたチケットをホットから保管先へ移す。移した件数を返す"""
+        if days is None:
+            days = self.store.data.get("compact_after_days") or 0
+            if days <= 0:
+                return 0  # 自動退避は無効
+        moved = await self.tickets.compact(time.time() - days * 86400)
+        # ライブ記録の対象からも外す（保存・削除時は履歴 API で差分を補う）
+        self.ticket_channels.difference_update(t["channel_id"] for t in moved)
+        return len(moved)
+
+    async def _compact_loop(self):
+        while True:
+            try:
+                n = await self.compact_closed()
+                if n:
+                    print(f"🗄️ クローズ済みチケット {n}件を保管先へ移しました")
+            except Exception:
+                traceback.print_exc()
+            await asyncio.sleep(COMPACT_INTERVAL)
+
+    # ---------- 放置チケット（催促 / 自動クローズ） ----------
+    def idle_hours(self, guild_id):
+        # 設定を読むだけ（guild_config と違って名前空間を作らない）
+        gcfg = self.store.data.get("guilds", {}).get(str(guild_id)) or {}
+        return gcfg.get("idle_remind_hours") or 0, gcfg.get("idle_close_hours") or 0
+
+    def schedule_idle(self, channel_id):
+        """最後の発言とギルド設定から次の期限（催促 → クローズ）を積み直す。O(log n)"""
+        entry = self._activity.get(channel_id)
+        if entry is None:
+            self.idle.cancel(channel_id)
+            return
+        guild_id, last, _ = entry
+        remind_h, close_h = self.idle_hours(guild_id)
+        # 催促だけ（自動クローズ無し）の設定もある
+        if remind_h > 0 and (close_h <= 0 or remind_h < close_h) and channel_id not in self._reminded:
+            self.idle.schedule(channel_id, last + remind_h * 3600, "remind")
+        elif close_h > 0:
+            self.idle.schedule(channel_id, last + close_h * 3600, "close")
+        else:
+            self.idle.cancel(channel_id)
+
+    def reschedule_idle(self):
+        # 設定変更時: メモリ上の発言時刻から全件積み直す
+        for cid in list(self._activity):
+            self.schedule_idle(cid)
+
+    def track_activity(self, channel_id, guild_id, when, saved):
+        self._activity[channel_id] = (guild_id, when, saved)
+        self._reminded.discard(channel_id)
+        self.schedule_idle(channel_id)
+
+    def forget_idle(self, channel_id):
+        self._activity.pop(channel_id, None)
+        self._reminded.discard(channel_id)
+        self.idle.cancel(channel_id)
+
+    async def record_activity(self, channel_id, guild_id, force=False):
+        """発言があった時（期限を延ばし、保存は ACTIVITY_SAVE_INTERVAL ごと）"""
+        now = time.time()
+        entry = self._activity.get(channel_id)
+        saved = entry[2] if entry and not force else 0
+        persist = now - saved >= ACTIVITY_SAVE_INTERVAL
+        self.track_activity(channel_id, guild_id, now, now if persist else saved)
+        if persist:
+            await self.tickets.update(channel_id, last_activity=datetime.fromtimestamp(now, timezone.utc).isoformat())
+
+    async def rebuild_idle(self):
+        """保存済みの open チケットから期限を作り直す（起動時。チャンネルは走査しない）"""
+        self.idle.clear()
+        self._activity.clear()
+        self._reminded.clear()
+        now = time.time()
+        for t in await self.tickets.by_state("open"):
+            last = _epoch(t.get("last_activity")) or _epoch(t.get("created_at")) or now
+            self.track_activity(t["channel_id"], t.get("guild_id"), last, last)
+
+    async def on_idle_deadline(self, channel_id, kind):
+        if not self.bot.is_ready():
+            # 起動直後はチャンネルがまだ見えないので少し待つ
+            self.idle.schedule(channel_id, time.time() + 30, kind)
+            return
+        entry = self._activity.get(channel_id)
+        if entry is None:
+            return
+        ticket = await self.tickets.get(channel_id)
+        if channel_id in self.idle:
+            return  # 待っている間に発言があって期限が延びた
+        channel = self.bot.get_channel(channel_id)
+        if channel is None or not ticket or ticket.get("state") != "open":
+            self.forget_idle(channel_id)
+            return
+        guild_id, last, _ = entry
+        remind_h, close_h = self.idle_hours(guild_id)
+        if kind == "remind":
+            self._reminded.add(channel_id)
+            text = f"<@{ticket['owner_id']}> このチケットは {remind_h:g} 時間やり取りがありません。"
+            if close_h > 0:
+                left = max(0.0, close_h - (time.time() - last) / 3600)
+                text += f"このままだと約 {left:.0f} 時間後に自動でクローズされます。"
+            await channel.send(text, allowed_mentions=discord.AllowedMentions(users=True))
+            self.schedule_idle(channel_id)
+            return
+        await self.close_ticket(channel, ticket, reason="idle")
+
+    async def close_ticket(self, channel, ticket, actor=None, reason=None):
+        """チケットをクローズする（CloseButton と自動クローズで共通）"""
+        guild = channel.guild
+        owner = await get_or_fetch_member(guild, ticket["owner_id"])
+        try:
+            if owner:
+                await channel.set_permissions(owner, read_messages=False, send_messages=False)
+        except Exception:
+            pass
+
+        await self.tickets.update(channel.id, state="closed", closed_at=datetime.now(timezone.utc).isoformat())
+        self.forget_idle(channel.id)
+        self.record_event("closed", guild.id, channel.id, ticket, actor, created=_epoch(ticket.get("created_at")))
+
+        who = owner if owner else (actor or guild.me)
+        view = TicketCog.TicketManageView(is_open=False)
+        embed = embed_ticket_closed(who, ticket["number"])
+        await channel.send(embed=embed, view=view)
+
+        title = "Ticket Closed" if reason is None else f"Ticket Closed ({reason})"
+        await TicketCog.notify_log_channel_static(guild, title, who, ticket["number"], channel)
+
+    async def reopen_ticket(self, channel, ticket, actor=None):
+        """チケットを再開する（ReopenButton と一括操作で共通）"""
+        guild = channel.guild
+        owner = await get_or_fetch_member(guild, ticket["owner_id"])
+        try:
+            if owner:
+                await channel.set_permissions(owner, read_messages=True, send_messages=True)
+        except Exception:
+            pass
+        await self.tickets.update(channel.id, state="open")
+        self.ticket_channels.add(channel.id)  # 退避済みだった場合はライブ記録を戻す
+        self.record_event("reopened", guild.id, channel.id, ticket, actor)
+        # 再開した時点から放置時間を数え直す
+        await self.record_activity(channel.id, guild.id, force=True)
+        view = TicketCog.TicketManageView(is_open=True)
+        await channel.send("チケットを再開しました。", view=view)
+        await TicketCog.notify_log_channel_static(guild, "Ticket Reopened", owner if owner else (actor or guild.me), ticket["number"], channel)
+
+    # ---------- 一括操作 ----------
+    BULK_ACTIONS = ("close", "reopen", "save", "delete")
+
+    async def select_tickets(self, guild_id, state=None, older=None, idle=None, owner_id=None):
+        """条件に合うチケット（保管先に移したものも含む）を番号順に返す。older / idle は秒"""
+        now = time.time()
+        out = []
+        for t in await self.tickets.all(guild_id, archived=True):
+            if state and t.get("state") != state:
+                continue
+            if owner_id and t.get("owner_id") != owner_id:
+                continue
+            created = _epoch(t.get("created_at"))
+            if older is not None and (created is None or now - created < older):
+                continue
+            if idle is not None:
+                entry = self._activity.get(t["channel_id"])
+                last = entry[1] if entry else (_epoch(t.get("last_activity")) or created)
+                if last is None or now - last < idle:
+                    continue
+            out.append(t)
+        out.sort(key=lambda t: t.get("number") or 0)
+        return out
+
+    async def bulk_action(self, kind, ticket, actor):
+        """一括操作の 1 件分。対象外なら理由の文字列を返す"""
+        cid = ticket["channel_id"]
+        ticket = await self.tickets.get(cid)
+        if not ticket:
+            return "削除済み"
+        channel = self.bot.get_channel(cid)
+        if channel is None:
+            if kind == "delete":
+                # チャンネルが先に消えているものは記録だけ消す
+                await self.tickets.delete(cid)
+                self.ticket_channels.discard(cid)
+                self.forget_idle(cid)
+                self.record_event("deleted", ticket.get("guild_id"), cid, ticket, actor, state=ticket.get("state"))
+                return None
+            raise RuntimeError("チャンネルが見つかりません")
+        if kind == "close":
+            if ticket.get("state") != "open":
+                return "クローズ済み"
+            await self.close_ticket(channel, ticket, actor=actor, reason="bulk")
+        elif kind == "reopen":
+            if ticket.get("state") == "open":
+                return "オープン中"
+            await self.reopen_ticket(channel, ticket, actor)
+        else:
+            if cid in self.exporter.pending:
+                return "処理待ち"  # ボタンからの保存 / 削除と重ねない
+            # 処理中はボタンからの保存 / 削除も受け付けない（ワーカーのジョブと同じ扱い）
+            self.exporter.pending.add(cid)
+            try:
+                await self.process_export(ExportJob(kind, channel, ticket, actor))
+            finally:
+                self.exporter.pending.discard(cid)
+        return None
+
+    # ---------- 集計 ----------
+    def record_event(self, event, guild_id, channel_id, ticket, actor=None, **kwargs):
+        """ライフサイクルイベントを集計に足す（失敗しても本処理は止めない）"""
+        if guild_id is None:
+            return None
+        try:
+            return self.stats.record(event, guild_id, channel_id, number=ticket.get("number"),
+                                     actor_id=actor.id if actor is not None else None, **kwargs)
+        except Exception:
+            traceback.print_exc()
+            return None
 
     # ---------- helper ----------
+    def overwrite_template(self, guild: discord.Guild) -> dict:
+        """@everyone 非表示 + 管理者ロール表示（ギルドごとに 1 回だけ組み立てる）"""
+        template = self._overwrite_templates.get(guild.id)
+        if template is None:
+            template = {guild.default_role: HIDDEN_OVERWRITE}
+            for rid in guild_config(guild.id).get("admin_role_ids", []):
+                r = guild.get_role(rid)
+                if r:
+                    template[r] = STAFF_OVERWRITE
+            self._overwrite_templates[guild.id] = template
+        return template
+
+    def invalidate_guild_settings(self, guild_id):
+        # 管理者ロール・ホワイトリストの変更後に呼ぶ
+        self.admin_index.rebuild(guild_id, guild_config(guild_id))
+        self._overwrite_templates.pop(guild_id, None)
+
     def has_admin_role_member(self, member: discord.Member):
         try:
-            cfg = load_config()
-            admin_ids = cfg.get("admin_role_ids", []) or []
-            for r in member.roles:
-                if r.id in admin_ids:
-                    return True
-            if member.guild_permissions.administrator or member.guild_permissions.manage_guild:
-                return True
-            if member.id in cfg.get("whitelist_user_ids", []):
-                return True
+            return self.admin_index.is_admin(member)
         except Exception:
             traceback.print_exc()
         return False
 
+    # 管理者判定キャッシュの無効化（ロール付け替え・権限変更・退出）
+    @commands.Cog.listener()
+    async def on_member_update(self, before, after):
+        if before.roles != after.roles:
+            self.admin_index.invalidate_member(after.guild.id, after.id)
+
+    @commands.Cog.listener()
+    async def on_member_remove(self, member):
+        self.admin_index.invalidate_member(member.guild.id, member.id)
+
+    @commands.Cog.listener()
+    async def on_guild_role_update(self, before, after):
+        if before.permissions != after.permissions:
+            self.admin_index.invalidate_guild(after.guild.id)
+
+    @commands.Cog.listener()
+    async def on_guild_role_delete(self, role):
+        self.admin_index.invalidate_guild(role.guild.id)
+        self._overwrite_templates.pop(role.guild.id, None)
+
+    @commands.Cog.listener()
+    async def on_guild_update(self, before, after):
+        if before.owner_id != after.owner_id:
+            self.admin_index.invalidate_guild(after.id)
+
+    # ---------- 保存 / 削除ワーカー ----------
+    async def enqueue_export(self, interaction: discord.Interaction, kind: str, ticket: dict):
+        """ジョブを積んですぐ応答する（defer 済みの interaction を渡すこと）"""
+        channel = interaction.channel
+        try:
+            pos = self.exporter.submit(ExportJob(kind, channel, ticket, interaction.user))
+        except asyncio.QueueFull:
+            await interaction.followup.send("処理待ちが多すぎます。しばらくしてから再度お試しください。", ephemeral=True)
+            return
+        if pos is None:
+            await interaction.followup.send("このチケットはすでに処理待ちです。", ephemeral=True)
+            return
+        if kind == "save":
+            await interaction.followup.send(f"HTMLログの作成を受け付けました。（待ち: {pos}件）", ephemeral=True)
+        else:
+            await interaction.followup.send(f"ログを保存してから削除します。（待ち: {pos}件）", ephemeral=True)
+
+    def upload_limit(self, guild: discord.Guild) -> int:
+        limit = load_config().get("upload_size_limit") or 8 * 1024 * 1024
+        return min(limit, guild.filesize_limit)
+
+    @staticmethod
+    async def send_parts(dest, parts, embed=None, sink=None):
+        # 1 メッセージ 1 ファイル（合計サイズ制限に引っかからないように）
+        # sink を渡すとログ送信キュー経由（送信完了までは待つ。破棄・失敗なら例外）
+        for i, p in enumerate(parts):
+            kwargs = {"file": discord.File(p)}
+            if i == 0:
+                kwargs["embed"] = embed
+            else:
+                kwargs["content"] = f"（続き {i + 1}/{len(parts)}）"
+            if sink is not None:
+                if not await sink.send(dest, **kwargs):
+                    raise RuntimeError(f"ログチャンネルへの送信に失敗しました（{i + 1}/{len(parts)}）")
+            else:
+                await dest.send(**kwargs)
+
+    @timed("worker", "export")
+    async def process_export(self, job: ExportJob):
+        channel = job.channel
+        ticket = job.ticket
+        guild = channel.guild
+        owner = await get_or_fetch_member(guild, ticket["owner_id"]) or job.user
+        action = "Saved (HTML)" if job.kind == "save" else "Deleted (Saved)"
+
+        parts = []
+        archive = None
+        ok = False
+        try:
+            # 正本（JSONL.gz）を保存し、そこから圧縮 HTML を上限サイズで分割して送る
+            archive = await export_transcript(channel, self.message_log, ticket, self.exporter.executor, self.attachments)
+            try:
+                await self.search.index(archive)
+            except Exception:
+                traceback.print_exc()  # 検索に載らないだけなので保存は続ける
+            log_id = guild_config(guild.id).get("log_channel_id")
+            log_chan = guild.get_channel(log_id) if log_id else None
+            if log_chan:
+                parts = await render_html_parts(archive, self.upload_limit(guild), self.exporter.executor)
+                await self.send_parts(log_chan, parts, embed_log_notify(action, owner, ticket["number"], channel), sink=get_log_sink())
+            ok = True
+        except Exception:
+            traceback.print_exc()
+            # 保存も削除も、ログが届かなかった時はここで止める（削除ならチャンネルとログを残す）
+            if job.kind == "save":
+                await channel.send("ログ保存中にエラーが発生しました。")
+            else:
+                await channel.send("ログ保存中にエラーが発生したため、削除を中止しました。")
+            if parts:
+                print(f"⚠️ 送信できなかったログを残しました: {', '.join(parts)}")
+            raise
+        finally:
+            # 送れなかった分は手元に残す（正本からも !ticketadmin transcript で作り直せる）
+            for p in parts if ok else ():
+                try:
+                    await asyncio.to_thread(os.remove, p)
+                except Exception:
+                    pass
+
+        if job.kind == "save":
+            self.record_event("saved", guild.id, channel.id, ticket, job.user)
+            await channel.send(embed=embed_save_complete(owner, ticket["number"]))
+            await TicketCog.notify_log_channel_static(guild, "Ticket Saved", owner, ticket["number"], channel)
+            return
+
+        try:
+            await self.tickets.delete(channel.id)
+        except Exception:
+            traceback.print_exc()
+        self.ticket_channels.discard(channel.id)
+        self.forget_idle(channel.id)
+        self.record_event("deleted", guild.id, channel.id, ticket, job.user, state=ticket.get("state"))
+        if archive:
+            # 正本に書き出せたのでライブログは不要
+            self.message_log.remove(channel.id)
+        await TicketCog.notify_log_channel_static(guild, "Ticket Deleted", owner, ticket["number"], channel)
+        await channel.delete()
+
+    # ---------- ライブ記録（エクスポート時に履歴を取り直さないため） ----------
+    async def on_ticket_message(self, routed):
+        message = routed.message
+        self.message_log.record_create(message)
+        # Bot の発言（催促など）は放置時間をリセットしない
+        if message.author.bot:
+            return
+        if message.channel.id in self._activity:
+            await self.record_activity(message.channel.id, message.guild.id)
+        # 運営の最初の返信（本人以外の管理者の発言）
+        owner_id = self.stats.awaiting_response(message.guild.id, message.channel.id)
+        if (owner_id is not None and message.author.id != owner_id
+                and isinstance(message.author, discord.Member) and self.has_admin_role_member(message.author)):
+            self.record_event("first_response", message.guild.id, message.channel.id, {}, message.author)
+
+    @commands.Cog.listener()
+    async def on_raw_message_edit(self, payload):
+        if payload.channel_id in self.ticket_channels and "content" in payload.data:
+            self.message_log.record_edit(payload.channel_id, payload.message_id, payload.data["content"])
+
+    @commands.Cog.listener()
+    async def on_raw_message_delete(self, payload):
+        if payload.channel_id in self.ticket_channels:
+            self.message_log.record_delete(payload.channel_id, payload.message_id)
+
+    @commands.Cog.listener()
+    async def on_raw_bulk_message_delete(self, payload):
+        if payload.channel_id in self.ticket_channels:
+            for mid in sorted(payload.message_ids):
+                self.message_log.record_delete(payload.channel_id, mid)
+
     # ---------- Views / Buttons ----------
+    # custom_id は固定（再起動後も bot.add_view で既存のパネル / 管理メッセージのボタンが効く）
     class VerifyButton(Button):
         def __init__(self):
-            super().__init__(label="認証する", style=discord.ButtonStyle.green)
+            super().__init__(label="認証する", style=discord.ButtonStyle.green, custom_id="ticket:verify")
 
+        @timed("button", "ticket_verify")
         async def callback(self, interaction: discord.Interaction):
             try:
-                cfg = load_config()
-                role_id = cfg.get("verify_role_id")
+                gcfg = guild_config(interaction.guild.id)
+                role_id = gcfg.get("verify_role_id")
                 if not role_id:
                     await interaction.response.send_message("認証ロールが未設定です。管理者に連絡してください。", ephemeral=True)
                     return
@@ -117,10 +768,16 @@ class TicketCog(commands.Cog):
                 if role in interaction.user.roles:
                     await interaction.response.send_message("すでに認証済みです！", ephemeral=True)
                     return
-                await interaction.user.add_roles(role)
-                await interaction.response.send_message("認証しました！", ephemeral=True)
+                # ロール付与はキューで順番に（連打は 1 件にまとめる）
+                result = get_verify_queue().submit(interaction, role_id)
+                if result == "duplicate":
+                    await interaction.response.send_message("認証処理中です。少々お待ちください。", ephemeral=True)
+                elif result == "full":
+                    await interaction.response.send_message("混み合っています。しばらくしてから再度お試しください。", ephemeral=True)
+                else:
+                    await interaction.response.send_message("認証を受け付けました…", ephemeral=True)
             except Exception:
-                traceback.print_exc()
+                report_error()
                 await interaction.response.send_message("認証中にエラーが発生しました。", ephemeral=True)
 
     class VerifyView(View):
@@ -130,64 +787,65 @@ class TicketCog(commands.Cog):
 
     class TicketCreateButton(Button):
         def __init__(self):
-            super().__init__(label="🎫 チケットを作成", style=discord.ButtonStyle.blurple)
+            super().__init__(label="🎫 チケットを作成", style=discord.ButtonStyle.blurple, custom_id="ticket:create")
 
+        @timed("button", "ticket_create")
         async def callback(self, interaction: discord.Interaction):
+            self_cog = interaction.client.get_cog("TicketCog")
+            # 先に応答だけ返す（チャンネル作成を待つと 3 秒を超えることがある）
+            await interaction.response.defer(ephemeral=True, thinking=True)
             try:
-                cfg = load_config()
-                cat_id = cfg.get("ticket_category_id")
+                gcfg = guild_config(interaction.guild.id)
+                cat_id = gcfg.get("ticket_category_id")
                 if not cat_id:
-                    await interaction.response.send_message("チケットカテゴリが未設定です。管理者に連絡してください。", ephemeral=True)
+                    await interaction.followup.send("チケットカテゴリが未設定です。管理者に連絡してください。", ephemeral=True)
                     return
                 guild = interaction.guild
                 category = guild.get_channel(cat_id)
                 if category is None or not isinstance(category, discord.CategoryChannel):
-                    await interaction.response.send_message("チケットカテゴリが見つかりません。管理者に連絡してください。", ephemeral=True)
+                    await interaction.followup.send("チケットカテゴリが見つかりません。管理者に連絡してください。", ephemeral=True)
                     return
 
-                # チケット番号
-                cfg["ticket_count"] = cfg.get("ticket_count", 0) + 1
-                ticket_no = cfg["ticket_count"]
-                save_config(cfg)
+                # チケット番号（リポジトリ側でアトミックに採番）
+                ticket_no = await self_cog.tickets.next_number(guild.id)
 
                 owner = interaction.user
                 safe_name = owner.name.replace(" ", "-")[:20]
                 channel_name = f"ticket-{ticket_no}-{safe_name}"
 
-                overwrites = {
-                    guild.default_role: discord.PermissionOverwrite(read_messages=False),
-                    owner: discord.PermissionOverwrite(read_messages=True, send_messages=True),
-                }
-                for rid in cfg.get("admin_role_ids", []):
-                    r = guild.get_role(rid)
-                    if r:
-                        overwrites[r] = discord.PermissionOverwrite(read_messages=True, send_messages=True)
+                # 管理者ロール分はギルドごとのテンプレートをコピーして本人だけ足す
+                overwrites = dict(self_cog.overwrite_template(guild))
+                overwrites[owner] = OWNER_OVERWRITE
 
                 channel = await category.create_text_channel(channel_name, overwrites=overwrites)
 
-                # config 登録
-                cfg = load_config()
-                cfg.setdefault("tickets", {})
-                cfg["tickets"][str(channel.id)] = {
+                # チケット登録
+                self_cog.ticket_channels.add(channel.id)
+                await self_cog.tickets.add(channel.id, {
+                    "guild_id": guild.id,
                     "owner_id": owner.id,
                     "number": ticket_no,
                     "state": "open",
                     "created_at": datetime.utcnow().isoformat()
-                }
-                save_config(cfg)
+                })
+                # 放置タイマー（last_activity 未保存の間は created_at から数える）
+                now = time.time()
+                self_cog.track_activity(channel.id, guild.id, now, now)
+                self_cog.record_event("created", guild.id, channel.id, {"number": ticket_no}, owner, created=now)
 
-                # チケット作成Embed + 管理View を送る
-                embed = embed_ticket_created(owner, ticket_no)
-                view = TicketCog.TicketManageView(is_open=True)
-                await channel.send(embed=embed, view=view)
-
-                # ログチャンネル通知（作成）
+                # ログチャンネル通知（作成）はキューに積むだけ
                 await TicketCog.notify_log_channel_static(guild, "Ticket Created", owner, ticket_no, channel)
 
-                await interaction.response.send_message("チケットを作成しました！", ephemeral=True)
+                # チケット作成Embed + 管理View と本人への返信は同時に送る
+                embed = embed_ticket_created(owner, ticket_no)
+                view = TicketCog.TicketManageView(is_open=True)
+                await asyncio.gather(
+                    channel.send(embed=embed, view=view),
+                    interaction.followup.send(f"チケットを作成しました！ {channel.mention}", ephemeral=True),
+                )
             except Exception:
-                traceback.print_exc()
-                await interaction.response.send_message("チケット作成中にエラーが発生しました。", ephemeral=True)
+                report_error()
+                await interaction.followup.send("チケット作成中にエラーが発生しました。", ephemeral=True)
 
     class TicketView(View):
         def __init__(self):
@@ -196,8 +854,9 @@ class TicketCog(commands.Cog):
 
     class CloseButton(Button):
         def __init__(self):
-            super().__init__(label="🔐 クローズする", style=discord.ButtonStyle.red)
+            super().__init__(label="🔐 クローズする", style=discord.ButtonStyle.red, custom_id="ticket:close")
 
+        @timed("button", "ticket_close")
         async def callback(self, interaction: discord.Interaction):
             self_cog = interaction.client.get_cog("TicketCog")
             try:
@@ -205,38 +864,23 @@ class TicketCog(commands.Cog):
                     await interaction.response.send_message("管理者のみがクローズできます。", ephemeral=True)
                     return
                 channel = interaction.channel
-                cfg = load_config()
-                ticket = cfg.get("tickets", {}).get(str(channel.id))
+                ticket = await self_cog.tickets.get(channel.id)
                 if not ticket:
                     await interaction.response.send_message("これはチケットチャンネルではありません。", ephemeral=True)
                     return
 
-                guild = interaction.guild
-                owner = guild.get_member(ticket["owner_id"])
-                try:
-                    if owner:
-                        await channel.set_permissions(owner, read_messages=False, send_messages=False)
-                except Exception:
-                    pass
-
-                ticket["state"] = "closed"
-                save_config(cfg)
-
-                view = TicketCog.TicketManageView(is_open=False)
-                embed = embed_ticket_closed(owner if owner else interaction.user, ticket["number"])
-                await channel.send(embed=embed, view=view)
-
-                await TicketCog.notify_log_channel_static(guild, "Ticket Closed", owner if owner else interaction.user, ticket["number"], channel)
+                await self_cog.close_ticket(channel, ticket, actor=interaction.user)
 
                 await interaction.response.send_message("チケットをクローズしました。", ephemeral=True)
             except Exception:
-                traceback.print_exc()
+                report_error()
                 await interaction.response.send_message("クローズ中にエラーが発生しました。", ephemeral=True)
 
     class SaveButton(Button):
         def __init__(self):
-            super().__init__(label="💾 保存（HTML）", style=discord.ButtonStyle.gray)
+            super().__init__(label="💾 保存（HTML）", style=discord.ButtonStyle.gray, custom_id="ticket:save")
 
+        @timed("button", "ticket_save")
         async def callback(self, interaction: discord.Interaction):
             self_cog = interaction.client.get_cog("TicketCog")
             try:
@@ -245,41 +889,21 @@ class TicketCog(commands.Cog):
                     return
                 await interaction.response.defer(ephemeral=True)
                 channel = interaction.channel
-                cfg = load_config()
-                ticket = cfg.get("tickets", {}).get(str(channel.id))
+                ticket = await self_cog.tickets.get(channel.id)
                 if not ticket:
                     await interaction.followup.send("これはチケットチャンネルではありません。", ephemeral=True)
                     return
-                try:
-                    file_path = await TicketCog.generate_html_log_static(channel)
-                    log_id = cfg.get("log_channel_id")
-                    if log_id:
-                        guild = interaction.guild
-                        log_chan = guild.get_channel(log_id)
-                        if log_chan:
-                            await log_chan.send(file=discord.File(file_path), embed=embed_log_notify("Saved (HTML)", guild.get_member(ticket["owner_id"]) or interaction.user, ticket["number"], channel))
-                    try:
-                        owner = interaction.guild.get_member(ticket["owner_id"])
-                    except Exception:
-                        owner = interaction.user
-                    await channel.send(embed=embed_save_complete(owner, ticket["number"]))
-                    await interaction.followup.send("HTMLログを作成して送信しました。", ephemeral=True)
-                    try:
-                        os.remove(file_path)
-                    except Exception:
-                        pass
-                    await TicketCog.notify_log_channel_static(interaction.guild, "Ticket Saved", owner, ticket["number"], channel)
-                except Exception:
-                    traceback.print_exc()
-                    await interaction.followup.send("ログ保存中にエラーが発生しました。", ephemeral=True)
+                # 重い処理（履歴取得・HTML 生成・アップロード）はワーカーへ
+                await self_cog.enqueue_export(interaction, "save", ticket)
             except Exception:
-                traceback.print_exc()
-                await interaction.response.send_message("保存処理でエラーが発生しました。", ephemeral=True)
+                report_error()
+                await interaction.followup.send("保存処理でエラーが発生しました。", ephemeral=True)
 
     class ReopenButton(Button):
         def __init__(self):
-            super().__init__(label="♻ 再開", style=discord.ButtonStyle.green)
+            super().__init__(label="♻ 再開", style=discord.ButtonStyle.green, custom_id="ticket:reopen")
 
+        @timed("button", "ticket_reopen")
         async def callback(self, interaction: discord.Interaction):
             self_cog = interaction.client.get_cog("TicketCog")
             try:
@@ -287,70 +911,37 @@ class TicketCog(commands.Cog):
                     await interaction.response.send_message("管理者のみが再開できます。", ephemeral=True)
                     return
                 channel = interaction.channel
-                cfg = load_config()
-                ticket = cfg.get("tickets", {}).get(str(channel.id))
+                ticket = await self_cog.tickets.get(channel.id)
                 if not ticket:
                     await interaction.response.send_message("これはチケットチャンネルではありません。", ephemeral=True)
                     return
-                guild = interaction.guild
-                owner = guild.get_member(ticket["owner_id"])
-                try:
-                    if owner:
-                        await channel.set_permissions(owner, read_messages=True, send_messages=True)
-                except Exception:
-                    pass
-                ticket["state"] = "open"
-                save_config(cfg)
-                view = TicketCog.TicketManageView(is_open=True)
-                await channel.send("チケットを再開しました。", view=view)
-                await TicketCog.notify_log_channel_static(guild, "Ticket Reopened", owner if owner else interaction.user, ticket["number"], channel)
+                await self_cog.reopen_ticket(channel, ticket, actor=interaction.user)
                 await interaction.response.send_message("チケットを再開しました。", ephemeral=True)
             except Exception:
-                traceback.print_exc()
+                report_error()
                 await interaction.response.send_message("再開処理でエラーが発生しました。", ephemeral=True)
 
     class DeleteButton(Button):
         def __init__(self):
-            super().__init__(label="❌ 削除", style=discord.ButtonStyle.danger)
+            super().__init__(label="❌ 削除", style=discord.ButtonStyle.danger, custom_id="ticket:delete")
 
+        @timed("button", "ticket_delete")
         async def callback(self, interaction: discord.Interaction):
             self_cog = interaction.client.get_cog("TicketCog")
             try:
                 if not self_cog.has_admin_role_member(interaction.user):
                     await interaction.response.send_message("管理者のみが削除できます。", ephemeral=True)
                     return
+                await interaction.response.defer(ephemeral=True)
                 channel = interaction.channel
-                cfg = load_config()
-                ticket = cfg.get("tickets", {}).get(str(channel.id))
+                ticket = await self_cog.tickets.get(channel.id)
                 if not ticket:
-                    await interaction.response.send_message("これはチケットチャンネルではありません。", ephemeral=True)
+                    await interaction.followup.send("これはチケットチャンネルではありません。", ephemeral=True)
                     return
-
-                try:
-                    file_path = await TicketCog.generate_html_log_static(channel)
-                    log_id = cfg.get("log_channel_id")
-                    if log_id:
-                        log_chan = interaction.guild.get_channel(log_id)
-                        if log_chan:
-                            await log_chan.send(file=discord.File(file_path), embed=embed_log_notify("Deleted (Saved)", interaction.guild.get_member(ticket["owner_id"]) or interaction.user, ticket["number"], channel))
-                    try:
-                        os.remove(file_path)
-                    except Exception:
-                        pass
-                except Exception:
-                    traceback.print_exc()
-
-                try:
-                    del cfg["tickets"][str(channel.id)]
-                    save_config(cfg)
-                except Exception:
-                    pass
-
-                await TicketCog.notify_log_channel_static(interaction.guild, "Ticket Deleted", interaction.guild.get_member(ticket["owner_id"]) or interaction.user, ticket["number"], channel)
-                await channel.delete()
+                await self_cog.enqueue_export(interaction, "delete", ticket)
             except Exception:
-                traceback.print_exc()
-                await interaction.response.send_message("削除処理でエラーが発生しました。", ephemeral=True)
+                report_error()
+                await interaction.followup.send("削除処理でエラーが発生しました。", ephemeral=True)
 
     class TicketManageView(View):
         def __init__(self, is_open: bool = True):
@@ -366,57 +957,22 @@ class TicketCog(commands.Cog):
     # static helper functions for use in inner classes
     # -------------------------
     @staticmethod
-    async def generate_html_log_static(channel: discord.TextChannel) -> str:
-        messages = []
-        async for m in channel.history(limit=None, oldest_first=True):
-            messages.append(m)
-        safe_channel_name = f"{channel.name}-{int(datetime.utcnow().timestamp())}"
-        filename = f"ticket_{safe_channel_name}.html"
-        lines = []
-        lines.append("<!doctype html>")
-        lines.append("<html><head><meta charset='utf-8'><title>Ticket Log</title></head><body>")
-        lines.append(f"<h2>Channel: {html.escape(channel.name)}</h2>")
-        lines.append(f"<h3>Exported: {datetime.utcnow().isoformat()} (UTC)</h3>")
-        lines.append("<hr>")
-        for m in messages:
-            t = m.created_at.isoformat()
-            author = html.escape(f"{m.author} ({m.author.id})")
-            content = html.escape(m.content) if m.content else ""
-            att_html = ""
-            if m.attachments:
-                for a in m.attachments:
-                    url = html.escape(a.url)
-                    att_html += f"<div>Attachment: <a href='{url}' target='_blank'>{url}</a></div>"
-            embed_info = ""
-            if m.embeds:
-                embed_info = "<div>Embed present</div>"
-            lines.append("<div style='margin-bottom:12px;padding:8px;border:1px solid #ddd;'>")
-            lines.append(f"<div style='color:#666;font-size:12px;'>[{t}] {author}</div>")
-            if content:
-                text_html = "<br>".join(html.escape(part) for part in m.content.splitlines())
-                lines.append(f"<div style='margin-top:6px;'>{text_html}</div>")
-            if att_html:
-                lines.append(att_html)
-            if embed_info:
-                lines.append(embed_info)
-            lines.append("</div>")
-        lines.append("</body></html>")
-        path = pathlib.Path(filename)
-        path.write_text("\n".join(lines), encoding="utf-8")
-        return str(path.resolve())
+    async def generate_html_log_static(channel: discord.TextChannel, message_log: MessageLog = None, executor=None) -> str:
+        # ローカルログがあればそこから描画（履歴 API は差分だけ）
+        return await export_html(channel, message_log, executor=executor)
 
     @staticmethod
     async def notify_log_channel_static(guild: discord.Guild, action: str, owner: discord.Member, ticket_no: int, channel: discord.TextChannel):
         try:
-            cfg = load_config()
-            log_id = cfg.get("log_channel_id")
+            log_id = guild_config(guild.id).get("log_channel_id")
             if not log_id:
                 return
             log_chan = guild.get_channel(log_id)
             if not log_chan:
                 return
+            # 送信はキューに任せる（まとめて送るので呼び出し側は待たない）
             embed = embed_log_notify(action, owner, ticket_no, channel)
-            await log_chan.send(embed=embed)
+            get_log_sink().submit(log_chan, embed=embed)
         except Exception:
             traceback.print_exc()
 
@@ -428,20 +984,21 @@ class TicketCog(commands.Cog):
         if not self.has_admin_role_member(ctx.author):
             await ctx.send("権限がありません。")
             return
-        await ctx.send("サブコマンド: addrole / removerole / list")
+        await ctx.send("サブコマンド: addrole / removerole / list / queue / transcript / claimlegacy / reindex / compact / idle / bulk / bulkcancel")
 
     @ticketadmin.command()
     async def addrole(self, ctx, role: discord.Role):
         if not self.has_admin_role_member(ctx.author):
             await ctx.send("権限がありません。")
             return
-        cfg = load_config()
+        cfg = guild_config(ctx.guild.id)
         rid = role.id
         if rid in cfg.get("admin_role_ids", []):
             await ctx.send("このロールはすでに管理者ロールです。")
             return
         cfg.setdefault("admin_role_ids", []).append(rid)
         save_config(cfg)
+        self.invalidate_guild_settings(ctx.guild.id)
         await ctx.send(f"{role.mention} を管理者ロールに追加しました。")
 
     @ticketadmin.command()
@@ -449,13 +1006,14 @@ class TicketCog(commands.Cog):
         if not self.has_admin_role_member(ctx.author):
             await ctx.send("権限がありません。")
             return
-        cfg = load_config()
+        cfg = guild_config(ctx.guild.id)
         rid = role.id
         if rid not in cfg.get("admin_role_ids", []):
             await ctx.send("そのロールは管理者ロールではありません。")
             return
         cfg["admin_role_ids"].remove(rid)
         save_config(cfg)
+        self.invalidate_guild_settings(ctx.guild.id)
         await ctx.send(f"{role.mention} を管理者ロールから削除しました。")
 
     @ticketadmin.command()
@@ -463,7 +1021,7 @@ class TicketCog(commands.Cog):
         if not self.has_admin_role_member(ctx.author):
             await ctx.send("権限がありません。")
             return
-        cfg = load_config()
+        cfg = guild_config(ctx.guild.id)
         ids = cfg.get("admin_role_ids", [])
         if not ids:
             await ctx.send("管理者ロールは未設定です。サーバー管理権限を持つユーザーはデフォルトで管理可能です。")
@@ -475,12 +1033,297 @@ class TicketCog(commands.Cog):
         await ctx.send("管理者ロール: " + ", ".join(mentions))
     
 
+    @ticketadmin.command()
+    async def queue(self, ctx):
+        if not self.has_admin_role_member(ctx.author):
+            await ctx.send("権限がありません。")
+            return
+        st = self.exporter.stats()
+        lines = [
+            f"待ち: {st['depth']}件 / 実行中: {st['running']}件",
+            f"完了: {st['done']}件 / 失敗: {st['failed']}件",
+            f"平均待ち時間: {st['avg_wait']:.2f}s / 平均処理時間: {st['avg_run']:.2f}s / 最大: {st['max_run']:.2f}s",
+        ]
+        ls = get_log_sink().stats()
+        lines.append(
+            f"ログ送信: 待ち {ls['pending']}件 / 送信 {ls['sent_events']}件（{ls['sent_messages']}通）"
+            f" / 遅延 {ls['delayed']}件 / 破棄 {ls['dropped']}件 / 失敗 {ls['failed']}件"
+        )
+        nxt = self.idle.next_deadline()
+        lines.append(
+            f"放置タイマー: {len(self.idle)}件 / 次の期限: "
+            + (datetime.fromtimestamp(nxt, timezone.utc).strftime("%Y-%m-%d %H:%M UTC") if nxt else "なし")
+        )
+        if self.attachments is not None:
+            at = self.attachments.stats()
+            lines.append(
+                f"添付保存: 新規 {at['downloaded']}件（{at['bytes'] / 1024 / 1024:.1f}MB） / 重複 {at['deduped']}件"
+                f" / 上限超え {at['skipped']}件 / 失敗 {at['failed']}件 / 所要 {at['seconds']:.1f}s"
+            )
+        for kind, no, wait, run, ok in reversed(self.exporter.recent):
+            lines.append(f"- #{no} {kind} {'OK' if ok else 'NG'} 待ち {wait:.2f}s 処理 {run:.2f}s")
+        await ctx.send("\n".join(lines))
+
+    @ticketadmin.command()
+    async def transcript(self, ctx, number: int):
+        if not self.has_admin_role_member(ctx.author):
+            await ctx.send("権限がありません。")
+            return
+        archives = find_archives(number, ctx.guild.id)
+        if not archives:
+            await ctx.send(f"チケット {number} の保存済みログが見つかりません。")
+            return
+        # 保存済みの正本から HTML をその場で作り直す
+        parts = await render_html_parts(archives[0], self.upload_limit(ctx.guild), self.exporter.executor)
+        try:
+            await TicketCog.send_parts(ctx.channel, parts)
+        finally:
+            for p in parts:
+                try:
+                    os.remove(p)
+                except Exception:
+                    pass
+
+    @ticketadmin.command()
+    async def reindex(self, ctx):
+        """保存済みの正本をすべて検索インデックスに登録し直す"""
+        if not self.has_admin_role_member(ctx.author):
+            await ctx.send("権限がありません。")
+            return
+        started = time.perf_counter()
+        files, messages = await self.search.reindex_all()
+        await ctx.send(f"検索インデックスを作り直しました。（正本 {files}件 / メッセージ {messages}件 / {time.perf_counter() - started:.1f}s）")
+
+    @commands.command()
+    async def ticketsearch(self, ctx, *, query: str = ""):
+        """保存済みチケットの全文検索
+
+        !ticketsearch 返金 エラー owner:@user no:12 after:2024-01-01 before:2024-07-01
+        """
+        if not self.has_admin_role_member(ctx.author):
+            await ctx.send("権限がありません。")
+            return
+        filters = {"owner": None, "no": None, "after": None, "before": None}
+        terms = []
+        for token in query.split():
+            name, sep, value = token.partition(":")
+            if sep and name in filters and value:
+                filters[name] = value
+            else:
+                terms.append(token)
+        try:
+            owner_id = int(filters["owner"].strip("<@!>")) if filters["owner"] else None
+            number = int(filters["no"].lstrip("#")) if filters["no"] else None
+        except ValueError:
+            await ctx.send("owner: / no: の指定が正しくありません。")
+            return
+        if not terms:
+            await ctx.send("使い方: `!ticketsearch 語 [語…] [owner:@user] [no:番号] [after:YYYY-MM-DD] [before:YYYY-MM-DD]`")
+            return
+
+        hits, took = await self.search.search(
+            ctx.guild.id, " ".join(terms), owner_id=owner_id, number=number,
+            after=filters["after"], before=filters["before"], limit=10,
+        )
+        if not hits:
+            await ctx.send(f"🔎 見つかりませんでした。（{took * 1000:.1f}ms）")
+            return
+        lines = [f"🔎 {len(hits)}件（{took * 1000:.1f}ms）"]
+        for h in hits:
+            snippet = discord.utils.escape_markdown(h["snippet"].replace("\n", " "))
+            snippet = snippet.replace(HIT_START, "**").replace(HIT_END, "**")
+            more = f" 他{h['matches'] - 1}件" if h["matches"] > 1 else ""
+            lines.append(f"**#{h['number']}** <@{h['owner_id']}> {h['ts'][:10]} {discord.utils.escape_markdown(h['author'])}{more}\n> {snippet}")
+        # 長すぎる時は切る（2000 文字制限）
+        text = "\n".join(lines)
+        if len(text) > 1900:
+            text = text[:1900] + "…"
+        await ctx.send(text, allowed_mentions=discord.AllowedMentions.none())
+
+    @commands.command()
+    async def ticketstats(self, ctx, days: int = 7):
+        """チケットの件数と対応時間（集計済みの値を読むだけ）
+
+        !ticketstats [日数]  日数は直近の件数を数える範囲（既定 7 日）
+        """
+        if not self.has_admin_role_member(ctx.author):
+            await ctx.send("権限がありません。")
+            return
+        snap = self.stats.snapshot(ctx.guild.id, max(1, days))
+        labels = {"created": "作成", "first_response": "初回返信", "closed": "クローズ",
+                  "reopened": "再開", "saved": "保存", "deleted": "削除"}
+        recent = snap["recent"]
+        totals = snap["totals"]
+        lines = [
+            f"📊 チケット統計（オープン {snap['states']['open']}件 / クローズ {snap['states']['closed']}件"
+            f" / 返信待ち {snap['waiting']}件）",
+            f"直近 {snap['days']}日: " + " / ".join(f"{labels[e]} {recent.get(e, 0)}" for e in labels),
+            "累計: " + " / ".join(f"{labels[e]} {totals.get(e, 0)}" for e in labels),
+        ]
+        for key, title in (("first_response", "初回返信まで"), ("close", "クローズまで")):
+            s = snap[key]
+            if not s["count"]:
+                lines.append(f"{title}: データなし")
+                continue
+            lines.append(
+                f"{title}: 中央値 ~{format_duration(s['p50'])} / p95 ~{format_duration(s['p95'])}"
+                f" / 平均 {format_duration(s['mean'])}（{s['count']}件）"
+            )
+        await ctx.send("\n".join(lines))
+
+    @ticketadmin.command()
+    async def compact(self, ctx, days: float = None):
+        """クローズから days 日（省略時は設定値）過ぎたチケットを保管先へ移す"""
+        if not self.has_admin_role_member(ctx.author):
+            await ctx.send("権限がありません。")
+            return
+        if days is not None and days < 0:
+            await ctx.send("日数は 0 以上で指定してください。")
+            return
+        started = time.perf_counter()
+        n = await self.compact_closed(days)
+        st = await self.tickets.archive.stats()
+        await ctx.send(
+            f"🗄️ {n}件を保管先へ移しました。（{time.perf_counter() - started:.2f}s）\n"
+            f"作業中: {await self.tickets.count()}件 / 保管先: {st['entries']}件"
+            f"（{st['segments']}ファイル, {st['bytes'] / 1024:.0f}KB）"
+        )
+
+    @ticketadmin.command()
+    async def bulk(self, ctx, action: str, *options: str):
+        """条件に合うチケットをまとめて close / reopen / save / delete する
+
+        !ticketadmin bulk close idle:14d
+        !ticketadmin bulk delete state:closed older:90d owner:@user limit:200 confirm
+        confirm を付けない時は対象の確認だけ（何もしない）。
+        delete は既定でクローズ済みだけ。オープン中も消すには state:all を明示する。
+        """
+        if not self.has_admin_role_member(ctx.author):
+            await ctx.send("権限がありません。")
+            return
+        action = action.lower()
+        if action not in self.BULK_ACTIONS:
+            await ctx.send(f"操作は {' / '.join(self.BULK_ACTIONS)} のどれかです。")
+            return
+
+        # 既定の対象: close は open、reopen / delete は closed、save は全部
+        opts = {"state": {"close": "open", "reopen": "closed", "delete": "closed"}.get(action)}
+        confirm = False
+        for token in options:
+            name, sep, value = token.partition(":")
+            if not sep:
+                if token.lower() == "confirm":
+                    confirm = True
+                    continue
+                await ctx.send(f"不明な指定です: {token}")
+                return
+            opts[name.lower()] = value
+        try:
+            state = opts["state"] if opts["state"] not in ("", "all") else None
+            older = _parse_duration(opts["older"]) if "older" in opts else None
+            idle = _parse_duration(opts["idle"]) if "idle" in opts else None
+            owner_id = int(opts["owner"].strip("<@!>")) if "owner" in opts else None
+            limit = int(opts["limit"]) if "limit" in opts else None
+            concurrency = int(opts.get("concurrency") or self.store.data.get("bulk_concurrency", 4))
+            rate = float(opts.get("rate") or self.store.data.get("bulk_rate", 2.0))
+        except ValueError:
+            await ctx.send("指定の形式が正しくありません。（例: older:30d idle:12h owner:@user limit:100 rate:2）")
+            return
+        if state not in (None, "open", "closed"):
+            await ctx.send("state: は open / closed / all のどれかです。")
+            return
+
+        # 確認と予約の間に await を挟まない（同時に来た 2 つ目はここで断る）
+        gid = ctx.guild.id
+        if gid in self._bulk_jobs:
+            running = self._bulk_jobs[gid]
+            name = running.name if running is not None else "準備中"
+            await ctx.send(f"一括操作（{name}）を実行中です。`!ticketadmin bulkcancel` で止められます。")
+            return
+        self._bulk_jobs[gid] = None  # 対象を選んでいる間も予約しておく
+        try:
+            targets = await self.select_tickets(gid, state, older, idle, owner_id)
+            if limit is not None:
+                targets = targets[:limit]
+            if not targets:
+                await ctx.send("条件に合うチケットはありません。")
+                return
+            numbers = ", ".join(f"#{t['number']}" for t in targets[:20]) + (" …" if len(targets) > 20 else "")
+            if not confirm:
+                await ctx.send(
+                    f"🔍 {action} の対象: {len(targets)}件（{numbers}）\n"
+                    f"実行するには同じコマンドの最後に `confirm` を付けてください。（同時 {concurrency} / 毎秒 {rate:g}件）"
+                )
+                return
+
+            job = BulkJob(action, targets, lambda t: self.bulk_action(action, t, ctx.author),
+                          concurrency=concurrency, rate=rate, label=lambda t: f"#{t['number']}")
+            self._bulk_jobs[gid] = job
+            status = await ctx.send(f"⏳ {action}: 0/{len(targets)}件")
+
+            async def progress(j):
+                await status.edit(content=(
+                    f"⏳ {action}: {j.done}/{len(j.items)}件"
+                    f"（成功 {len(j.ok)} / 対象外 {len(j.skipped)} / 失敗 {len(j.failed)}・実行中 {j.running}）"
+                ))
+
+            await job.run(progress, interval=3.0)
+        finally:
+            self._bulk_jobs.pop(gid, None)
+        await ctx.send(f"✅ 一括 {action} が終わりました。\n" + job.summary())
+
+    @ticketadmin.command()
+    async def bulkcancel(self, ctx):
+        if not self.has_admin_role_member(ctx.author):
+            await ctx.send("権限がありません。")
+            return
+        job = self._bulk_jobs.get(ctx.guild.id)
+        if job is None:
+            await ctx.send("実行中の一括操作はありません。")
+            return
+        job.cancel()
+        await ctx.send(f"一括 {job.name} を止めます。（実行中の {job.running}件は最後まで処理します）")
+
+    @ticketadmin.command(name="idle")
+    async def set_idle(self, ctx, close_hours: float, remind_hours: float = 0):
+        """放置チケットの自動クローズ / 催促までの時間（0 で無効）"""
+        if not self.has_admin_role_member(ctx.author):
+            await ctx.send("権限がありません。")
+            return
+        if close_hours < 0 or remind_hours < 0:
+            await ctx.send("時間は 0 以上で指定してください。")
+            return
+        cfg = guild_config(ctx.guild.id)
+        cfg["idle_close_hours"] = close_hours
+        cfg["idle_remind_hours"] = remind_hours
+        save_config(cfg)
+        self.reschedule_idle()
+        if close_hours <= 0 and remind_hours > 0:
+            await ctx.send(f"最後の発言から {remind_hours:g} 時間で催促します。（自動クローズはしません）")
+        elif close_hours <= 0:
+            await ctx.send("放置チケットの催促と自動クローズを無効にしました。")
+        elif 0 < remind_hours < close_hours:
+            await ctx.send(f"最後の発言から {remind_hours:g} 時間で催促、{close_hours:g} 時間で自動クローズします。")
+        else:
+            await ctx.send(f"最後の発言から {close_hours:g} 時間で自動クローズします。")
+
+    @ticketadmin.command()
+    async def claimlegacy(self, ctx):
+        if not self.has_admin_role_member(ctx.author):
+            await ctx.send("権限がありません。")
+            return
+        if not self.store.legacy_keys():
+            await ctx.send("移行が必要な旧形式の設定はありません。")
+            return
+        moved, claimed = await self.claim_legacy(ctx.guild.id)
+        await ctx.send(f"旧形式の設定をこのサーバーに移行しました。（チケット {claimed}件）")
+
     @commands.command()
     async def setticketcat(self, ctx, category: discord.CategoryChannel):
         if not self.has_admin_role_member(ctx.author):
             await ctx.send("権限がありません。")
             return
-        cfg = load_config()
+        cfg = guild_config(ctx.guild.id)
         cfg["ticket_category_id"] = category.id
         save_config(cfg)
         await ctx.send(f"チケットカテゴリを {category.name} に設定しました。")
@@ -490,7 +1333,7 @@ class TicketCog(commands.Cog):
         if not self.has_admin_role_member(ctx.author):
             await ctx.send("権限がありません。")
             return
-        cfg = load_config()
+        cfg = guild_config(ctx.guild.id)
         cfg["log_channel_id"] = ctx.channel.id
         save_config(cfg)
         await ctx.send(f"このチャンネル ({ctx.channel.mention}) をチケットログ送信先に設定しました。")
@@ -500,12 +1343,13 @@ class TicketCog(commands.Cog):
         if not self.has_admin_role_member(ctx.author):
             await ctx.send("権限がありません。")
             return
-        cfg = load_config()
+        cfg = guild_config(ctx.guild.id)
         if member.id in cfg.get("whitelist_user_ids", []):
             await ctx.send("既にホワイトリストに存在します。")
             return
         cfg.setdefault("whitelist_user_ids", []).append(member.id)
         save_config(cfg)
+        self.invalidate_guild_settings(ctx.guild.id)
         await ctx.send(f"{member.mention} をホワイトリストに追加しました。")
 
     @commands.command()
@@ -513,15 +1357,17 @@ class TicketCog(commands.Cog):
         if not self.has_admin_role_member(ctx.author):
             await ctx.send("権限がありません。")
             return
-        cfg = load_config()
+        cfg = guild_config(ctx.guild.id)
         if member.id not in cfg.get("whitelist_user_ids", []):
             await ctx.send("ホワイトリストに存在しません。")
             return
         cfg["whitelist_user_ids"].remove(member.id)
         save_config(cfg)
+        self.invalidate_guild_settings(ctx.guild.id)
         await ctx.send(f"{member.mention} をホワイトリストから削除しました。")
 
-    @commands.command()
+    # VerifyCog の !setverify と名前が重なると Cog が読み込めないので別名にする
+    @commands.command(name="setticketverify")
     async def setverify(self, ctx):
         if not self.has_admin_role_member(ctx.author):
             await ctx.send("権限がありません。")
@@ -1,41 +1,94 @@
 import discord
 from discord.ext import commands
 from discord.ui import Button, View
-import json
-import os
 
-def load_config():
-    if not os.path.exists("config.json"):
-        with open("config.json", "w", encoding="utf8") as f:
-            json.dump({"verify_role": None, "verify_log": None}, f)
+from utils.config_store import get_config
+from utils.metrics import timed
+from utils.verify_queue import get_verify_queue
 
-    with open("config.json", "r", encoding="utf8") as f:
-        return json.load(f)
+CONFIG_FILE = "config.json"
+DEFAULT_CONFIG = {"guilds": {}}  # guild_id -> GUILD_DEFAULTS と同じ形
+GUILD_DEFAULTS = {"verify_role": None, "verify_log": None}
+
+class VerifyPanelButton(Button):
+    def __init__(self):
+        # custom_id 固定: 再起動後も設置済みパネルのボタンが効く
+        super().__init__(label="認証する", style=discord.ButtonStyle.green, custom_id="verify:panel")
+
+    @timed("button", "verify_panel")
+    async def callback(self, interaction: discord.Interaction):
+        cfg = interaction.client.get_cog("VerifyCog").store.guild(interaction.guild.id)
+
+        role_id = cfg.get("verify_role")
+        if role_id is None:
+            return await interaction.response.send_message("❌ 認証ロールが設定されていません！", ephemeral=True)
+
+        # すぐ応答して、ロール付与とログはキューに任せる（連打は 1 件にまとめる）
+        result = get_verify_queue().submit(interaction, role_id, cfg.get("verify_log"))
+        if result == "duplicate":
+            return await interaction.response.send_message("⏳ 認証処理中です。少々お待ちください。", ephemeral=True)
+        if result == "full":
+            return await interaction.response.send_message("⚠️ 混み合っています。しばらくしてから再度お試しください。", ephemeral=True)
+        await interaction.response.send_message("⏳ 認証を受け付けました…", ephemeral=True)
+
+
+class VerifyPanelView(View):
+    def __init__(self):
+        super().__init__(timeout=None)
+        self.add_item(VerifyPanelButton())
 
-def save_config(cfg):
-    with open("config.json", "w", encoding="utf8") as f:
-        json.dump(cfg, f, indent=4)
 
 class VerifyCog(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
+        # 設定はメモリから読む（外部編集は設定サービスが検知して反映）
+        self.store = get_config(bot).section("verify", CONFIG_FILE, DEFAULT_CONFIG, GUILD_DEFAULTS)
+
+    async def cog_load(self):
+        self.bot.add_view(VerifyPanelView())
+
+    async def cog_unload(self):
+        await get_verify_queue().close()
+        await self.store.close()
+
+    @commands.Cog.listener()
+    async def on_ready(self):
+        # 旧形式（トップレベル）の設定は、参加ギルドが 1 つの時だけ自動で移す
+        keys = self.store.legacy_keys()
+        if not keys:
+            return
+        if len(self.bot.guilds) == 1:
+            self.store.migrate_legacy(self.bot.guilds[0].id)
+            print(f"📦 旧形式の認証設定をギルド {self.bot.guilds[0].id} に移行しました")
+        else:
+            print(f"⚠️ 旧形式の認証設定（{', '.join(keys)}）があります。対象ギルドで !claimverifylegacy を実行してください。")
+
+    # 旧形式の認証設定をこのギルドのものにする
+    @commands.command()
+    @commands.has_permissions(administrator=True)
+    async def claimverifylegacy(self, ctx):
+        keys = self.store.legacy_keys()
+        if not self.store.migrate_legacy(ctx.guild.id):
+            await ctx.reply("旧形式の認証設定はありません。")
+            return
+        await ctx.reply(f"📦 旧形式の認証設定（{', '.join(keys)}）をこのギルドに移行しました。")
 
     # 認証ロール設定
     @commands.command()
     @commands.has_permissions(administrator=True)
     async def setverifyrole(self, ctx, role: discord.Role):
-        cfg = load_config()
+        cfg = self.store.guild(ctx.guild.id)
         cfg["verify_role"] = role.id
-        save_config(cfg)
+        self.store.mark_dirty()
         await ctx.reply(f"✅ 認証ロールを **{role.name}** に設定しました！")
 
     # ログチャンネル設定
     @commands.command()
     @commands.has_permissions(administrator=True)
     async def verifylogset(self, ctx, ch: discord.TextChannel):
-        cfg = load_config()
+        cfg = self.store.guild(ctx.guild.id)
         cfg["verify_log"] = ch.id
-        save_config(cfg)
+        self.store.mark_dirty()
         await ctx.reply(f"📘 認証ログチャンネルを **{ch.mention}** に設定しました！")
 
     # 認証パネル設置
@@ -48,32 +101,18 @@ class VerifyCog(commands.Cog):
             color=0x00ffcc
         )
 
-        button = Button(label="認証する", style=discord.ButtonStyle.green)
-        
-        async def button_callback(interaction: discord.Interaction):
-            cfg = load_config()
-
-            role_id = cfg.get("verify_role")
-            if role_id is None:
-                return await interaction.response.send_message("❌ 認証ロールが設定されていません！", ephemeral=True)
-
-            role = interaction.guild.get_role(role_id)
-            await interaction.user.add_roles(role)
-
-            # ログ
-            log_ch = cfg.get("verify_log")
-            if log_ch:
-                channel = interaction.guild.get_channel(log_ch)
-                if channel:
-                    await channel.send(f"✅ {interaction.user.mention} が認証しました。")
+        await ctx.send(embed=embed, view=VerifyPanelView())
 
-            await interaction.response.send_message("🎉 認証成功しました！", ephemeral=True)
-
-        button.callback = button_callback
-        view = View(timeout=None)
-        view.add_item(button)
-
-        await ctx.send(embed=embed, view=view)
+    # 認証キューの状況
+    @commands.command()
+    @commands.has_permissions(administrator=True)
+    async def verifystats(self, ctx):
+        st = get_verify_queue().stats()
+        await ctx.reply(
+            f"📊 待ち: {st['backlog']}件 / 直近1分: {st['per_minute']}件\n"
+            f"付与: {st['granted']}件 / 付与済み: {st['skipped']}件 / 失敗: {st['failed']}件 / 連打まとめ: {st['deduped']}件\n"
+            f"平均待ち時間: {st['avg_latency']:.2f}s"
+        )
 
 async def setup(bot):
     await bot.add_cog(VerifyCog(bot))
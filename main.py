@@ -1,44 +1,77 @@
 import discord
 from discord.ext import commands
-import json
 import os
 from dotenv import load_dotenv
 
+from utils.config_store import get_config
+from utils.gateway import bot_options, cache_report, format_cache_report
+from utils.metrics import MetricsServer, instrument_bot
+from utils.startup import get_timeline, load_extensions
+
 # ===== .env 読み込み =====
 load_dotenv()
 TOKEN = os.getenv("TOKEN")
+# METRICS_PORT を設定すると 127.0.0.1:<port>/metrics で Prometheus 形式のメトリクスを返す
+METRICS_PORT = os.getenv("METRICS_PORT")
 
-intents = discord.Intents.all()
-bot = commands.Bot(command_prefix="!", intents=intents)
-
-# 設定ファイルロード
-def load_config():
-    if not os.path.exists("config.json"):
-        with open("config.json", "w", encoding="utf8") as f:
-            json.dump({"verify_role": None, "verify_log": None}, f)
-    with open("config.json", "r", encoding="utf8") as f:
-        return json.load(f)
+# ===== シャード設定 =====
+# SHARD_COUNT: 全体のシャード数 / SHARD_IDS: このプロセスが受け持つシャード（例 "0,1"）
+# AUTO_SHARD=1 だけならシャード数は Discord の推奨値に任せる
+SHARD_COUNT = os.getenv("SHARD_COUNT")
+SHARD_IDS = os.getenv("SHARD_IDS")
+AUTO_SHARD = os.getenv("AUTO_SHARD", "").lower() in ("1", "true", "yes")
 
-def save_config(cfg):
-    with open("config.json", "w", encoding="utf8") as f:
-        json.dump(cfg, f, indent=4)
+EXTENSIONS = ("cogs.verify", "cogs.ticket", "cogs.autoreply")
 
-config = load_config()
 
-@bot.event
-async def on_ready():
-    print("🚀 BOT起動しました")
+def create_bot(profile=None, metrics_port=METRICS_PORT) -> commands.Bot:
+    """Cog 読み込みまで設定済みの bot を作る（負荷試験ハーネスからも使う）"""
+    # ===== ゲートウェイ設定 =====
+    # GATEWAY_PROFILE=lean: 必要な intent だけ + メンバー / メッセージのキャッシュなし（既定は full）
+    options = bot_options(profile)
+    if SHARD_COUNT or SHARD_IDS or AUTO_SHARD:
+        shard_kwargs = {}
+        if SHARD_COUNT:
+            shard_kwargs["shard_count"] = int(SHARD_COUNT)
+        if SHARD_IDS:
+            # shard_ids を指定する時は shard_count も必須（プロセス間で分担する場合）
+            if not SHARD_COUNT:
+                raise SystemExit("SHARD_IDS を使う場合は SHARD_COUNT も設定してください")
+            shard_kwargs["shard_ids"] = [int(x) for x in SHARD_IDS.split(",") if x.strip()]
+        bot = commands.AutoShardedBot(command_prefix="!", **options, **shard_kwargs)
+    else:
+        bot = commands.Bot(command_prefix="!", **options)
 
-# Render / Worker で正しく動く Cogs ロード方式
-@bot.event
-async def setup_hook():
-    await bot.load_extension("cogs.verify")
-    await bot.load_extension("cogs.ticket")
-    await bot.load_extension("cogs.autoreply")
+    # 設定は共通の設定サービスで管理（各 Cog がセクションを登録する）
+    config = get_config(bot)
+    timeline = get_timeline(bot)
 
-print("🔌 TOKEN 読み込み確認:", "成功" if TOKEN else "失敗（.env確認しろ）")
+    @bot.event
+    async def on_ready():
+        print("🚀 BOT起動しました")
+        if not timeline.printed:
+            timeline.mark("READY")
+            timeline.print_once()
+        print("🧠 キャッシュ:", format_cache_report(cache_report(bot)))
+        if isinstance(bot, commands.AutoShardedBot):
+            print(f"🧩 シャード: {bot.shard_ids or 'all'} / {bot.shard_count}（ギルド {len(bot.guilds)}件）")
 
-bot.run(TOKEN)
+    # Render / Worker で正しく動く Cogs ロード方式
+    @bot.event
+    async def setup_hook():
+        timeline.mark("setup_hook 開始")
+        config.start()  # 設定ファイルの外部編集を監視
+        instrument_bot(bot)
+        if metrics_port:
+            await MetricsServer(port=int(metrics_port)).start()
+        timeline.mark("設定 / メトリクス")
+        # Cog 同士は依存しないので並行に読み込む（永続 View の登録も各 cog_load で済む）
+        await load_extensions(bot, EXTENSIONS)
+        timeline.mark("Cog 読み込み完了")
 
+    return bot
 
 
+if __name__ == "__main__":
+    print("🔌 TOKEN 読み込み確認:", "成功" if TOKEN else "失敗（.env確認しろ）")
+    create_bot().run(TOKEN)
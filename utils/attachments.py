@@ -0,0 +1,191 @@
+# utils/attachments.py
+import asyncio
+import hashlib
+import os
+import posixpath
+import re
+import time
+import traceback
+import uuid
+from urllib.parse import urlsplit
+
+import aiohttp
+
+ATTACHMENT_DIR = "attachments"
+CHUNK = 64 * 1024
+WRITE_EVERY = 1024 * 1024  # これだけたまったらスレッドで書く
+SEEN_LIMIT = 10_000
+
+_EXT = re.compile(r"^\.[A-Za-z0-9]{1,10}$")
+
+
+def _ext(url):
+    ext = posixpath.splitext(urlsplit(url).path)[1].lower()
+    return ext if _EXT.match(ext) else ""
+
+
+class AttachmentStore:
+    """内容の SHA-256 をキーにしたローカル保存先（同じファイルはチケットをまたいで 1 つだけ）
+
+    attachments/ab/cd/<sha256><拡張子>
+    """
+
+    def __init__(self, root=ATTACHMENT_DIR):
+        self.root = root
+        os.makedirs(os.path.join(root, "tmp"), exist_ok=True)
+
+    def key(self, digest, ext=""):
+        # トランスクリプトにはこの相対パス（/ 区切り）を書く
+        return f"{digest[:2]}/{digest[2:4]}/{digest}{ext}"
+
+    def path(self, key):
+        return os.path.join(self.root, *key.split("/"))
+
+    def exists(self, key):
+        return os.path.exists(self.path(key))
+
+    def temp_path(self):
+        return os.path.join(self.root, "tmp", uuid.uuid4().hex)
+
+    def commit(self, tmp, digest, ext=""):
+        """一時ファイルを正式な場所へ移す（既にあれば捨てる）。(key, 新規か) を返す"""
+        key = self.key(digest, ext)
+        dst = self.path(key)
+        if os.path.exists(dst):
+            os.remove(tmp)
+            return key, False
+        os.makedirs(os.path.dirname(dst), exist_ok=True)
+        os.replace(tmp, dst)
+        return key, True
+
+
+class AttachmentMirror:
+    """添付ファイルを共有セッションで並行ダウンロードしてストアに入れる
+
+    同時ダウンロード数は concurrency まで。max_bytes を超えるファイルは保存しない。
+    URL は何でもよい（ローカルの HTTP サーバーに向けて試せる）。
+    """
+
+    def __init__(self, store: AttachmentStore, concurrency=4, max_bytes=25 * 1024 * 1024, timeout=60):
+        self.store = store
+        self.concurrency = concurrency
+        self.max_bytes = max_bytes
+        self.timeout = timeout
+        self._sem = asyncio.Semaphore(concurrency)
+        self._session = None
+        self._seen = {}  # url -> key（同じ URL は取り直さない。古いものから SEEN_LIMIT 件まで）
+        self.downloaded = 0
+        self.deduped = 0
+        self.skipped = 0
+        self.failed = 0
+        self.bytes = 0
+        self.seconds = 0.0
+
+    def _get_session(self):
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self.concurrency)
+            self._session = aiohttp.ClientSession(
+                connector=connector, timeout=aiohttp.ClientTimeout(total=self.timeout)
+            )
+        return self._session
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def _download(self, url):
+        session = self._get_session()
+        tmp = self.store.temp_path()
+        digest = hashlib.sha256()
+        size = 0
+        complete = False
+        f = await asyncio.to_thread(open, tmp, "wb")
+        try:
+            async with session.get(url) as resp:
+                resp.raise_for_status()
+                if resp.content_length is not None and resp.content_length > self.max_bytes:
+                    self.skipped += 1
+                    return None
+                buf = []
+                buffered = 0
+                async for chunk in resp.content.iter_chunked(CHUNK):
+                    size += len(chunk)
+                    if size > self.max_bytes:
+                        self.skipped += 1
+                        return None
+                    digest.update(chunk)
+                    buf.append(chunk)
+                    buffered += len(chunk)
+                    if buffered >= WRITE_EVERY:
+                        await asyncio.to_thread(f.write, b"".join(buf))
+                        buf.clear()
+                        buffered = 0
+                if buf:
+                    await asyncio.to_thread(f.write, b"".join(buf))
+            complete = True
+        finally:
+            await asyncio.to_thread(f.close)
+            if not complete:
+                await asyncio.to_thread(_remove_quiet, tmp)
+        key, new = await asyncio.to_thread(self.store.commit, tmp, digest.hexdigest(), _ext(url))
+        if new:
+            self.downloaded += 1
+            self.bytes += size
+        else:
+            self.deduped += 1
+        return key
+
+    async def fetch(self, url):
+        """1 件取得してキーを返す（失敗・上限超えは None）"""
+        if url in self._seen:
+            self.deduped += 1
+            return self._seen[url]
+        async with self._sem:
+            try:
+                key = await self._download(url)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                self.failed += 1
+                traceback.print_exc()
+                return None
+        if key is not None:
+            self._seen[url] = key
+            if len(self._seen) > SEEN_LIMIT:
+                del self._seen[next(iter(self._seen))]
+        return key
+
+    async def mirror(self, urls):
+        """URL の一覧をまとめて取得し {url: key or None} を返す"""
+        started = time.perf_counter()
+        unique = list(dict.fromkeys(urls))
+        keys = await asyncio.gather(*(self.fetch(u) for u in unique))
+        self.seconds += time.perf_counter() - started
+        return dict(zip(unique, keys))
+
+    def stats(self):
+        return {
+            "downloaded": self.downloaded,
+            "deduped": self.deduped,
+            "skipped": self.skipped,
+            "failed": self.failed,
+            "bytes": self.bytes,
+            "seconds": self.seconds,
+        }
+
+
+def collect_urls(message_log, channel_id):
+    # スレッド内で実行: ライブログに出てくる添付 URL（出現順・重複なし）
+    urls = {}
+    for rec in message_log.iter_messages(channel_id):
+        for u in rec.get("attachments", ()):
+            urls[u] = None
+    return list(urls)
+
+
+def _remove_quiet(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
@@ -0,0 +1,116 @@
+# utils/bulk.py
+import asyncio
+import time
+import traceback
+
+from utils.log_sink import TokenBucket
+
+
+def rate_bucket(per_second):
+    # 1 秒あたり per_second 回（1 未満も可: 0.5 なら 2 秒に 1 回）
+    if per_second >= 1:
+        return TokenBucket(per_second, 1.0)
+    return TokenBucket(1, 1.0 / per_second)
+
+
+class BulkJob:
+    """同じ処理を多数の対象にかける（同時実行数と開始レートに上限あり）
+
+    action(item) が例外を投げたら失敗として理由を残し、残りは続ける。
+    progress(job) は interval 秒ごと（と最後に 1 回）呼ばれる。
+    """
+
+    def __init__(self, name, items, action, concurrency=4, rate=2.0, label=str):
+        self.name = name
+        self.items = list(items)
+        self.action = action
+        self.concurrency = max(1, int(concurrency))
+        self.rate = rate
+        self.label = label  # 失敗一覧に出す名前
+        self.ok = []
+        self.skipped = []  # (item, 理由)
+        self.failed = []   # (item, 理由)
+        self.running = 0
+        self.cancelled = False
+        self.started_at = None
+        self.finished_at = None
+
+    @property
+    def done(self):
+        return len(self.ok) + len(self.skipped) + len(self.failed)
+
+    @property
+    def elapsed(self):
+        if self.started_at is None:
+            return 0.0
+        return (self.finished_at or time.monotonic()) - self.started_at
+
+    def cancel(self):
+        # 実行中のものは最後まで流し、新しい対象には手を付けない
+        self.cancelled = True
+
+    async def run(self, progress=None, interval=2.0):
+        self.started_at = time.monotonic()
+        queue = asyncio.Queue()
+        for item in self.items:
+            queue.put_nowait(item)
+        bucket = rate_bucket(self.rate) if self.rate and self.rate > 0 else None
+
+        async def worker():
+            while not self.cancelled:
+                try:
+                    item = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                if bucket is not None:
+                    await bucket.acquire()
+                if self.cancelled:
+                    return
+                self.running += 1
+                try:
+                    result = await self.action(item)
+                    if isinstance(result, str):
+                        self.skipped.append((item, result))  # 文字列を返したら対象外（理由）
+                    else:
+                        self.ok.append(item)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    traceback.print_exc()
+                    self.failed.append((item, str(e) or type(e).__name__))
+                finally:
+                    self.running -= 1
+
+        async def reporter():
+            last = -1
+            while True:
+                await asyncio.sleep(interval)
+                if self.done != last:
+                    last = self.done
+                    try:
+                        await progress(self)
+                    except Exception:
+                        traceback.print_exc()
+
+        workers = [asyncio.create_task(worker()) for _ in range(min(self.concurrency, len(self.items)) or 1)]
+        reporter_task = asyncio.create_task(reporter()) if progress is not None else None
+        try:
+            await asyncio.gather(*workers)
+        finally:
+            self.finished_at = time.monotonic()
+            if reporter_task is not None:
+                reporter_task.cancel()
+        if progress is not None:
+            await progress(self)
+        return self
+
+    def summary(self, limit=10):
+        lines = [
+            f"成功 {len(self.ok)}件 / 対象外 {len(self.skipped)}件 / 失敗 {len(self.failed)}件"
+            f"（{self.done}/{len(self.items)}・{self.elapsed:.1f}s）" + ("・中止" if self.cancelled else "")
+        ]
+        for item, reason in self.failed[:limit]:
+            lines.append(f"- 失敗 {self.label(item)}: {reason}")
+        if len(self.failed) > limit:
+            lines.append(f"- …ほか {len(self.failed) - limit}件")
+        return "\n".join(lines)
@@ -0,0 +1,275 @@
+# utils/config_store.py
+import asyncio
+import copy
+import json
+import marshal
+import os
+import tempfile
+import time
+import traceback
+
+from utils.metrics import CONFIG_IO_SECONDS
+
+
+class ConfigStore:
+    """JSON 設定ファイルのメモリキャッシュ（書き込みはまとめて非同期に保存）"""
+
+    def __init__(self, path, default=None, guild_default=None, flush_delay=1.0, max_delay=5.0):
+        self.path = path
+        self.default = default or {}
+        self.guild_default = guild_default or {}  # data["guilds"][guild_id] の既定値
+        self.flush_delay = flush_delay  # 最後の変更からこの秒数だけ待って保存
+        self.max_delay = max_delay      # 最初の変更からこれ以上は遅らせない
+        self._mtime = None              # 自分が最後に読み書きした時のファイル mtime
+        self.data = self._read()
+        self._dirty = False
+        self._first_dirty = None
+        self._last_dirty = None
+        self._flush_task = None
+        self._closing = False
+        self._lock = asyncio.Lock()
+
+    # ---------- 読み込み ----------
+    def _read(self):
+        if not os.path.exists(self.path):
+            data = copy.deepcopy(self.default)
+            self._write_atomic(json.dumps(data, ensure_ascii=False, indent=2))
+            return data
+        start = time.perf_counter()
+        self._mtime = os.stat(self.path).st_mtime_ns
+        with open(self.path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        CONFIG_IO_SECONDS.observe("read", self.path, value=time.perf_counter() - start)
+        # 後から増えたキーを補完
+        for k, v in self.default.items():
+            data.setdefault(k, copy.deepcopy(v))
+        return self._check_types(data)
+
+    @staticmethod
+    def _same_type(value, default):
+        # 数値は int / float を区別しない（5 や 7.5 も可）。bool は数値扱いしない
+        if isinstance(default, bool) or isinstance(value, bool):
+            return isinstance(value, bool) and isinstance(default, bool)
+        if isinstance(default, (int, float)):
+            return isinstance(value, (int, float))
+        return isinstance(value, type(default))
+
+    def _check_types(self, data):
+        # 既定値と型が違う値は既定値に戻す（手編集ミス対策。既定値が None のキーは何でも可）
+        for k, v in self.default.items():
+            if v is not None and data.get(k) is not None and not self._same_type(data[k], v):
+                print(f"⚠️ {self.path}: '{k}' の型が不正です（{type(data[k]).__name__}）。既定値を使います。")
+                data[k] = copy.deepcopy(v)
+        return data
+
+    def changed_on_disk(self) -> bool:
+        """他のプロセス / 手編集でファイルが変わったか"""
+        try:
+            return os.stat(self.path).st_mtime_ns != self._mtime
+        except OSError:
+            return False
+
+    def reload(self):
+        """ファイルを読み直し、変わったトップレベルキーだけ差し替えて返す
+
+        未保存の変更があるときは上書きしないように何もしない。
+        dict は入れ替えずに中身を更新するので、data への参照はそのまま使える。
+        """
+        if self._dirty or self._lock.locked():
+            return set()
+        old = self.data
+        new = self._read()
+        changed = set()
+        for k, v in new.items():
+            if old.get(k) != v:
+                old[k] = v
+                changed.add(k)
+        for k in [k for k in old if k not in new]:
+            del old[k]
+            changed.add(k)
+        self.data = old
+        return changed
+
+    # ---------- ギルドごとの名前空間 ----------
+    def guild(self, guild_id) -> dict:
+        """data["guilds"][guild_id]（無ければ既定値で作る）"""
+        guilds = self.data.setdefault("guilds", {})
+        ns = guilds.get(str(guild_id))
+        if ns is None:
+            ns = guilds[str(guild_id)] = copy.deepcopy(self.guild_default)
+            self.mark_dirty()
+        return ns
+
+    def legacy_keys(self):
+        """単一ギルド時代にトップレベルに置いていたキー"""
+        return [k for k in self.guild_default if k in self.data]
+
+    def migrate_legacy(self, guild_id) -> bool:
+        """トップレベルのギルド設定を guild_id の名前空間へ移す（1 回だけ）"""
+        keys = self.legacy_keys()
+        if not keys:
+            return False
+        ns = self.guild(guild_id)
+        for k in keys:
+            ns[k] = self.data.pop(k)
+        self.mark_dirty()
+        return True
+
+    # ---------- 書き込み ----------
+    def _write_atomic(self, payload: str):
+        # 一時ファイルに書いてから rename（途中で落ちても壊れない）
+        start = time.perf_counter()
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp = tempfile.mkstemp(dir=directory, prefix=f".{os.path.basename(self.path)}.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(payload)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self.path)
+            self._mtime = os.stat(self.path).st_mtime_ns
+            CONFIG_IO_SECONDS.observe("write", self.path, value=time.perf_counter() - start)
+        except Exception:
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+            raise
+
+    def _write_snapshot(self, snapshot):
+        self._write_atomic(json.dumps(marshal.loads(snapshot), ensure_ascii=False, indent=2))
+
+    def mark_dirty(self):
+        """変更を記録して保存を予約する（すぐには書かない）"""
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # イベントループ外（起動時など）はその場で書く
+            self._write_atomic(json.dumps(self.data, ensure_ascii=False, indent=2))
+            return
+        now = loop.time()
+        if not self._dirty:
+            self._first_dirty = now
+        self._dirty = True
+        self._last_dirty = now
+        if self._flush_task is None and not self._closing:
+            self._flush_task = loop.create_task(self._delayed_flush())
+
+    async def _delayed_flush(self):
+        loop = asyncio.get_running_loop()
+        try:
+            while self._dirty:
+                deadline = min(self._last_dirty + self.flush_delay, self._first_dirty + self.max_delay)
+                wait = deadline - loop.time()
+                if wait <= 0:
+                    break
+                await asyncio.sleep(wait)
+            await self.flush()
+        finally:
+            self._flush_task = None
+            # flush 中に変更が入った場合は再予約
+            if self._dirty and not self._closing:
+                self._flush_task = loop.create_task(self._delayed_flush())
+
+    async def flush(self):
+        async with self._lock:
+            if not self._dirty:
+                return
+            self._dirty = False
+            self._first_dirty = None
+            try:
+                # ループ上では marshal で丸ごと写すだけ（C 実装で json.dumps の数十分の一。途中変更を防ぐ）
+                # JSON へのシリアライズとディスク I/O はスレッドへ
+                snapshot = marshal.dumps(self.data)
+                await asyncio.to_thread(self._write_snapshot, snapshot)
+            except Exception:
+                traceback.print_exc()
+                if not self._dirty:
+                    self._dirty = True
+                    self._first_dirty = self._last_dirty = asyncio.get_running_loop().time()
+
+    async def close(self):
+        """終了時: 予約中の保存をキャンセルして即座に書き出す"""
+        self._closing = True
+        task = self._flush_task
+        if task is not None and task is not asyncio.current_task():
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._flush_task = None
+        await self.flush()
+        self._closing = False
+
+
+class ConfigService:
+    """bot 全体で 1 つの設定サービス
+
+    セクション（cog ごとの設定ファイル）をまとめて持ち、読み込みはメモリから。
+    外部で編集されたファイルは mtime の定期チェックで検知して、変わったキーだけ読み直す。
+    """
+
+    def __init__(self, poll_interval=2.0):
+        self.poll_interval = poll_interval
+        self.sections = {}    # name -> ConfigStore
+        self._listeners = {}  # name -> [callback(changed_keys)]
+        self._task = None
+
+    def section(self, name, path, default=None, guild_default=None):
+        store = self.sections.get(name)
+        if store is None:
+            store = self.sections[name] = ConfigStore(path, default, guild_default)
+        return store
+
+    def on_reload(self, name, callback):
+        self._listeners.setdefault(name, []).append(callback)
+
+    def remove_listener(self, name, callback):
+        try:
+            self._listeners.get(name, []).remove(callback)
+        except ValueError:
+            pass
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._poll())
+
+    def check(self):
+        """各セクションの外部変更を 1 回確認する"""
+        for name, store in self.sections.items():
+            if not store.changed_on_disk():
+                continue
+            try:
+                changed = store.reload()
+            except Exception:
+                traceback.print_exc()
+                continue
+            if not changed:
+                continue
+            print(f"🔄 {store.path} を再読み込みしました: {', '.join(sorted(changed))}")
+            for cb in self._listeners.get(name, []):
+                try:
+                    cb(changed)
+                except Exception:
+                    traceback.print_exc()
+
+    async def _poll(self):
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            self.check()
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        for store in self.sections.values():
+            await store.close()
+
+
+def get_config(bot) -> ConfigService:
+    """bot にぶら下がっている共通の設定サービス（無ければ作る）"""
+    service = getattr(bot, "config", None)
+    if service is None:
+        service = bot.config = ConfigService()
+    return service
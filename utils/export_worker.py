@@ -0,0 +1,105 @@
+# utils/export_worker.py
+import asyncio
+import time
+import traceback
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+
+class ExportJob:
+    """ログ出力ジョブ 1 件（kind: "save" / "delete"）"""
+
+    def __init__(self, kind, channel, ticket, user):
+        self.kind = kind
+        self.channel = channel
+        self.ticket = ticket
+        self.user = user
+        self.enqueued_at = time.monotonic()
+        self.started_at = None
+
+
+class ExportWorker:
+    """保存/削除ボタンの重い処理を裏で流すキュー（同時実行数に上限あり）"""
+
+    def __init__(self, handler, concurrency=2, render_threads=2, max_queue=500):
+        self.handler = handler  # async def handler(job)
+        self.concurrency = concurrency
+        self.queue = asyncio.Queue(maxsize=max_queue)
+        # HTML 描画・ファイル I/O 用のスレッドプール
+        self.executor = ThreadPoolExecutor(max_workers=render_threads, thread_name_prefix="ticket-export")
+        self.pending = set()  # キュー済み/実行中のチャンネルID（二重登録防止）
+        self.running = 0
+        self.done = 0
+        self.failed = 0
+        self.wait_total = 0.0
+        self.run_total = 0.0
+        self.run_max = 0.0
+        self.recent = deque(maxlen=10)  # (kind, ticket_no, wait, run, ok)
+        self._tasks = []
+
+    def start(self):
+        loop = asyncio.get_running_loop()
+        for i in range(self.concurrency):
+            self._tasks.append(loop.create_task(self._run(), name=f"ticket-export-{i}"))
+
+    async def stop(self):
+        for t in self._tasks:
+            t.cancel()
+        for t in self._tasks:
+            try:
+                await t
+            except asyncio.CancelledError:
+                pass
+        self._tasks.clear()
+        self.executor.shutdown(wait=False)
+
+    @property
+    def depth(self):
+        return self.queue.qsize()
+
+    def submit(self, job):
+        """キューに積んで待ち順位を返す（同じチャンネルが処理待ちなら None）"""
+        cid = job.channel.id
+        if cid in self.pending:
+            return None
+        self.queue.put_nowait(job)  # 満杯なら asyncio.QueueFull
+        self.pending.add(cid)
+        return self.queue.qsize() + self.running
+
+    async def _run(self):
+        while True:
+            job = await self.queue.get()
+            self.running += 1
+            job.started_at = time.monotonic()
+            wait = job.started_at - job.enqueued_at
+            ok = False
+            try:
+                await self.handler(job)
+                ok = True
+            except Exception:
+                traceback.print_exc()
+            finally:
+                run = time.monotonic() - job.started_at
+                self.running -= 1
+                self.pending.discard(job.channel.id)
+                if ok:
+                    self.done += 1
+                else:
+                    self.failed += 1
+                self.wait_total += wait
+                self.run_total += run
+                self.run_max = max(self.run_max, run)
+                self.recent.append((job.kind, job.ticket.get("number"), wait, run, ok))
+                self.queue.task_done()
+
+    def stats(self):
+        finished = self.done + self.failed
+        return {
+            "depth": self.depth,
+            "running": self.running,
+            "done": self.done,
+            "failed": self.failed,
+            "avg_wait": self.wait_total / finished if finished else 0.0,
+            "avg_run": self.run_total / finished if finished else 0.0,
+            "max_run": self.run_max,
+        }
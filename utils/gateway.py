@@ -0,0 +1,93 @@
+# utils/gateway.py
+import os
+import sys
+
+import discord
+
+# GATEWAY_PROFILE=lean で起動すると、今の Cog が使うイベントだけを受け取りキャッシュも最小にする
+#   - guilds          : ギルド / チャンネル / ロールのキャッシュ（コマンドの変換・権限判定）
+#   - guild_messages  : プレフィックスコマンド・自動返信・チケットのライブ記録（raw 編集/削除含む）
+#   - message_content : 上記で本文を読むため
+# メンバー intent は使わない（メンバーは必要な時だけ fetch_member で取る）
+PROFILES = ("full", "lean")
+
+
+def build_intents(profile: str) -> discord.Intents:
+    if profile == "lean":
+        intents = discord.Intents.none()
+        intents.guilds = True
+        intents.guild_messages = True
+        intents.message_content = True
+        return intents
+    return discord.Intents.all()
+
+
+def bot_options(profile: str = None) -> dict:
+    """commands.Bot に渡すキャッシュ関連の引数"""
+    profile = (profile or os.getenv("GATEWAY_PROFILE") or "full").lower()
+    if profile not in PROFILES:
+        raise SystemExit(f"GATEWAY_PROFILE は {' / '.join(PROFILES)} のどれかにしてください（{profile}）")
+    intents = build_intents(profile)
+    if profile == "lean":
+        options = {
+            "intents": intents,
+            "member_cache_flags": discord.MemberCacheFlags.none(),
+            "max_messages": None,  # メッセージキャッシュなし（チケットは raw イベントで記録）
+            "chunk_guilds_at_startup": False,
+        }
+    else:
+        options = {"intents": intents}
+    # READY 後に残りの GUILD_CREATE を待つ秒数（discord.py の既定は 2 秒）。起動を速めたい時に短くする
+    ready_timeout = os.getenv("GUILD_READY_TIMEOUT")
+    if ready_timeout:
+        options["guild_ready_timeout"] = float(ready_timeout)
+    return options
+
+
+async def get_or_fetch_member(guild: discord.Guild, user_id: int):
+    """キャッシュに無ければ API から取る（退出済みなら None）"""
+    member = guild.get_member(user_id)
+    if member is not None:
+        return member
+    try:
+        return await guild.fetch_member(user_id)
+    except (discord.NotFound, discord.HTTPException):
+        return None
+
+
+def _rss_kb():
+    # Linux は /proc から現在値、それ以外は最大値（ru_maxrss）で代用
+    try:
+        with open("/proc/self/status", "r") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    try:
+        import resource
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return rss // 1024 if sys.platform == "darwin" else rss
+    except Exception:
+        return None
+
+
+def cache_report(bot) -> dict:
+    guilds = bot.guilds
+    return {
+        "guilds": len(guilds),
+        "channels": sum(len(g.channels) for g in guilds),
+        "roles": sum(len(g.roles) for g in guilds),
+        "members": sum(len(g.members) for g in guilds),
+        "users": len(bot.users),
+        "messages": len(bot.cached_messages),
+        "rss_kb": _rss_kb(),
+    }
+
+
+def format_cache_report(report: dict) -> str:
+    rss = f"{report['rss_kb'] / 1024:.1f}MB" if report["rss_kb"] is not None else "不明"
+    return (
+        f"ギルド {report['guilds']} / チャンネル {report['channels']} / ロール {report['roles']} / "
+        f"メンバー {report['members']} / ユーザー {report['users']} / メッセージ {report['messages']} / RSS {rss}"
+    )
@@ -0,0 +1,195 @@
+# utils/log_sink.py
+import asyncio
+import time
+import traceback
+from collections import deque
+
+MAX_EMBEDS = 10      # Discord: 1 メッセージあたりの Embed 上限
+MAX_FILES = 1        # 添付はサイズ上限ぎりぎりで分割済みなので 1 メッセージ 1 ファイル
+MAX_CONTENT = 2000   # Discord: 本文の文字数上限
+
+
+class TokenBucket:
+    """チャンネルごとの送信レート（rate 回 / per 秒）"""
+
+    def __init__(self, rate, per):
+        self.rate = rate
+        self.per = per
+        self.tokens = float(rate)
+        self.updated = time.monotonic()
+
+    async def acquire(self):
+        while True:
+            now = time.monotonic()
+            self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate / self.per)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) * self.per / self.rate)
+
+
+class _Event:
+    __slots__ = ("embed", "file", "content", "queued_at", "future")
+
+    def __init__(self, embed, file, content, future):
+        self.embed = embed
+        self.file = file
+        self.content = content
+        self.queued_at = time.monotonic()
+        self.future = future
+
+
+class LogSink:
+    """ログチャンネルへの送信をキューにまとめる
+
+    window 秒以内のイベントは 1 メッセージ（Embed 最大 10 個）にまとめて送り、
+    チャンネルごとのレート制限を守る。呼び出し側（ボタン処理など）は待たされない。
+    """
+
+    def __init__(self, window=1.0, max_pending=1000, rate=5, per=5.0, delay_threshold=5.0):
+        self.window = window
+        self.max_pending = max_pending
+        self.rate = rate
+        self.per = per
+        self.delay_threshold = delay_threshold
+        self._queues = {}   # channel_id -> deque[_Event]
+        self._wakeups = {}  # channel_id -> asyncio.Event
+        self._tasks = {}    # channel_id -> Task
+        self._buckets = {}  # channel_id -> TokenBucket
+        self._channels = {}  # channel_id -> 送信先
+        self.pending = 0
+        self.sent_messages = 0
+        self.sent_events = 0
+        self.dropped = 0
+        self.delayed = 0
+        self.failed = 0
+
+    # ---------- 投入 ----------
+    def _enqueue(self, channel, embed=None, file=None, content=None, future=None):
+        if self.pending >= self.max_pending:
+            self.dropped += 1
+            if future is not None:
+                future.set_result(False)
+            return False
+        cid = channel.id
+        q = self._queues.get(cid)
+        if q is None:
+            q = self._queues[cid] = deque()
+            self._wakeups[cid] = asyncio.Event()
+            self._buckets[cid] = TokenBucket(self.rate, self.per)
+        self._channels[cid] = channel
+        q.append(_Event(embed, file, content, future))
+        self.pending += 1
+        task = self._tasks.get(cid)
+        if task is None or task.done():
+            self._tasks[cid] = asyncio.get_running_loop().create_task(self._drain(channel))
+        self._wakeups[cid].set()
+        return True
+
+    def submit(self, channel, *, embed=None, file=None, content=None):
+        """投げっぱなしで積む（満杯なら捨てて False）"""
+        return self._enqueue(channel, embed, file, content)
+
+    async def send(self, channel, *, embed=None, file=None, content=None):
+        """積んで実際に送信されるまで待つ（添付ファイルを後で消したい時など）"""
+        future = asyncio.get_running_loop().create_future()
+        self._enqueue(channel, embed, file, content, future)
+        return await future
+
+    # ---------- 送信 ----------
+    def _take_batch(self, q):
+        batch = []
+        embeds = files = chars = 0
+        while q:
+            ev = q[0]
+            e = 1 if ev.embed is not None else 0
+            f = 1 if ev.file is not None else 0
+            c = len(ev.content) + 1 if ev.content else 0
+            if batch and (embeds + e > MAX_EMBEDS or files + f > MAX_FILES or chars + c > MAX_CONTENT):
+                break
+            batch.append(q.popleft())
+            embeds += e
+            files += f
+            chars += c
+        return batch
+
+    async def _send_batch(self, channel, batch):
+        kwargs = {}
+        lines = [ev.content for ev in batch if ev.content]
+        embeds = [ev.embed for ev in batch if ev.embed is not None]
+        files = [ev.file for ev in batch if ev.file is not None]
+        if lines:
+            kwargs["content"] = "\n".join(lines)[:MAX_CONTENT]
+        if embeds:
+            kwargs["embeds"] = embeds
+        if files:
+            kwargs["files"] = files
+        ok = False
+        try:
+            await channel.send(**kwargs)
+            ok = True
+        except Exception:
+            traceback.print_exc()
+        now = time.monotonic()
+        for ev in batch:
+            if now - ev.queued_at > self.delay_threshold:
+                self.delayed += 1
+            if ev.future is not None and not ev.future.done():
+                ev.future.set_result(ok)
+        self.pending -= len(batch)
+        if ok:
+            self.sent_messages += 1
+            self.sent_events += len(batch)
+        else:
+            self.failed += len(batch)
+
+    async def _drain(self, channel):
+        cid = channel.id
+        q = self._queues[cid]
+        wakeup = self._wakeups[cid]
+        bucket = self._buckets[cid]
+        while True:
+            await wakeup.wait()
+            wakeup.clear()
+            # 少し待って同じ時間帯のイベントをまとめる
+            await asyncio.sleep(self.window)
+            while q:
+                await bucket.acquire()
+                await self._send_batch(channel, self._take_batch(q))
+
+    async def close(self):
+        """終了時: 溜まっている分を待たずに送り切る"""
+        for task in self._tasks.values():
+            task.cancel()
+        for task in self._tasks.values():
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._tasks.clear()
+        for cid, q in self._queues.items():
+            channel = self._channels[cid]
+            while q:
+                await self._send_batch(channel, self._take_batch(q))
+
+    def stats(self):
+        return {
+            "pending": self.pending,
+            "sent_messages": self.sent_messages,
+            "sent_events": self.sent_events,
+            "dropped": self.dropped,
+            "delayed": self.delayed,
+            "failed": self.failed,
+        }
+
+
+_sink = None
+
+
+def get_log_sink() -> LogSink:
+    """プロセス共通のログ送信キュー"""
+    global _sink
+    if _sink is None:
+        _sink = LogSink()
+    return _sink
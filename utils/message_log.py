@@ -0,0 +1,205 @@
+# utils/message_log.py
+import asyncio
+import json
+import os
+import time
+import traceback
+
+import discord
+
+LOG_DIR = "ticket_logs"
+
+
+def message_record(m) -> dict:
+    """discord.Message を保存用の dict（1 行 JSON）にする"""
+    return {
+        "op": "create",
+        "id": m.id,
+        "ts": m.created_at.isoformat(),
+        "author": str(m.author),
+        "author_id": m.author.id,
+        "content": m.content or "",
+        "attachments": [a.url for a in m.attachments],
+        "embeds": len(m.embeds),
+    }
+
+
+class MessageLog:
+    """チケットチャンネルごとの追記専用ログ（ticket_logs/<channel_id>.jsonl）
+
+    create は ID 昇順で追記される前提（バックフィル中のライブ受信は保留して後で並べる）。
+    再起動後、既存ログのあるチャンネルで最初に受けた発言は、止まっていた間の分を
+    先にバックフィルしてから書く（そのまま書くと停止中の発言が抜ける）。
+    バックフィルが失敗したら保留をやめ、次の発言で間隔を空けてやり直す。
+    """
+
+    RETRY_MIN = 5.0    # バックフィル失敗後の再試行間隔（秒。失敗のたびに倍）
+    RETRY_MAX = 600.0
+
+    def __init__(self, log_dir=LOG_DIR):
+        self.log_dir = log_dir
+        os.makedirs(log_dir, exist_ok=True)
+        self._last_id = {}       # channel_id -> 最後に書いた create の ID
+        self._backfilling = {}   # channel_id -> バックフィル中に届いたレコード
+        self._tasks = {}         # channel_id -> 実行中のバックフィル
+        self._retry = {}         # channel_id -> (次に試す時刻, 待ち秒)
+
+    def path(self, channel_id) -> str:
+        return os.path.join(self.log_dir, f"{int(channel_id)}.jsonl")
+
+    def exists(self, channel_id) -> bool:
+        return os.path.exists(self.path(channel_id))
+
+    # ---------- 書き込み ----------
+    def _append(self, channel_id, records):
+        # 数百バイトの追記なのでループ上で直接書く（ページキャッシュに乗るだけ）
+        with open(self.path(channel_id), "a", encoding="utf-8") as f:
+            for rec in records:
+                f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+
+    def _write(self, channel_id, rec):
+        pending = self._backfilling.get(channel_id)
+        if pending is not None:
+            pending.append(rec)
+            return
+        if rec["op"] == "create":
+            last = self._last_id.get(channel_id)
+            if last is not None and rec["id"] <= last:
+                return  # 重複
+            self._last_id[channel_id] = rec["id"]
+        self._append(channel_id, [rec])
+
+    def record_create(self, message):
+        cid = message.channel.id
+        if cid not in self._last_id and cid not in self._backfilling and self.exists(cid):
+            # ログの最後の ID がまだ分からない（再起動後）: 停止中の分を取ってから書く
+            retry = self._retry.get(cid)
+            if retry is not None and time.monotonic() < retry[0]:
+                return  # 前回失敗して待機中。この発言は次のバックフィルで履歴から取る
+            self._backfilling[cid] = []
+            task = self._start_backfill(message.channel)
+            task.add_done_callback(_report_failure)
+        self._write(cid, message_record(message))
+
+    def record_edit(self, channel_id, message_id, content):
+        self._write(channel_id, {"op": "edit", "id": message_id, "content": content or ""})
+
+    def record_delete(self, channel_id, message_id):
+        self._write(channel_id, {"op": "delete", "id": message_id})
+
+    def remove(self, channel_id):
+        self._last_id.pop(channel_id, None)
+        self._backfilling.pop(channel_id, None)
+        self._retry.pop(channel_id, None)
+        try:
+            os.remove(self.path(channel_id))
+        except FileNotFoundError:
+            pass
+
+    # ---------- 読み込み ----------
+    def _scan_last_id(self, channel_id):
+        last = None
+        try:
+            with open(self.path(channel_id), "r", encoding="utf-8") as f:
+                for line in f:
+                    rec = json.loads(line)
+                    if rec.get("op") == "create":
+                        last = rec["id"]
+        except FileNotFoundError:
+            pass
+        return last
+
+    async def last_message_id(self, channel_id):
+        if channel_id not in self._last_id:
+            last = await asyncio.to_thread(self._scan_last_id, channel_id)
+            if last is None:
+                return None
+            self._last_id.setdefault(channel_id, last)
+        return self._last_id[channel_id]
+
+    def iter_messages(self, channel_id):
+        """edit / delete を反映した create レコードを古い順に返す（同期・スレッド用）
+
+        1 周目で edit / delete だけを集め、2 周目で create を流すので
+        メモリは編集・削除の件数分だけで済む。
+        """
+        path = self.path(channel_id)
+        if not os.path.exists(path):
+            return
+        edits, deleted = {}, set()
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                rec = json.loads(line)
+                if rec["op"] == "edit":
+                    edits[rec["id"]] = rec["content"]
+                elif rec["op"] == "delete":
+                    deleted.add(rec["id"])
+        last = None
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                rec = json.loads(line)
+                if rec["op"] != "create":
+                    continue
+                mid = rec["id"]
+                if mid in deleted or (last is not None and mid <= last):
+                    continue
+                last = mid
+                if mid in edits:
+                    rec["content"] = edits[mid]
+                yield rec
+
+    # ---------- バックフィル ----------
+    def _start_backfill(self, channel):
+        cid = channel.id
+        task = self._tasks.get(cid)
+        if task is None:
+            task = self._tasks[cid] = asyncio.ensure_future(self._backfill(channel))
+            task.add_done_callback(lambda t: self._tasks.pop(cid, None))
+        return task
+
+    async def backfill(self, channel):
+        """ログに無い分（最後の ID より後）だけ履歴 API から取得して追記する"""
+        await asyncio.shield(self._start_backfill(channel))
+
+    async def _backfill(self, channel):
+        cid = channel.id
+        self._backfilling.setdefault(cid, [])
+        ok = False
+        try:
+            after = await self.last_message_id(cid)
+            batch = []
+            kwargs = {"limit": None, "oldest_first": True}
+            if after is not None:
+                kwargs["after"] = discord.Object(id=after)
+            async for m in channel.history(**kwargs):
+                batch.append(message_record(m))
+                if len(batch) >= 200:
+                    await asyncio.to_thread(self._append, cid, batch)
+                    self._last_id[cid] = batch[-1]["id"]
+                    batch = []
+            if batch:
+                await asyncio.to_thread(self._append, cid, batch)
+                self._last_id[cid] = batch[-1]["id"]
+            ok = True
+        finally:
+            pending = self._backfilling.pop(cid, [])
+            if ok:
+                self._retry.pop(cid, None)
+                for rec in pending:
+                    self._write(cid, rec)
+            else:
+                # 失敗: 保留はやめる。create は次のバックフィルで履歴から取り直すので捨て、
+                # edit / delete（既に書いた発言の分もある）だけ書く。最後の ID はファイルから読み直す
+                self._last_id.pop(cid, None)
+                others = [rec for rec in pending if rec["op"] != "create"]
+                if others:
+                    self._append(cid, others)
+                prev = self._retry.get(cid)
+                wait = min(prev[1] * 2, self.RETRY_MAX) if prev else self.RETRY_MIN
+                self._retry[cid] = (time.monotonic() + wait, wait)
+
+
+def _report_failure(task):
+    if not task.cancelled() and task.exception() is not None:
+        e = task.exception()
+        traceback.print_exception(type(e), e, e.__traceback__)
@@ -0,0 +1,269 @@
+# utils/metrics.py
+import bisect
+import contextvars
+import functools
+import sys
+import time
+import traceback
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=None) -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _fmt(v) -> str:
+    if v == float("inf"):
+        return "+Inf"
+    return repr(float(v)) if isinstance(v, float) else str(v)
+
+
+class Counter:
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}  # label values -> 数
+
+    def inc(self, *labels, amount=1):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} counter"
+        for labels, v in self._values.items():
+            yield f"{self.name}{_labels(self.labelnames, labels)} {_fmt(v)}"
+
+
+class Gauge:
+    """値はスクレイプ時に collect() で取る（常に最新値）"""
+
+    def __init__(self, name, help, labelnames=(), collect=None):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.collect = collect  # () -> {label values: 値}
+        self._values = {}
+
+    def set(self, *labels, value):
+        self._values[labels] = value
+
+    def render(self):
+        values = self._values
+        if self.collect is not None:
+            try:
+                values = self.collect()
+            except Exception:
+                traceback.print_exc()
+                values = {}
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} gauge"
+        for labels, v in values.items():
+            yield f"{self.name}{_labels(self.labelnames, labels)} {_fmt(v)}"
+
+
+class Histogram:
+    """累積しないバケット数 + 合計 + 件数（出力時に累積する）"""
+
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # label values -> [counts(len(buckets) + 1), sum]
+
+    def observe(self, *labels, value):
+        s = self._series.get(labels)
+        if s is None:
+            s = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+        s[0][bisect.bisect_left(self.buckets, value)] += 1
+        s[1] += value
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} histogram"
+        for labels, (counts, total) in self._series.items():
+            acc = 0
+            for le, c in zip(self.buckets + (float("inf"),), counts):
+                acc += c
+                le_label = 'le="' + _fmt(le) + '"'
+                yield f"{self.name}_bucket{_labels(self.labelnames, labels, le_label)} {acc}"
+            yield f"{self.name}_sum{_labels(self.labelnames, labels)} {_fmt(total)}"
+            yield f"{self.name}_count{_labels(self.labelnames, labels)} {acc}"
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = {}
+
+    def _add(self, metric):
+        existing = self.metrics.get(metric.name)
+        if existing is not None:
+            return existing
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, help, labelnames=()):
+        return self._add(Counter(name, help, labelnames))
+
+    def gauge(self, name, help, labelnames=(), collect=None):
+        gauge = self._add(Gauge(name, help, labelnames, collect))
+        if collect is not None:
+            gauge.collect = collect  # 再登録（Cog のリロード）時は新しい方を使う
+        return gauge
+
+    def histogram(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._add(Histogram(name, help, labelnames, buckets))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+# -------------------------
+# プロセス共通のメトリクス
+# -------------------------
+REGISTRY = Registry()
+
+HANDLER_SECONDS = REGISTRY.histogram(
+    "bot_handler_seconds", "コマンド / ボタン処理の所要時間", ("kind", "name"))
+HANDLER_ERRORS = REGISTRY.counter(
+    "bot_handler_errors_total", "コマンド / ボタン処理で起きた例外", ("kind", "name"))
+CONFIG_IO_SECONDS = REGISTRY.histogram(
+    "bot_config_io_seconds", "設定ファイルの読み書き時間", ("op", "file"))
+HTTP_SECONDS = REGISTRY.histogram(
+    "bot_http_request_seconds", "Discord API 呼び出しの所要時間", ("method", "route"))
+HTTP_ERRORS = REGISTRY.counter(
+    "bot_http_errors_total", "Discord API 呼び出しの失敗", ("method", "route", "status"))
+
+# 実行中のハンドラ（report_error がどこの例外か知るため）
+_current = contextvars.ContextVar("metrics_handler", default=("other", "unknown"))
+
+
+def timed(kind, name):
+    """async ハンドラの所要時間を記録するデコレータ（例外は数えてそのまま投げる）"""
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            token = _current.set((kind, name))
+            start = time.perf_counter()
+            try:
+                return await func(*args, **kwargs)
+            except Exception:
+                HANDLER_ERRORS.inc(kind, name)
+                raise
+            finally:
+                HANDLER_SECONDS.observe(kind, name, value=time.perf_counter() - start)
+                _current.reset(token)
+        return wrapper
+    return decorator
+
+
+def report_error():
+    """traceback.print_exc() の代わり（実行中のハンドラのエラー数も数える）"""
+    traceback.print_exc()
+    HANDLER_ERRORS.inc(*_current.get())
+
+
+# -------------------------
+# bot への組み込み
+# -------------------------
+def _instrument_http(http):
+    # HTTPClient.request をインスタンス単位で包む（ラベルは ID を含まないルートのテンプレート）
+    if getattr(http, "_metrics_wrapped", False):
+        return
+    original = http.request
+
+    async def request(route, **kwargs):
+        start = time.perf_counter()
+        status = None
+        try:
+            return await original(route, **kwargs)
+        except Exception as e:
+            status = getattr(e, "status", None) or type(e).__name__
+            raise
+        finally:
+            HTTP_SECONDS.observe(route.method, route.path, value=time.perf_counter() - start)
+            if status is not None:
+                HTTP_ERRORS.inc(route.method, route.path, str(status))
+
+    http.request = request
+    http._metrics_wrapped = True
+
+
+def instrument_bot(bot):
+    """コマンド・HTTP・ゲートウェイ遅延を計測対象にする（setup_hook から呼ぶ）"""
+    _instrument_http(bot.http)
+
+    async def before(ctx):
+        ctx._metrics_started = time.perf_counter()
+
+    async def after(ctx):
+        started = getattr(ctx, "_metrics_started", None)
+        if started is not None and ctx.command is not None:
+            HANDLER_SECONDS.observe("command", ctx.command.qualified_name, value=time.perf_counter() - started)
+
+    async def on_command_error(ctx, error):
+        name = ctx.command.qualified_name if ctx.command is not None else "unknown"
+        HANDLER_ERRORS.inc("command", name)
+        # リスナーを足すと discord.py 既定のエラー表示が止まるので、同じ条件でここで出す
+        if hasattr(ctx.command, "on_error"):
+            return
+        cog = ctx.cog
+        if cog and cog.has_error_handler():
+            return
+        print(f"Ignoring exception in command {ctx.command}:", file=sys.stderr)
+        traceback.print_exception(type(error), error, error.__traceback__, file=sys.stderr)
+
+    bot.before_invoke(before)
+    bot.after_invoke(after)
+    bot.add_listener(on_command_error, "on_command_error")
+
+    def gateway_latency():
+        latencies = getattr(bot, "latencies", None)  # AutoShardedBot: [(shard_id, 秒)]
+        if latencies:
+            return {(str(sid),): lat for sid, lat in latencies if lat == lat}
+        lat = bot.latency
+        return {("0",): lat} if lat == lat else {}  # 未接続の間は nan
+
+    REGISTRY.gauge("bot_gateway_latency_seconds", "ゲートウェイの heartbeat 遅延", ("shard",), gateway_latency)
+    REGISTRY.gauge("bot_guilds", "参加しているギルド数", (), lambda: {(): len(bot.guilds)})
+
+
+class MetricsServer:
+    """Prometheus 形式の /metrics を返すローカル HTTP サーバー"""
+
+    def __init__(self, registry=REGISTRY, host="127.0.0.1", port=9108):
+        self.registry = registry
+        self.host = host
+        self.port = port
+        self._runner = None
+
+    async def _handle(self, request):
+        from aiohttp import web
+        return web.Response(text=self.registry.render(), content_type="text/plain", charset="utf-8",
+                            headers={"X-Content-Type-Options": "nosniff"})
+
+    async def start(self):
+        from aiohttp import web  # discord.py の依存なので追加インストールは不要
+        app = web.Application()
+        app.router.add_get("/metrics", self._handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+        print(f"📈 メトリクス: http://{self.host}:{self.port}/metrics")
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
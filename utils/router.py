@@ -0,0 +1,101 @@
+# utils/router.py
+import traceback
+
+import discord
+
+
+class RoutedMessage:
+    """ルーター通過後のメッセージ（正規化済みテキスト付き）"""
+
+    __slots__ = ("message", "text", "channel_id", "author_id", "is_bot")
+
+    def __init__(self, message, text, is_bot):
+        self.message = message
+        self.text = text  # strip + lower 済み
+        self.channel_id = message.channel.id
+        self.author_id = message.author.id
+        self.is_bot = is_bot
+
+
+class Route:
+    def __init__(self, name, callback, channels=None, exact=None, prefixes=None, catch_all=False, include_bots=False):
+        self.name = name
+        self.callback = callback  # async def callback(routed: RoutedMessage)
+        self.channels = channels  # set（呼び出し側が更新してよい）
+        self.exact = frozenset(exact or ())
+        self.prefixes = tuple(prefixes or ())
+        self.catch_all = catch_all
+        self.include_bots = include_bots  # Bot / システムメッセージも受け取るか
+
+
+class MessageRouter:
+    """on_message を 1 か所で受けて、安い条件で振り分ける
+
+    - Bot / システムメッセージは include_bots のルートにしか渡さない
+    - テキストの正規化（strip + lower）は 1 回だけ
+    - 完全一致は dict、チャンネル指定は set で判定
+    """
+
+    def __init__(self):
+        self.routes = {}
+        self._channel_routes = []
+        self._exact = {}
+        self._prefix_routes = []
+        self._catch_all = []
+
+    def register(self, name, callback, **kwargs):
+        self.routes[name] = Route(name, callback, **kwargs)
+        self._rebuild()
+
+    def unregister(self, name):
+        if self.routes.pop(name, None) is not None:
+            self._rebuild()
+
+    def _rebuild(self):
+        self._channel_routes = [r for r in self.routes.values() if r.channels is not None]
+        self._exact = {}
+        for r in self.routes.values():
+            if r.channels is None:
+                for text in r.exact:
+                    self._exact.setdefault(text, []).append(r)
+        self._prefix_routes = [r for r in self.routes.values() if r.channels is None and r.prefixes]
+        self._catch_all = [r for r in self.routes.values() if r.channels is None and r.catch_all]
+
+    async def dispatch(self, message: discord.Message):
+        author = message.author
+        is_bot = author.bot or message.is_system()
+
+        targets = [r for r in self._channel_routes if message.channel.id in r.channels and (r.include_bots or not is_bot)]
+        if not is_bot:
+            text = message.content.strip().lower()
+            targets.extend(self._exact.get(text, ()))
+            targets.extend(r for r in self._prefix_routes if text.startswith(r.prefixes))
+            targets.extend(self._catch_all)
+        else:
+            targets.extend(r for r in self._catch_all if r.include_bots)
+            if not targets:
+                return
+            text = message.content.strip().lower()
+        if not targets:
+            return
+
+        routed = RoutedMessage(message, text, is_bot)
+        seen = set()
+        for r in targets:
+            if r.name in seen:
+                continue
+            seen.add(r.name)
+            try:
+                await r.callback(routed)
+            except Exception:
+                traceback.print_exc()
+
+
+def get_router(bot) -> MessageRouter:
+    """bot にぶら下がっている共通ルーターを返す（無ければ作って on_message に登録）"""
+    router = getattr(bot, "router", None)
+    if router is None:
+        router = MessageRouter()
+        bot.router = router
+        bot.add_listener(router.dispatch, "on_message")
+    return router
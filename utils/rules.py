@@ -0,0 +1,179 @@
+# utils/rules.py
+import re
+import time
+from collections import deque
+
+RULE_TYPES = ("exact", "prefix", "contains", "regex")
+
+
+class AhoCorasick:
+    """複数キーワードを 1 回の走査で探す（contains ルール用）"""
+
+    def __init__(self, keywords):
+        # keywords: [(keyword, value), ...]
+        self.goto = [{}]
+        self.fail = [0]
+        self.out = [[]]
+        for word, value in keywords:
+            node = 0
+            for ch in word:
+                nxt = self.goto[node].get(ch)
+                if nxt is None:
+                    nxt = len(self.goto)
+                    self.goto[node][ch] = nxt
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.out.append([])
+                node = nxt
+            self.out[node].append(value)
+        # 失敗リンク（BFS）
+        q = deque(self.goto[0].values())
+        while q:
+            node = q.popleft()
+            for ch, nxt in self.goto[node].items():
+                q.append(nxt)
+                f = self.fail[node]
+                while f and ch not in self.goto[f]:
+                    f = self.fail[f]
+                self.fail[nxt] = self.goto[f].get(ch, 0)
+                self.out[nxt] = self.out[nxt] + self.out[self.fail[nxt]]
+
+    def find(self, text):
+        """マッチした value の集合"""
+        found = set()
+        node = 0
+        goto, fail, out = self.goto, self.fail, self.out
+        for ch in text:
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            if out[node]:
+                found.update(out[node])
+        return found
+
+
+class Rule:
+    def __init__(self, index, data):
+        self.index = index  # 設定ファイル内の順番（小さいほど優先）
+        self.type = data.get("type", "exact")
+        if self.type not in RULE_TYPES:
+            raise ValueError(f"unknown rule type: {self.type}")
+        self.pattern = data["pattern"]
+        self.reply = data["reply"]
+        self.channels = frozenset(data.get("channels") or ())  # 空なら全チャンネル
+        self.cooldown = float(data.get("cooldown", 0))
+        self.cooldown_scope = data.get("cooldown_scope", "user")  # "user" / "channel"
+        # 判定するテキストは小文字化済みなので、大文字を含むパターンも当たるよう IGNORECASE
+        self.regex = re.compile(self.pattern, re.IGNORECASE) if self.type == "regex" else None
+
+    def combinable(self):
+        """結合パターンに入れられるか（グループ番号・後方参照・インラインフラグが他とぶつからない）"""
+        if self.regex.groups:
+            return False
+        try:
+            re.compile(f"(?P<r{self.index}>{self.pattern})")
+        except re.error:
+            return False
+        return True
+
+
+class RuleSet:
+    """ルール一覧をまとめてコンパイルしたもの
+
+    exact は dict、prefix は長さ別 dict、contains は Aho-Corasick、
+    regex は 1 本の結合パターンで判定するので、ルール数が増えても 1 メッセージの処理は軽いまま。
+    結合できない regex（グループ・後方参照・インラインフラグ入り）だけは個別に判定する。
+    不正なルールはそのルールだけ読み飛ばす（他のルールは使える）。
+    """
+
+    def __init__(self, rules, disabled_channels=()):
+        self.rules = []
+        for i, data in enumerate(rules):
+            try:
+                self.rules.append(Rule(i, data))
+            except (KeyError, TypeError, ValueError, re.error) as e:
+                print(f"⚠️ 自動返信ルール {i} を読み飛ばしました: {type(e).__name__}: {e}")
+        self._by_index = {r.index: r for r in self.rules}
+        self.disabled_channels = frozenset(disabled_channels)
+        self.exact = {}
+        self.prefix = {}
+        keywords = []
+        regexes = []
+        for r in self.rules:
+            key = r.pattern.strip().lower()
+            if r.type == "exact":
+                self.exact.setdefault(key, []).append(r)
+            elif r.type == "prefix":
+                self.prefix.setdefault(key, []).append(r)
+            elif r.type == "contains":
+                keywords.append((key, r.index))
+            else:
+                regexes.append(r)
+        self.prefix_lengths = sorted({len(k) for k in self.prefix})
+        self.keywords = AhoCorasick(keywords) if keywords else None
+        self.regexes = regexes
+        combined = [r for r in regexes if r.combinable()]
+        self.combined_rules = combined  # index 順
+        self.separate = [r for r in regexes if not r.combinable()]
+        self.combined = None
+        if combined:
+            self.combined = re.compile("|".join(f"(?P<r{r.index}>{r.pattern})" for r in combined), re.IGNORECASE)
+        self._cooldowns = {}
+
+    # ---------- 判定 ----------
+    def candidates(self, text):
+        """text（strip + lower 済み）にマッチするルールを優先順に返す
+
+        結合 regex は 1 回の search で当たりの有無を見て、当たった時はそれより優先度の高い regex だけ
+        個別に確かめる（先頭で当たるのが優先度の低いルールとは限らないため）。
+        それより低いものは match() が必要な時だけ見る。個別判定の regex は全部。
+        """
+        found = list(self.exact.get(text, ()))
+        for n in self.prefix_lengths:
+            if n > len(text):
+                break
+            found.extend(self.prefix.get(text[:n], ()))
+        if self.keywords is not None:
+            found.extend(self._by_index[i] for i in self.keywords.find(text))
+        if self.combined is not None:
+            m = self.combined.search(text)
+            if m:
+                hit = self._by_index[int(m.lastgroup[1:])]
+                for r in self.combined_rules:
+                    if r.index >= hit.index:
+                        break
+                    if r.regex.search(text):
+                        found.append(r)
+                found.append(hit)
+        found.extend(r for r in self.separate if r.regex.search(text))
+        found.sort(key=lambda r: r.index)
+        return found
+
+    def _eligible(self, r, channel_id, user_id, now):
+        if r.channels and channel_id not in r.channels:
+            return False
+        if r.cooldown:
+            key = (r.index, user_id if r.cooldown_scope == "user" else channel_id)
+            if self._cooldowns.get(key, 0) > now:
+                return False
+            self._cooldowns[key] = now + r.cooldown
+            if len(self._cooldowns) > 10000:
+                self._cooldowns = {k: v for k, v in self._cooldowns.items() if v > now}
+        return True
+
+    def match(self, text, channel_id, user_id, now=None):
+        """返信すべきルール（チャンネル設定・クールダウンを考慮）"""
+        if channel_id in self.disabled_channels:
+            return None
+        now = time.monotonic() if now is None else now
+        found = self.candidates(text)
+        for r in found:
+            if self._eligible(r, channel_id, user_id, now):
+                return r
+        # 結合 regex の 1 件目が使えなかった時だけ、残りの regex を個別に確認
+        if any(r.type == "regex" for r in found):
+            tried = {r.index for r in found}
+            for r in self.regexes:
+                if r.index not in tried and r.regex.search(text) and self._eligible(r, channel_id, user_id, now):
+                    return r
+        return None
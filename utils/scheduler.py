@@ -0,0 +1,102 @@
+# utils/scheduler.py
+import asyncio
+import heapq
+import itertools
+import time
+import traceback
+
+
+class DeadlineScheduler:
+    """キーごとに 1 つの期限を持つタイマー（最小ヒープ + 遅延削除）
+
+    schedule() は古い期限を消さずに新しい要素を積むだけ（O(log n)）。
+    取り出した時に最新でない要素は捨てる。捨て要素が増えたらまとめて作り直す。
+    期限は time.time()（保存した時刻から再構築するので壁時計）。
+    """
+
+    def __init__(self, handler, name="scheduler"):
+        self.handler = handler  # async def handler(key, kind)
+        self.name = name
+        self._heap = []      # (when, seq, key, kind)
+        self._current = {}   # key -> seq（最新の要素だけ有効）
+        self._seq = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._task = None
+        self._running = set()
+        self.fired = 0
+
+    def __len__(self):
+        return len(self._current)
+
+    def __contains__(self, key):
+        return key in self._current
+
+    def schedule(self, key, when, kind):
+        seq = next(self._seq)
+        self._current[key] = seq
+        heapq.heappush(self._heap, (when, seq, key, kind))
+        if len(self._heap) > 2 * len(self._current) + 1024:
+            self._compact()
+        if self._heap[0][1] == seq:
+            self._wakeup.set()  # 一番早い期限が変わった
+
+    def cancel(self, key):
+        # ヒープからは消さない（取り出した時に捨てる）
+        self._current.pop(key, None)
+
+    def clear(self):
+        self._heap.clear()
+        self._current.clear()
+        self._wakeup.set()
+
+    def _compact(self):
+        self._heap = [e for e in self._heap if self._current.get(e[2]) == e[1]]
+        heapq.heapify(self._heap)
+
+    def _discard_stale(self):
+        while self._heap and self._current.get(self._heap[0][2]) != self._heap[0][1]:
+            heapq.heappop(self._heap)
+
+    def next_deadline(self):
+        self._discard_stale()
+        return self._heap[0][0] if self._heap else None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run(), name=self.name)
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for t in list(self._running):
+            t.cancel()
+
+    async def _run(self):
+        while True:
+            self._wakeup.clear()
+            when = self.next_deadline()
+            delay = None if when is None else when - time.time()
+            if delay is None or delay > 0:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            _, seq, key, kind = heapq.heappop(self._heap)
+            del self._current[key]
+            self.fired += 1
+            # 処理（Discord への送信など）は待たずに次の期限へ
+            task = asyncio.get_running_loop().create_task(self._fire(key, kind))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+
+    async def _fire(self, key, kind):
+        try:
+            await self.handler(key, kind)
+        except Exception:
+            traceback.print_exc()
@@ -0,0 +1,223 @@
+# utils/search_index.py
+import asyncio
+import glob
+import os
+import re
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.transcript import ARCHIVE_DIR, iter_transcript
+
+INDEX_PATH = os.path.join(ARCHIVE_DIR, "index.db")
+
+# FTS5 の trigram は 3 文字未満の語を MATCH できないので、その語だけ LIKE で絞る
+MIN_MATCH_CHARS = 3
+HIT_START, HIT_END = "\x02", "\x03"  # snippet の強調マーカー（表示側で置き換える）
+
+
+def _quote(term):
+    return '"' + term.replace('"', '""') + '"'
+
+
+def _like(term):
+    return "%" + term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+
+
+class TranscriptIndex:
+    """正本（transcripts/*.jsonl.gz）の全文検索インデックス（SQLite FTS5）
+
+    日本語は空白で区切られないので、使えるなら trigram トークナイザを使う（部分一致）。
+    接続はチケット DB と同じく専用スレッド 1 本だけで使う。
+    """
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS transcripts (
+        id          INTEGER PRIMARY KEY,
+        guild_id    INTEGER,
+        channel_id  INTEGER NOT NULL,
+        number      INTEGER,
+        owner_id    INTEGER,
+        exported_at TEXT,
+        path        TEXT NOT NULL,
+        UNIQUE(guild_id, channel_id)
+    );
+    CREATE INDEX IF NOT EXISTS idx_transcripts_number ON transcripts(guild_id, number);
+    CREATE INDEX IF NOT EXISTS idx_transcripts_owner  ON transcripts(guild_id, owner_id);
+    CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+    """
+
+    def __init__(self, path=INDEX_PATH):
+        self.path = path
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ticket-search")
+        self._conn = None
+        self.tokenizer = None
+
+    async def _run(self, fn, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, fn, *args)
+
+    # ---------- 接続 ----------
+    def _open(self):
+        if os.path.dirname(self.path):
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        conn = sqlite3.connect(self.path)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(self.SCHEMA)
+        row = conn.execute("SELECT value FROM meta WHERE key='tokenizer'").fetchone()
+        tokenizer = row[0] if row else None
+        if tokenizer is None:
+            # trigram は SQLite 3.34 以降。無ければ unicode61（空白区切りの語単位）
+            for tokenizer in ("trigram", "unicode61"):
+                try:
+                    with conn:
+                        conn.execute(
+                            "CREATE VIRTUAL TABLE IF NOT EXISTS messages USING fts5("
+                            "content, author, transcript_id UNINDEXED, message_id UNINDEXED, ts UNINDEXED, "
+                            f"tokenize='{tokenizer}')"
+                        )
+                        conn.execute("INSERT INTO meta(key, value) VALUES ('tokenizer', ?)", (tokenizer,))
+                    break
+                except sqlite3.OperationalError:
+                    continue
+        self.tokenizer = tokenizer
+        self._conn = conn
+
+    async def open(self):
+        await self._run(self._open)
+
+    async def close(self):
+        def _close():
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+        await self._run(_close)
+        self._executor.shutdown(wait=True)
+
+    # ---------- 登録 ----------
+    def _index(self, path):
+        records = iter_transcript(path)
+        meta = next(records, None)
+        if not meta or meta.get("type") != "meta":
+            return 0
+        conn = self._conn
+        with conn:
+            old = conn.execute(
+                "SELECT id FROM transcripts WHERE guild_id IS ? AND channel_id=?",
+                (meta.get("guild_id"), meta["channel_id"])
+            ).fetchone()
+            if old:
+                # 保存 → 削除で同じチャンネルを書き出し直した時は置き換える
+                conn.execute("DELETE FROM messages WHERE transcript_id=?", (old["id"],))
+                conn.execute("DELETE FROM transcripts WHERE id=?", (old["id"],))
+            tid = conn.execute(
+                "INSERT INTO transcripts(guild_id, channel_id, number, owner_id, exported_at, path) VALUES (?, ?, ?, ?, ?, ?)",
+                (meta.get("guild_id"), meta["channel_id"], meta.get("number"), meta.get("owner_id"),
+                 meta.get("exported_at"), os.path.abspath(path))
+            ).lastrowid
+            rows = [
+                (rec["content"], rec.get("author") or "", tid, rec.get("id"), rec.get("ts"))
+                for rec in records if rec.get("content")
+            ]
+            conn.executemany(
+                "INSERT INTO messages(content, author, transcript_id, message_id, ts) VALUES (?, ?, ?, ?, ?)", rows
+            )
+        return len(rows)
+
+    async def index(self, path):
+        """正本 1 件を登録（同じチャンネルの古い登録は置き換え）。登録したメッセージ数を返す"""
+        return await self._run(self._index, path)
+
+    def _reindex_all(self, archive_dir):
+        files = n = 0
+        for path in sorted(glob.glob(os.path.join(archive_dir, "ticket-*.jsonl.gz")), key=os.path.getmtime):
+            n += self._index(path)
+            files += 1
+        with self._conn:
+            self._conn.execute("INSERT INTO messages(messages) VALUES ('optimize')")
+        return files, n
+
+    async def reindex_all(self, archive_dir=ARCHIVE_DIR):
+        """保存済みの正本をすべて登録し直す（インデックス導入前の分の取り込み用）"""
+        return await self._run(self._reindex_all, archive_dir)
+
+    # ---------- 検索 ----------
+    def _search(self, guild_id, terms, owner_id, number, after, before, limit):
+        match = [t for t in terms if self.tokenizer != "trigram" or len(t) >= MIN_MATCH_CHARS]
+        short = [t for t in terms if t not in match]
+        where = ["t.guild_id=?"]
+        params = [guild_id]
+        if match:
+            where.append("messages MATCH ?")
+            params.append(" ".join(_quote(t) for t in match))
+        for t in short:
+            where.append("m.content LIKE ? ESCAPE '\\'")
+            params.append(_like(t))
+        for col, value, op in (("t.owner_id", owner_id, "="), ("t.number", number, "="), ("m.ts", after, ">="), ("m.ts", before, "<")):
+            if value is not None:
+                where.append(f"{col}{op}?")
+                params.append(value)
+        if match:
+            select = f"snippet(messages, 0, '{HIT_START}', '{HIT_END}', '…', 16) AS snippet, bm25(messages) AS score"
+            order = "score"
+        else:
+            select = "m.content AS snippet, 0 AS score"
+            order = "m.ts DESC"
+        sql = (
+            f"SELECT t.number, t.owner_id, t.channel_id, m.author, m.ts, m.message_id, {select} "
+            f"FROM messages m JOIN transcripts t ON t.id = m.transcript_id "
+            f"WHERE {' AND '.join(where)} ORDER BY {order} LIMIT ?"
+        )
+        # 1 チケットに複数ヒットしても 1 行にまとめる（多めに取って順位順に畳む）
+        params.append(limit * 5)
+        hits = {}
+        for r in self._conn.execute(sql, params):
+            key = (r["channel_id"], r["number"])
+            if key in hits:
+                hits[key]["matches"] += 1
+                continue
+            if len(hits) >= limit:
+                continue
+            snippet = r["snippet"]
+            if not match:
+                snippet = _snippet(snippet, short)
+            hits[key] = {
+                "number": r["number"], "owner_id": r["owner_id"], "channel_id": r["channel_id"],
+                "author": r["author"], "ts": r["ts"], "message_id": r["message_id"],
+                "snippet": snippet, "score": r["score"], "matches": 1,
+            }
+        return list(hits.values())
+
+    async def search(self, guild_id, query, owner_id=None, number=None, after=None, before=None, limit=10):
+        """ギルド内の正本を検索して、チケットごとの上位ヒットと所要秒数を返す
+
+        query は空白区切りの語（すべて含むもの）。after / before は ISO 形式の日時文字列。
+        """
+        terms = [t for t in query.split() if t]
+        if not terms:
+            return [], 0.0
+        started = time.perf_counter()
+        hits = await self._run(self._search, guild_id, terms, owner_id, number, after, before, limit)
+        return hits, time.perf_counter() - started
+
+    def _stats(self):
+        row = self._conn.execute(
+            "SELECT (SELECT COUNT(*) FROM transcripts) AS transcripts, (SELECT COUNT(*) FROM messages) AS messages"
+        ).fetchone()
+        return dict(row)
+
+    async def stats(self):
+        return await self._run(self._stats)
+
+
+def _snippet(content, terms, width=48):
+    # LIKE で拾った時の抜粋（最初にヒットした語の前後）
+    lower = content.lower()
+    pos = min((lower.find(t.lower()) for t in terms if lower.find(t.lower()) >= 0), default=0)
+    start = max(0, pos - width // 2)
+    text = content[start:start + width]
+    for t in terms:
+        text = re.sub(re.escape(t), lambda m: HIT_START + m.group(0) + HIT_END, text, flags=re.IGNORECASE)
+    return ("…" if start else "") + text + ("…" if start + width < len(content) else "")
@@ -0,0 +1,66 @@
+# utils/startup.py
+import asyncio
+import time
+import traceback
+
+
+class StartupTimeline:
+    """起動の各段階にかかった時間を記録して、READY 時にまとめて表示する"""
+
+    def __init__(self):
+        self.t0 = time.perf_counter()
+        self.marks = []  # (label, 経過秒, 区間秒)
+        self._last = self.t0
+        self.printed = False
+
+    def mark(self, label):
+        now = time.perf_counter()
+        self.marks.append((label, now - self.t0, now - self._last))
+        self._last = now
+
+    def span(self, label, started):
+        # 並行して走った処理は開始時刻からの長さで記録する
+        now = time.perf_counter()
+        self.marks.append((label, now - self.t0, now - started))
+
+    def format(self):
+        lines = ["⏱️ 起動タイムライン:"]
+        for label, at, took in self.marks:
+            lines.append(f"  {at * 1000:8.1f}ms  (+{took * 1000:7.1f}ms)  {label}")
+        return "\n".join(lines)
+
+    def print_once(self):
+        # 再接続でも on_ready は何度も来るので、表示は最初の 1 回だけ
+        if not self.printed:
+            self.printed = True
+            print(self.format())
+
+
+def get_timeline(bot) -> StartupTimeline:
+    """bot にぶら下がっている起動タイムライン（無ければ作る）"""
+    timeline = getattr(bot, "startup_timeline", None)
+    if timeline is None:
+        timeline = bot.startup_timeline = StartupTimeline()
+    return timeline
+
+
+async def load_extensions(bot, names):
+    """Cog をまとめて並行に読み込む。失敗したものは表示して残りは続ける"""
+    timeline = get_timeline(bot)
+
+    async def _load(name):
+        started = time.perf_counter()
+        try:
+            await bot.load_extension(name)
+        except Exception:
+            traceback.print_exc()
+            timeline.span(f"extension {name} 失敗", started)
+            return False
+        timeline.span(f"extension {name}", started)
+        return True
+
+    results = await asyncio.gather(*(_load(n) for n in names))
+    failed = [n for n, ok in zip(names, results) if not ok]
+    if failed:
+        print(f"⚠️ 読み込みに失敗した Cog: {', '.join(failed)}")
+    return failed
@@ -0,0 +1,259 @@
+# utils/ticket_archive.py
+import asyncio
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+ARCHIVE_DIR = "ticket_archive"
+INDEX_FILE = "index.tsv"
+
+
+def _epoch(iso):
+    if not iso:
+        return None
+    try:
+        dt = datetime.fromisoformat(iso)
+    except ValueError:
+        return None
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.timestamp()
+
+
+def closed_time(ticket):
+    """クローズした時刻（古いチケットは closed_at が無いので最後の発言 / 作成時刻で代用）"""
+    for key in ("closed_at", "last_activity", "created_at"):
+        t = _epoch(ticket.get(key))
+        if t is not None:
+            return t
+    return None
+
+
+def compactable(tickets, cutoff):
+    # cutoff（epoch 秒）より前にクローズされたチケット
+    out = []
+    for t in tickets:
+        if t.get("state") != "closed":
+            continue
+        closed = closed_time(t)
+        if closed is not None and closed < cutoff:
+            out.append(t)
+    return out
+
+
+def segment_name(ticket):
+    # 作成月ごとのセグメント（作成日時が無いものは unknown）
+    created = _epoch(ticket.get("created_at"))
+    if created is None:
+        return "segment-unknown.jsonl"
+    return "segment-" + datetime.fromtimestamp(created, timezone.utc).strftime("%Y-%m") + ".jsonl"
+
+
+class TicketArchive:
+    """古いクローズ済みチケットの保管先（追記専用）
+
+    ticket_archive/segment-YYYY-MM.jsonl に 1 行 1 件で追記し、
+    index.tsv に「channel_id, guild_id, number, セグメント, オフセット」を 1 行ずつ足す。
+    索引は最初に引いた時に読み込む（普段の起動では読まない）。
+    同じチャンネルが何度も書かれた場合は最後の行が有効。削除は墓標（オフセット -1）を足す。
+    ファイルと索引には専用スレッド 1 本からだけ触る。
+    """
+
+    def __init__(self, root=ARCHIVE_DIR):
+        self.root = root
+        self._by_channel = None  # channel_id -> (segment, offset)
+        self._by_number = None   # (guild_id, number) -> channel_id
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ticket-archive")
+        self.archived = 0
+        self.lookups = 0
+
+    async def _run(self, fn, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, fn, *args)
+
+    async def close(self):
+        self._executor.shutdown(wait=True)
+
+    def _path(self, name):
+        return os.path.join(self.root, name)
+
+    # ---------- 索引 ----------
+    def _apply_index(self, cid, gid, number, segment, offset):
+        if offset < 0:
+            self._by_channel.pop(cid, None)
+            return
+        self._by_channel[cid] = (segment, offset)
+        if number is not None:
+            self._by_number[(gid, number)] = cid
+
+    def _load_index(self):
+        if self._by_channel is not None:
+            return
+        self._by_channel, self._by_number = {}, {}
+        try:
+            with open(self._path(INDEX_FILE), encoding="utf-8") as f:
+                for line in f:
+                    parts = line.rstrip("\n").split("\t")
+                    if len(parts) != 5:
+                        continue  # 書きかけの行
+                    cid, gid, number, segment, offset = parts
+                    self._apply_index(int(cid), int(gid) if gid else None, int(number) if number else None, segment, int(offset))
+        except FileNotFoundError:
+            pass
+
+    def rebuild_index(self):
+        """セグメントを走査して索引を作り直す（索引の書き込み前に落ちた時の復旧用）"""
+        entries = []
+        for name in sorted(os.listdir(self.root)) if os.path.isdir(self.root) else ():
+            if not name.startswith("segment-"):
+                continue
+            with open(self._path(name), "rb") as f:
+                offset = 0
+                for raw in f:
+                    try:
+                        rec = json.loads(raw)
+                        entries.append((rec, name, -1 if rec.get("deleted") else offset))
+                    except ValueError:
+                        pass
+                    offset += len(raw)
+        entries.sort(key=lambda e: e[0].get("archived_at") or "")
+        tmp = self._path(INDEX_FILE + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            for rec, name, offset in entries:
+                f.write(self._index_line(rec, name, offset))
+        os.replace(tmp, self._path(INDEX_FILE))
+        self._by_channel = None
+        self._load_index()
+        return len(self._by_channel)
+
+    @staticmethod
+    def _index_line(rec, segment, offset):
+        gid = rec.get("guild_id")
+        number = rec.get("number")
+        return f"{int(rec['channel_id'])}\t{'' if gid is None else int(gid)}\t{'' if number is None else int(number)}\t{segment}\t{offset}\n"
+
+    # ---------- 書き込み ----------
+    def _append(self, tickets, deleted=False):
+        os.makedirs(self.root, exist_ok=True)
+        self._load_index()
+        now = datetime.now(timezone.utc).isoformat()
+        groups = {}
+        for t in tickets:
+            groups.setdefault("segment-tombstone.jsonl" if deleted else segment_name(t), []).append(t)
+        index_lines = []
+        applied = []
+        for segment, rows in groups.items():
+            # セグメントを先に書いて fsync → 索引（落ちても rebuild_index で戻せる）
+            with open(self._path(segment), "ab") as f:
+                for t in rows:
+                    rec = dict(t, archived_at=now)
+                    if deleted:
+                        rec = {"channel_id": t["channel_id"], "guild_id": t.get("guild_id"),
+                               "number": t.get("number"), "deleted": True, "archived_at": now}
+                    offset = -1 if deleted else f.tell()
+                    f.write((json.dumps(rec, ensure_ascii=False, separators=(",", ":")) + "\n").encode("utf-8"))
+                    index_lines.append(self._index_line(rec, segment, offset))
+                    applied.append((int(rec["channel_id"]), rec.get("guild_id"), rec.get("number"), segment, offset))
+                f.flush()
+                os.fsync(f.fileno())
+        with open(self._path(INDEX_FILE), "a", encoding="utf-8") as f:
+            f.write("".join(index_lines))
+        for entry in applied:
+            self._apply_index(*entry)
+        return len(applied)
+
+    async def append(self, tickets):
+        """チケット（channel_id 付きの dict）をまとめて書き足す"""
+        if not tickets:
+            return 0
+        n = await self._run(self._append, list(tickets))
+        self.archived += n
+        return n
+
+    async def forget(self, channel_id, ticket=None):
+        # 追記専用なので墓標を足す
+        await self._run(self._append, [dict(ticket or {}, channel_id=int(channel_id))], True)
+
+    # ---------- 読み込み ----------
+    def _read(self, channel_id):
+        self._load_index()
+        loc = self._by_channel.get(int(channel_id))
+        if loc is None:
+            return None
+        segment, offset = loc
+        with open(self._path(segment), "rb") as f:
+            f.seek(offset)
+            return self._ticket(json.loads(f.readline()))
+
+    @staticmethod
+    def _ticket(rec):
+        rec.pop("archived_at", None)
+        rec["channel_id"] = int(rec["channel_id"])
+        rec["archived"] = True
+        return rec
+
+    def _all(self, guild_id):
+        self._load_index()
+        by_segment = {}
+        for segment, offset in self._by_channel.values():
+            by_segment.setdefault(segment, []).append(offset)
+        out = []
+        for segment, offsets in by_segment.items():
+            with open(self._path(segment), "rb") as f:
+                for offset in sorted(offsets):
+                    f.seek(offset)
+                    rec = json.loads(f.readline())
+                    if guild_id is None or rec.get("guild_id") == guild_id:
+                        out.append(self._ticket(rec))
+        return out
+
+    async def all(self, guild_id=None):
+        """保管中のチケットをすべて読む（セグメントごとにオフセット順。一括操作・集計の初期化用）"""
+        return await self._run(self._all, guild_id)
+
+    def _contains(self, channel_id):
+        self._load_index()
+        return int(channel_id) in self._by_channel
+
+    async def contains(self, channel_id):
+        return await self._run(self._contains, channel_id)
+
+    async def get(self, channel_id):
+        self.lookups += 1
+        return await self._run(self._read, channel_id)
+
+    def _find_number(self, number, guild_id):
+        self._load_index()
+        if guild_id is not None:
+            return self._by_number.get((guild_id, number))
+        for (gid, n), cid in self._by_number.items():
+            if n == number:
+                return cid
+        return None
+
+    async def by_number(self, number, guild_id=None):
+        cid = await self._run(self._find_number, number, guild_id)
+        if cid is None:
+            return None
+        rec = await self.get(cid)
+        # 番号の索引は墓標で消えないので、読んだ結果で確かめる
+        return rec if rec and rec.get("number") == number else None
+
+    def _stats(self):
+        self._load_index()
+        size = 0
+        segments = 0
+        if os.path.isdir(self.root):
+            for name in os.listdir(self.root):
+                if name.startswith("segment-"):
+                    segments += 1
+                    size += os.path.getsize(self._path(name))
+        return {"entries": len(self._by_channel), "segments": segments, "bytes": size}
+
+    async def stats(self):
+        return await self._run(self._stats)
+
+    async def reindex(self):
+        return await self._run(self.rebuild_index)
+
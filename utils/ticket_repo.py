@@ -0,0 +1,405 @@
+# utils/ticket_repo.py
+import asyncio
+import sqlite3
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.ticket_archive import ARCHIVE_DIR, TicketArchive, compactable
+
+# チケットの 1 件分:
+#   {"channel_id", "guild_id", "owner_id", "number", "state", "created_at", "last_activity", "closed_at"}
+# 番号はギルドごとの連番。last_activity は最後の発言時刻（放置チケットの自動クローズ用）
+TICKET_FIELDS = ("guild_id", "owner_id", "number", "state", "created_at", "last_activity", "closed_at")
+
+
+class JsonTicketRepository:
+    """ticket_config.json の "tickets" をそのまま使う従来方式"""
+
+    backend = "json"
+
+    def __init__(self, store):
+        self.store = store
+
+    @property
+    def _tickets(self):
+        return self.store.data.setdefault("tickets", {})
+
+    async def open(self):
+        pass
+
+    async def close(self):
+        pass
+
+    async def next_number(self, guild_id):
+        # await を挟まないのでループ上では読み書きが割り込まれない
+        ns = self.store.guild(guild_id)
+        ns["ticket_count"] = ns.get("ticket_count", 0) + 1
+        self.store.mark_dirty()
+        return ns["ticket_count"]
+
+    async def claim_legacy(self, guild_id):
+        # ギルド ID の無い古いチケットを guild_id のものにする（カウンタは設定側で移行済み）
+        n = 0
+        for t in self._tickets.values():
+            if t.get("guild_id") is None:
+                t["guild_id"] = guild_id
+                n += 1
+        if n:
+            self.store.mark_dirty()
+        return n
+
+    async def add(self, channel_id, ticket):
+        self._tickets[str(channel_id)] = {k: ticket.get(k) for k in TICKET_FIELDS}
+        self.store.mark_dirty()
+
+    async def get(self, channel_id):
+        t = self._tickets.get(str(channel_id))
+        return dict(t, channel_id=int(channel_id)) if t else None
+
+    async def update(self, channel_id, **fields):
+        t = self._tickets.get(str(channel_id))
+        if not t:
+            return False
+        t.update(fields)
+        self.store.mark_dirty()
+        return True
+
+    async def delete(self, channel_id):
+        if self._tickets.pop(str(channel_id), None) is None:
+            return False
+        self.store.mark_dirty()
+        return True
+
+    async def delete_many(self, channel_ids):
+        n = sum(1 for cid in channel_ids if self._tickets.pop(str(cid), None) is not None)
+        if n:
+            self.store.mark_dirty()
+        return n
+
+    def _filter(self, pred, guild_id=None):
+        return [
+            dict(t, channel_id=int(cid)) for cid, t in self._tickets.items()
+            if pred(t) and (guild_id is None or t.get("guild_id") == guild_id)
+        ]
+
+    async def all(self, guild_id=None):
+        return self._filter(lambda t: True, guild_id)
+
+    async def by_owner(self, owner_id, guild_id=None):
+        return self._filter(lambda t: t.get("owner_id") == owner_id, guild_id)
+
+    async def by_state(self, state, guild_id=None):
+        return self._filter(lambda t: t.get("state") == state, guild_id)
+
+    async def by_number(self, number, guild_id=None):
+        found = self._filter(lambda t: t.get("number") == number, guild_id)
+        return found[0] if found else None
+
+    async def count(self):
+        return len(self._tickets)
+
+    async def channel_ids(self):
+        return [int(cid) for cid in self._tickets]
+
+
+class SqliteTicketRepository:
+    """SQLite 版: インデックス付き検索 + トランザクションでの番号採番"""
+
+    backend = "sqlite"
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS tickets (
+        channel_id INTEGER PRIMARY KEY,
+        owner_id   INTEGER NOT NULL,
+        number     INTEGER NOT NULL,
+        state      TEXT NOT NULL,
+        created_at TEXT
+    );
+    CREATE INDEX IF NOT EXISTS idx_tickets_owner  ON tickets(owner_id);
+    CREATE INDEX IF NOT EXISTS idx_tickets_state  ON tickets(state);
+    CREATE INDEX IF NOT EXISTS idx_tickets_number ON tickets(number);
+    CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL);
+    CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+    """
+
+    def __init__(self, path, store=None):
+        self.path = path
+        self.store = store  # JSON からの初回インポート用
+        # 接続は専用スレッド 1 本だけで使う（ループを止めない & 直列化）
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ticket-db")
+        self._conn = None
+
+    async def _run(self, fn, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, fn, *args)
+
+    # ---------- 接続 ----------
+    def _open(self):
+        conn = sqlite3.connect(self.path)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(self.SCHEMA)
+        self._migrate(conn)
+        self._conn = conn
+
+    # 後から増えた列（古い DB にも追加する）
+    COLUMNS = {
+        "guild_id": "INTEGER",
+        "last_activity": "TEXT",
+        "closed_at": "TEXT",
+    }
+    INDEXES = """
+    CREATE INDEX IF NOT EXISTS idx_tickets_guild_number ON tickets(guild_id, number);
+    CREATE INDEX IF NOT EXISTS idx_tickets_guild_state  ON tickets(guild_id, state);
+    """
+
+    def _migrate(self, conn):
+        have = {r[1] for r in conn.execute("PRAGMA table_info(tickets)")}
+        with conn:
+            for col, decl in self.COLUMNS.items():
+                if col not in have:
+                    conn.execute(f"ALTER TABLE tickets ADD COLUMN {col} {decl}")
+        conn.executescript(self.INDEXES)
+
+    async def open(self):
+        await self._run(self._open)
+        if self.store is not None:
+            await self.import_json(self.store)
+
+    async def close(self):
+        def _close():
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+        await self._run(_close)
+        self._executor.shutdown(wait=True)
+
+    # ---------- JSON からの初回インポート ----------
+    def _import(self, tickets, count, guild_counts):
+        conn = self._conn
+        if conn.execute("SELECT 1 FROM meta WHERE key='imported_json'").fetchone():
+            return 0
+        with conn:
+            conn.executemany(
+                "INSERT OR IGNORE INTO tickets(channel_id, guild_id, owner_id, number, state, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+                [(int(cid), t.get("guild_id"), t.get("owner_id"), t.get("number"), t.get("state", "open"), t.get("created_at"))
+                 for cid, t in tickets.items()]
+            )
+            conn.execute(
+                "INSERT INTO counters(name, value) VALUES ('ticket_count', ?) "
+                "ON CONFLICT(name) DO UPDATE SET value=MAX(value, excluded.value)",
+                (count,)
+            )
+            # ギルドごとのカウンタ（無いと取り込んだ番号をまた 1 から振ってしまう）
+            conn.executemany(
+                "INSERT INTO counters(name, value) VALUES (?, ?) "
+                "ON CONFLICT(name) DO UPDATE SET value=MAX(value, excluded.value)",
+                [(f"ticket_count:{gid}", n) for gid, n in guild_counts.items()]
+            )
+            conn.execute("INSERT INTO meta(key, value) VALUES ('imported_json', datetime('now'))")
+        return len(tickets)
+
+    async def import_json(self, store):
+        cfg = store.data
+        tickets = dict(cfg.get("tickets", {}))
+        # ギルドの名前空間のカウンタと、取り込むチケットの最大番号の大きい方
+        guild_counts = {}
+        for gid, ns in (cfg.get("guilds") or {}).items():
+            guild_counts[int(gid)] = int(ns.get("ticket_count") or 0)
+        for t in tickets.values():
+            if t.get("guild_id") is not None and t.get("number") is not None:
+                gid = int(t["guild_id"])
+                guild_counts[gid] = max(guild_counts.get(gid, 0), int(t["number"]))
+        try:
+            # 単一ギルド時代の ticket_count（トップレベル）は共通カウンタとして取り込み、claim_legacy で移す
+            n = await self._run(self._import, tickets, cfg.get("ticket_count", 0), guild_counts)
+        except Exception:
+            traceback.print_exc()
+            return 0
+        if n and tickets:
+            # 移行済みのチケットは JSON から外す（以後 JSON は小さいまま）
+            cfg["tickets"] = {}
+            store.mark_dirty()
+            print(f"📦 ticket_config.json から {n} 件のチケットを SQLite に移行しました")
+        return n
+
+    # ---------- 操作 ----------
+    def _next_number(self, guild_id):
+        name = f"ticket_count:{guild_id}"
+        with self._conn:
+            self._conn.execute(
+                "INSERT INTO counters(name, value) VALUES (?, 1) "
+                "ON CONFLICT(name) DO UPDATE SET value=value+1",
+                (name,)
+            )
+            row = self._conn.execute("SELECT value FROM counters WHERE name=?", (name,)).fetchone()
+        return row[0]
+
+    async def next_number(self, guild_id):
+        return await self._run(self._next_number, guild_id)
+
+    def _claim_legacy(self, guild_id):
+        with self._conn:
+            row = self._conn.execute("SELECT value FROM counters WHERE name='ticket_count'").fetchone()
+            if row:
+                self._conn.execute(
+                    "INSERT INTO counters(name, value) VALUES (?, ?) "
+                    "ON CONFLICT(name) DO UPDATE SET value=MAX(value, excluded.value)",
+                    (f"ticket_count:{guild_id}", row[0])
+                )
+                self._conn.execute("DELETE FROM counters WHERE name='ticket_count'")
+            return self._conn.execute("UPDATE tickets SET guild_id=? WHERE guild_id IS NULL", (guild_id,)).rowcount
+
+    async def claim_legacy(self, guild_id):
+        """ギルド ID の無い古いチケットと共通カウンタを guild_id のものにする"""
+        return await self._run(self._claim_legacy, guild_id)
+
+    def _write(self, sql, params):
+        with self._conn:
+            return self._conn.execute(sql, params).rowcount
+
+    def _query(self, sql, params):
+        return [dict(r) for r in self._conn.execute(sql, params).fetchall()]
+
+    async def add(self, channel_id, ticket):
+        cols = ", ".join(TICKET_FIELDS)
+        marks = ", ".join("?" for _ in TICKET_FIELDS)
+        values = [ticket.get(k) for k in TICKET_FIELDS]
+        values[TICKET_FIELDS.index("state")] = ticket.get("state", "open")
+        await self._run(
+            self._write,
+            f"INSERT OR REPLACE INTO tickets(channel_id, {cols}) VALUES (?, {marks})",
+            (int(channel_id), *values)
+        )
+
+    async def get(self, channel_id):
+        rows = await self._run(self._query, "SELECT * FROM tickets WHERE channel_id=?", (int(channel_id),))
+        return rows[0] if rows else None
+
+    async def update(self, channel_id, **fields):
+        fields = {k: v for k, v in fields.items() if k in TICKET_FIELDS}
+        if not fields:
+            return False
+        cols = ", ".join(f"{k}=?" for k in fields)
+        n = await self._run(self._write, f"UPDATE tickets SET {cols} WHERE channel_id=?", (*fields.values(), int(channel_id)))
+        return n > 0
+
+    async def delete(self, channel_id):
+        n = await self._run(self._write, "DELETE FROM tickets WHERE channel_id=?", (int(channel_id),))
+        return n > 0
+
+    def _delete_many(self, channel_ids):
+        with self._conn:
+            cur = self._conn.executemany("DELETE FROM tickets WHERE channel_id=?", [(int(c),) for c in channel_ids])
+            return cur.rowcount
+
+    async def delete_many(self, channel_ids):
+        """まとめて削除（1 トランザクション）"""
+        return await self._run(self._delete_many, list(channel_ids))
+
+    async def _select(self, where, params, guild_id):
+        if guild_id is not None:
+            where += " AND guild_id=?"
+            params = (*params, guild_id)
+        return await self._run(self._query, f"SELECT * FROM tickets WHERE {where} ORDER BY number", params)
+
+    async def all(self, guild_id=None):
+        return await self._select("1=1", (), guild_id)
+
+    async def by_owner(self, owner_id, guild_id=None):
+        return await self._select("owner_id=?", (owner_id,), guild_id)
+
+    async def by_state(self, state, guild_id=None):
+        return await self._select("state=?", (state,), guild_id)
+
+    async def by_number(self, number, guild_id=None):
+        rows = await self._select("number=?", (number,), guild_id)
+        return rows[0] if rows else None
+
+    async def count(self):
+        rows = await self._run(self._query, "SELECT COUNT(*) AS n FROM tickets", ())
+        return rows[0]["n"]
+
+    async def channel_ids(self):
+        rows = await self._run(self._query, "SELECT channel_id FROM tickets", ())
+        return [r["channel_id"] for r in rows]
+
+
+class TieredTicketRepository:
+    """ホット（JSON / SQLite）+ コールド（TicketArchive）の 2 段構え
+
+    古いクローズ済みチケットは compact() で保管先へ移し、ホット側は open と最近のものだけにする。
+    get / by_number はホットに無ければ保管先を引く。保管先のチケットを更新する時はホットへ戻す（保管先からは消す）。
+    それ以外の操作はホット側にそのまま渡す。
+    """
+
+    def __init__(self, hot, archive):
+        self.hot = hot
+        self.archive = archive
+
+    def __getattr__(self, name):
+        return getattr(self.hot, name)
+
+    async def close(self):
+        await self.hot.close()
+        await self.archive.close()
+
+    async def get(self, channel_id):
+        t = await self.hot.get(channel_id)
+        if t is None:
+            t = await self.archive.get(channel_id)
+        return t
+
+    async def all(self, guild_id=None, archived=False):
+        """archived=True なら保管先のチケットも含める（保管先は全件読むので普段は使わない）"""
+        tickets = await self.hot.all(guild_id)
+        if archived:
+            hot = {t["channel_id"] for t in tickets}
+            tickets += [t for t in await self.archive.all(guild_id) if t["channel_id"] not in hot]
+        return tickets
+
+    async def by_number(self, number, guild_id=None):
+        t = await self.hot.by_number(number, guild_id)
+        if t is None:
+            t = await self.archive.by_number(number, guild_id)
+        return t
+
+    async def update(self, channel_id, **fields):
+        if await self.hot.update(channel_id, **fields):
+            return True
+        t = await self.archive.get(channel_id)
+        if t is None:
+            return False
+        # 再開・保存などで触られたら作業中に戻す（保管先には墓標を足して二重に持たない）
+        t.pop("archived", None)
+        await self.hot.add(channel_id, t)
+        await self.archive.forget(channel_id, t)
+        return await self.hot.update(channel_id, **fields)
+
+    async def delete(self, channel_id):
+        found = await self.hot.delete(channel_id)
+        if await self.archive.contains(channel_id):
+            await self.archive.forget(channel_id)
+            found = True
+        return found
+
+    async def compact(self, cutoff):
+        """cutoff（epoch 秒）より前にクローズしたチケットを保管先へ移し、移したチケットを返す"""
+        old = compactable(await self.hot.by_state("closed"), cutoff)
+        if not old:
+            return []
+        # 先に保管先へ書いてからホットから消す（途中で落ちても二重になるだけ）
+        await self.archive.append(old)
+        await self.hot.delete_many([t["channel_id"] for t in old])
+        return old
+
+
+def create_repository(store):
+    """設定の "storage" に応じてリポジトリを選ぶ（既定は json）"""
+    cfg = store.data
+    if cfg.get("storage") == "sqlite":
+        hot = SqliteTicketRepository(cfg.get("sqlite_path") or "tickets.db", store=store)
+    else:
+        hot = JsonTicketRepository(store)
+    return TieredTicketRepository(hot, TicketArchive(cfg.get("archive_dir") or ARCHIVE_DIR))
@@ -0,0 +1,258 @@
+# utils/ticket_stats.py
+import asyncio
+import bisect
+import json
+import math
+import time
+import traceback
+from datetime import datetime, timedelta, timezone
+
+from utils.config_store import ConfigStore
+
+STATS_FILE = "ticket_stats.json"
+EVENT_LOG = "ticket_events.jsonl"
+
+EVENTS = ("created", "first_response", "closed", "reopened", "saved", "deleted")
+KEEP_DAYS = 90  # 日別の件数を残す日数
+
+# 所要時間のバケット上端（30 秒〜約 60 日を 1.25 倍刻み。誤差は 1 バケット分 = 最大 25%）
+DURATION_BUCKETS = tuple(30 * 1.25 ** i for i in range(int(math.log(60 * 86400 / 30, 1.25)) + 2))
+
+
+def _empty_histogram():
+    return {"counts": [0] * (len(DURATION_BUCKETS) + 1), "sum": 0.0}
+
+
+GUILD_DEFAULTS = {
+    "states": {"open": 0, "closed": 0},  # 今の件数
+    "totals": {},  # event -> 累計
+    "days": {},  # "YYYY-MM-DD"（UTC）-> {event: 件数}
+    "first_response": _empty_histogram(),  # 作成 → 運営の最初の返信（秒）
+    "close": _empty_histogram(),  # 作成 → クローズ（秒）
+    "waiting": {},  # channel_id -> [作成時刻, owner_id]（運営がまだ返信していない）
+    "seeded": False,  # 既存チケットから states を数えたか
+}
+
+
+def observe(hist, seconds):
+    hist["counts"][bisect.bisect_left(DURATION_BUCKETS, seconds)] += 1
+    hist["sum"] += seconds
+
+
+def quantile(hist, q):
+    """バケットから q 分位を返す（バケットの上端。件数が無ければ None）
+
+    バケット数は固定なので、件数がいくつでも同じ手間で済む。
+    """
+    counts = hist["counts"]
+    total = sum(counts)
+    if not total:
+        return None
+    rank = max(1, math.ceil(q * total))
+    acc = 0
+    for i, c in enumerate(counts):
+        acc += c
+        if acc >= rank:
+            return DURATION_BUCKETS[min(i, len(DURATION_BUCKETS) - 1)]
+    return DURATION_BUCKETS[-1]
+
+
+def summarize(hist):
+    n = sum(hist["counts"])
+    return {
+        "count": n,
+        "mean": hist["sum"] / n if n else None,
+        "p50": quantile(hist, 0.5),
+        "p95": quantile(hist, 0.95),
+    }
+
+
+def _today(now=None):
+    return datetime.fromtimestamp(now or time.time(), timezone.utc).strftime("%Y-%m-%d")
+
+
+class TicketStats:
+    """チケットのライフサイクルイベントと集計
+
+    イベントは ticket_events.jsonl に 1 行ずつ追記（後から集計し直す時の元データ）。
+    集計（状態ごとの件数・日別件数・所要時間のヒストグラム）はイベントのたびに足し込み、
+    ticket_stats.json に ConfigStore でまとめて保存する。表示は集計を読むだけ。
+    """
+
+    def __init__(self, path=STATS_FILE, event_log=EVENT_LOG, flush_delay=1.0):
+        self.store = ConfigStore(path, {"guilds": {}}, GUILD_DEFAULTS)
+        self.event_log = event_log
+        self.flush_delay = flush_delay
+        self._events = []  # 未書き込みのイベント行
+        self._flush_task = None
+
+    def guild(self, guild_id):
+        return self.store.guild(guild_id)
+
+    # ---------- 記録 ----------
+    def record(self, event, guild_id, channel_id, number=None, actor_id=None, state=None, created=None, now=None):
+        """イベントを 1 件記録して集計に足し込む
+
+        state は delete 時の直前の状態、created は作成時刻（epoch 秒）。
+        所要時間を返す（closed / first_response 以外は None）。
+        """
+        now = now or time.time()
+        g = self.guild(guild_id)
+        states = g["states"]
+        cid = str(channel_id)
+        took = None
+        g["totals"][event] = g["totals"].get(event, 0) + 1
+        day = _today(now)
+        days = g["days"]
+        if day not in days:
+            days[day] = {}
+            cutoff = _today(now - KEEP_DAYS * 86400)
+            for old in [d for d in days if d < cutoff]:
+                del days[old]
+        days[day][event] = days[day].get(event, 0) + 1
+
+        if event == "created":
+            states["open"] += 1
+            g["waiting"][cid] = [created or now, actor_id]
+        elif event == "first_response":
+            entry = g["waiting"].pop(cid, None)
+            if entry:
+                took = max(0.0, now - entry[0])
+                observe(g["first_response"], took)
+        elif event == "closed":
+            states["open"] = max(0, states["open"] - 1)
+            states["closed"] += 1
+            g["waiting"].pop(cid, None)  # 返信なしでクローズしたものは応答時間に入れない
+            if created is not None:
+                took = max(0.0, now - created)
+                observe(g["close"], took)
+        elif event == "reopened":
+            states["closed"] = max(0, states["closed"] - 1)
+            states["open"] += 1
+        elif event == "deleted":
+            if state in states:
+                states[state] = max(0, states[state] - 1)
+            g["waiting"].pop(cid, None)
+        self.store.mark_dirty()
+
+        rec = {"ts": datetime.fromtimestamp(now, timezone.utc).isoformat(), "event": event,
+               "guild_id": guild_id, "channel_id": channel_id}
+        for key, value in (("number", number), ("actor_id", actor_id), ("state", state), ("seconds", took)):
+            if value is not None:
+                rec[key] = round(value, 3) if key == "seconds" else value
+        self._append_event(rec)
+        return took
+
+    def awaiting_response(self, guild_id, channel_id):
+        """運営の最初の返信待ちなら owner_id を返す（待っていなければ None）"""
+        guilds = self.store.data.get("guilds", {})
+        g = guilds.get(str(guild_id))
+        entry = g["waiting"].get(str(channel_id)) if g else None
+        return entry[1] if entry else None
+
+    def unseeded(self, guild_ids):
+        guilds = self.store.data.get("guilds", {})
+        return [gid for gid in guild_ids if not (guilds.get(str(gid)) or {}).get("seeded")]
+
+    def seed(self, tickets, guild_ids=()):
+        """集計の無いギルドの states を今のチケットから数える（導入時に 1 回だけ）
+
+        guild_ids はチケットが無くても数え終わった扱いにするギルド。
+        """
+        by_guild = {gid: [] for gid in guild_ids}
+        for t in tickets:
+            if t.get("guild_id") is not None:
+                by_guild.setdefault(t["guild_id"], []).append(t)
+        seeded = []
+        for gid, rows in by_guild.items():
+            g = self.guild(gid)
+            if g.get("seeded"):
+                continue
+            for t in rows:
+                if t.get("state") in g["states"]:
+                    g["states"][t["state"]] += 1
+            g["seeded"] = True
+            seeded.append(gid)
+        if seeded:
+            self.store.mark_dirty()
+        return seeded
+
+    # ---------- 参照 ----------
+    def snapshot(self, guild_id, days=7, now=None):
+        """!ticketstats 用の要約（保存済みの集計を読むだけ。days は KEEP_DAYS まで）"""
+        g = self.guild(guild_id)
+        now = now or time.time()
+        recent = {}
+        start = datetime.fromtimestamp(now, timezone.utc)
+        for i in range(min(days, KEEP_DAYS)):
+            day = (start - timedelta(days=i)).strftime("%Y-%m-%d")
+            for event, n in g["days"].get(day, {}).items():
+                recent[event] = recent.get(event, 0) + n
+        return {
+            "states": dict(g["states"]),
+            "totals": dict(g["totals"]),
+            "recent": recent,
+            "days": min(days, KEEP_DAYS),
+            "waiting": len(g["waiting"]),
+            "first_response": summarize(g["first_response"]),
+            "close": summarize(g["close"]),
+        }
+
+    # ---------- イベントログ ----------
+    def _append_event(self, rec):
+        self._events.append(json.dumps(rec, ensure_ascii=False, separators=(",", ":")) + "\n")
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self._write_events(self._take_events())
+            return
+        if self._flush_task is None:
+            self._flush_task = loop.create_task(self._delayed_flush())
+
+    def _take_events(self):
+        lines, self._events = self._events, []
+        return lines
+
+    def _write_events(self, lines):
+        if lines:
+            with open(self.event_log, "a", encoding="utf-8") as f:
+                f.write("".join(lines))
+
+    async def _delayed_flush(self):
+        try:
+            await asyncio.sleep(self.flush_delay)
+            await self.flush_events()
+        finally:
+            self._flush_task = None
+
+    async def flush_events(self):
+        lines = self._take_events()
+        try:
+            await asyncio.to_thread(self._write_events, lines)
+        except Exception:
+            traceback.print_exc()
+            self._events[:0] = lines  # 次の書き込みでもう一度
+
+    async def close(self):
+        task = self._flush_task
+        if task is not None and task is not asyncio.current_task():
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._flush_task = None
+        await self.flush_events()
+        await self.store.close()
+
+
+def format_duration(seconds):
+    if seconds is None:
+        return "-"
+    if seconds < 90:
+        return f"{seconds:.0f}秒"
+    if seconds < 90 * 60:
+        return f"{seconds / 60:.0f}分"
+    if seconds < 36 * 3600:
+        return f"{seconds / 3600:.1f}時間"
+    return f"{seconds / 86400:.1f}日"
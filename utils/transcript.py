@@ -0,0 +1,246 @@
+# utils/transcript.py
+import asyncio
+import glob
+import gzip
+import html
+import json
+import os
+import pathlib
+import tempfile
+from datetime import datetime
+
+from utils.attachments import ATTACHMENT_DIR, collect_urls
+from utils.message_log import message_record
+
+# 何メッセージ分たまったらファイルに書き出すか（メモリ上限はこれで決まる）
+FLUSH_EVERY = 200
+
+
+def render_header(channel_name: str) -> str:
+    lines = [
+        "<!doctype html>",
+        "<html><head><meta charset='utf-8'><title>Ticket Log</title></head><body>",
+        f"<h2>Channel: {html.escape(channel_name)}</h2>",
+        f"<h3>Exported: {datetime.utcnow().isoformat()} (UTC)</h3>",
+        "<hr>",
+    ]
+    return "\n".join(lines) + "\n"
+
+
+def render_footer() -> str:
+    return "</body></html>"
+
+
+def render_record(rec: dict, attachment_root: str = ATTACHMENT_DIR) -> str:
+    """メッセージ 1 件（message_record 形式）を HTML ブロックにする
+
+    rec["files"] があれば添付はローカルの保存先（attachment_root 基準の相対パス）にリンクする。
+    """
+    author = html.escape(f"{rec['author']} ({rec['author_id']})")
+    lines = ["<div style='margin-bottom:12px;padding:8px;border:1px solid #ddd;'>"]
+    lines.append(f"<div style='color:#666;font-size:12px;'>[{rec['ts']}] {author}</div>")
+    if rec["content"]:
+        text_html = "<br>".join(html.escape(part) for part in rec["content"].splitlines())
+        lines.append(f"<div style='margin-top:6px;'>{text_html}</div>")
+    files = rec.get("files") or ()
+    for i, a in enumerate(rec["attachments"]):
+        url = html.escape(a)
+        key = files[i] if i < len(files) else None
+        if key:
+            local = html.escape(f"{attachment_root}/{key}")
+            lines.append(
+                f"<div>Attachment: <a href='{local}' target='_blank'>{local}</a>"
+                f" (<a href='{url}' target='_blank'>original</a>)</div>"
+            )
+        else:
+            lines.append(f"<div>Attachment: <a href='{url}' target='_blank'>{url}</a></div>")
+    if rec["embeds"]:
+        lines.append("<div>Embed present</div>")
+    lines.append("</div>")
+    return "\n".join(lines) + "\n"
+
+
+def render_message(m) -> str:
+    return render_record(message_record(m))
+
+
+def _render_from_log(message_log, channel_id, channel_name, path):
+    # スレッド内で実行: ログを 1 行ずつ読んでそのまま書く
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(render_header(channel_name))
+        for rec in message_log.iter_messages(channel_id):
+            f.write(render_record(rec))
+        f.write(render_footer())
+
+
+async def export_html(channel, message_log=None, path=None, executor=None) -> str:
+    """履歴を 1 件ずつ描画しながらファイルへ逐次書き込む（全件をメモリに持たない）
+
+    message_log があればローカルログから描画し、足りない分だけ履歴 API で補う。
+    """
+    if path is None:
+        path = f"ticket_{channel.name}-{int(datetime.utcnow().timestamp())}.html"
+    path = pathlib.Path(path)
+
+    if message_log is not None:
+        await message_log.backfill(channel)
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(executor, _render_from_log, message_log, channel.id, channel.name, path)
+        return str(path.resolve())
+
+    f = await asyncio.to_thread(open, path, "w", encoding="utf-8")
+    try:
+        buf = [render_header(channel.name)]
+        async for m in channel.history(limit=None, oldest_first=True):
+            buf.append(render_message(m))
+            if len(buf) >= FLUSH_EVERY:
+                chunk = "".join(buf)
+                buf.clear()
+                await asyncio.to_thread(f.write, chunk)
+        buf.append(render_footer())
+        await asyncio.to_thread(f.write, "".join(buf))
+    finally:
+        await asyncio.to_thread(f.close)
+    return str(path.resolve())
+
+
+# -------------------------
+# 正本（JSONL + gzip）と分割 HTML
+# -------------------------
+ARCHIVE_DIR = "transcripts"
+DEFAULT_PART_LIMIT = 8 * 1024 * 1024
+
+
+def archive_path(number, channel_id) -> str:
+    return os.path.join(ARCHIVE_DIR, f"ticket-{number}-{channel_id}.jsonl.gz")
+
+
+def _archive_guild(path):
+    # 先頭の meta 行だけ読む（ギルド ID の無い旧形式は None）
+    try:
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            return json.loads(f.readline()).get("guild_id")
+    except Exception:
+        return None
+
+
+def find_archives(number, guild_id=None):
+    """チケット番号に対応する正本ファイル（新しい順）
+
+    番号はギルドごとなので guild_id で絞る（ギルド ID の無い旧形式の正本は含める）。
+    """
+    paths = glob.glob(os.path.join(ARCHIVE_DIR, f"ticket-{int(number)}-*.jsonl.gz"))
+    if guild_id is not None:
+        paths = [p for p in paths if _archive_guild(p) in (None, guild_id)]
+    return sorted(paths, key=os.path.getmtime, reverse=True)
+
+
+def iter_transcript(path):
+    """正本を 1 行ずつ読む（先頭は type=meta）"""
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        for line in f:
+            yield json.loads(line)
+
+
+def _write_jsonl(message_log, channel_id, meta, path, files=None):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + ".tmp"
+    with gzip.open(tmp, "wt", encoding="utf-8") as f:
+        f.write(json.dumps(meta, ensure_ascii=False) + "\n")
+        for rec in message_log.iter_messages(channel_id):
+            rec.pop("op", None)
+            if files and rec["attachments"]:
+                # 添付ごとの保存先キー（取れなかったものは null）
+                rec["files"] = [files.get(u) for u in rec["attachments"]]
+            f.write(json.dumps(rec, ensure_ascii=False, separators=(",", ":")) + "\n")
+    os.replace(tmp, path)
+    return path
+
+
+async def export_transcript(channel, message_log, ticket, executor=None, mirror=None) -> str:
+    """ライブログを正本（transcripts/ticket-<番号>-<channel_id>.jsonl.gz）に書き出す
+
+    mirror（AttachmentMirror）を渡すと、先に添付を並行ダウンロードしてローカルの保存先を記録する。
+    """
+    await message_log.backfill(channel)
+    loop = asyncio.get_running_loop()
+    files = None
+    if mirror is not None:
+        urls = await loop.run_in_executor(executor, collect_urls, message_log, channel.id)
+        files = await mirror.mirror(urls) if urls else None
+    meta = {
+        "type": "meta",
+        "channel_id": channel.id,
+        "channel_name": channel.name,
+        "guild_id": channel.guild.id,
+        "number": ticket.get("number"),
+        "owner_id": ticket.get("owner_id"),
+        "exported_at": datetime.utcnow().isoformat(),
+    }
+    if mirror is not None:
+        meta["attachment_root"] = mirror.store.root
+    path = archive_path(ticket.get("number"), channel.id)
+    return await loop.run_in_executor(executor, _write_jsonl, message_log, channel.id, meta, path, files)
+
+
+def _render_parts(src, out_base, limit):
+    # gzip 内部の未出力分は pending（非圧縮サイズ = 圧縮後の上限）で見積もり、
+    # 一定量ごとに sync flush して tell() で実サイズに戻す
+    flush_every = max(64 * 1024, limit // 8)
+    margin = 4096  # フッター + gzip トレーラ分
+    paths = []
+    raw = gz = None
+    pending = 0
+    count = 0  # 現在のパートに入っているメッセージ数
+    channel_name = ""
+    attachment_root = ATTACHMENT_DIR
+
+    def open_part():
+        p = f"{out_base}-part{len(paths) + 1}.html.gz"
+        paths.append(p)
+        r = open(p, "wb")
+        g = gzip.GzipFile(fileobj=r, mode="wb", mtime=0)
+        g.write(render_header(channel_name).encode("utf-8"))
+        return r, g
+
+    def close_part():
+        gz.write(render_footer().encode("utf-8"))
+        gz.close()
+        raw.close()
+
+    for rec in iter_transcript(src):
+        if rec.get("type") == "meta":
+            channel_name = rec.get("channel_name", "")
+            attachment_root = rec.get("attachment_root") or ATTACHMENT_DIR
+            continue
+        if gz is None:
+            raw, gz = open_part()
+        block = render_record(rec, attachment_root).encode("utf-8")
+        if count and raw.tell() + pending + len(block) + margin > limit:
+            close_part()
+            raw, gz = open_part()
+            pending = 0
+            count = 0
+        gz.write(block)
+        count += 1
+        pending += len(block)
+        if pending >= flush_every:
+            gz.flush()
+            pending = 0
+    if gz is None:
+        raw, gz = open_part()
+    close_part()
+
+    if len(paths) == 1:
+        single = f"{out_base}.html.gz"
+        os.replace(paths[0], single)
+        paths = [single]
+    return paths
+
+
+async def render_html_parts(src, limit=DEFAULT_PART_LIMIT, executor=None):
+    """正本から HTML を作り、gzip 圧縮 + limit バイト未満に分割したファイル一覧を返す"""
+    name = os.path.basename(src)[: -len(".jsonl.gz")]
+    out_base = os.path.join(tempfile.gettempdir(), f"{name}-{int(datetime.utcnow().timestamp())}")
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, _render_parts, src, out_base, limit)
@@ -0,0 +1,161 @@
+# utils/verify_queue.py
+import asyncio
+import time
+import traceback
+from collections import deque
+
+from utils.log_sink import TokenBucket, get_log_sink
+
+
+class VerifyRequest:
+    __slots__ = ("interaction", "role_id", "log_channel_id", "queued_at")
+
+    def __init__(self, interaction, role_id, log_channel_id):
+        self.interaction = interaction
+        self.role_id = role_id
+        self.log_channel_id = log_channel_id
+        self.queued_at = time.monotonic()
+
+
+class VerifyQueue:
+    """認証ボタンの集中アクセス用キュー
+
+    押された時点ですぐ応答し、ロール付与はギルドごとのワーカーがレート（rate 回 / per 秒）を
+    守りながら順番に行う。同じ人の連打は 1 件にまとめ、認証ログはまとめて送る。
+    """
+
+    def __init__(self, rate=10, per=10.0, max_pending=5000):
+        self.rate = rate
+        self.per = per
+        self.max_pending = max_pending
+        self._queues = {}   # guild_id -> deque[VerifyRequest]
+        self._wakeups = {}  # guild_id -> asyncio.Event
+        self._tasks = {}    # guild_id -> Task
+        self._buckets = {}  # guild_id -> TokenBucket
+        self._pending = set()  # (guild_id, user_id)
+        self.granted = 0
+        self.skipped = 0    # 付与済みだった
+        self.failed = 0
+        self.deduped = 0
+        self.latency_total = 0.0
+        self._recent = deque()  # 直近 60 秒の完了時刻（スループット計算用）
+
+    @property
+    def backlog(self):
+        return len(self._pending)
+
+    def submit(self, interaction, role_id, log_channel_id=None):
+        """"queued" / "duplicate" / "full" を返す"""
+        guild = interaction.guild
+        key = (guild.id, interaction.user.id)
+        if key in self._pending:
+            self.deduped += 1
+            return "duplicate"
+        if len(self._pending) >= self.max_pending:
+            return "full"
+        q = self._queues.get(guild.id)
+        if q is None:
+            q = self._queues[guild.id] = deque()
+            self._wakeups[guild.id] = asyncio.Event()
+            self._buckets[guild.id] = TokenBucket(self.rate, self.per)
+        q.append(VerifyRequest(interaction, role_id, log_channel_id))
+        self._pending.add(key)
+        task = self._tasks.get(guild.id)
+        if task is None or task.done():
+            self._tasks[guild.id] = asyncio.get_running_loop().create_task(self._drain(guild.id))
+        self._wakeups[guild.id].set()
+        return "queued"
+
+    async def _drain(self, guild_id):
+        q = self._queues[guild_id]
+        wakeup = self._wakeups[guild_id]
+        bucket = self._buckets[guild_id]
+        while True:
+            await wakeup.wait()
+            wakeup.clear()
+            while q:
+                req = q.popleft()
+                try:
+                    await self._process(req, bucket)
+                finally:
+                    self._pending.discard((guild_id, req.interaction.user.id))
+
+    async def _process(self, req, bucket):
+        interaction = req.interaction
+        guild = interaction.guild
+        member = interaction.user
+        role = guild.get_role(req.role_id)
+        if role is None:
+            self.failed += 1
+            await self._reply(interaction, "認証ロールが見つかりません。管理者に連絡してください。")
+            return
+        if role in member.roles:
+            self.skipped += 1
+            await self._reply(interaction, "すでに認証済みです！")
+            return
+        await bucket.acquire()
+        try:
+            await member.add_roles(role, reason="verify")
+        except Exception:
+            traceback.print_exc()
+            self.failed += 1
+            await self._reply(interaction, "認証中にエラーが発生しました。")
+            return
+        now = time.monotonic()
+        self.granted += 1
+        self.latency_total += now - req.queued_at
+        self._recent.append(now)
+        await self._reply(interaction, "🎉 認証成功しました！")
+
+        # 認証ログは 1 行ずつ LogSink に積む（まとめて 1 メッセージで送られる）
+        if req.log_channel_id:
+            channel = guild.get_channel(req.log_channel_id)
+            if channel:
+                get_log_sink().submit(channel, content=f"✅ {member.mention} が認証しました。")
+
+    @staticmethod
+    async def _reply(interaction, text):
+        # 受付の応答が終わる前に followup は送れないので少しだけ待つ
+        for _ in range(30):
+            if interaction.response.is_done():
+                break
+            await asyncio.sleep(0.1)
+        try:
+            await interaction.followup.send(text, ephemeral=True)
+        except Exception:
+            pass  # 期限切れなどは無視
+
+    async def close(self):
+        for task in self._tasks.values():
+            task.cancel()
+        for task in self._tasks.values():
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._tasks.clear()
+
+    def stats(self):
+        now = time.monotonic()
+        while self._recent and now - self._recent[0] > 60:
+            self._recent.popleft()
+        return {
+            "backlog": self.backlog,
+            "granted": self.granted,
+            "skipped": self.skipped,
+            "failed": self.failed,
+            "deduped": self.deduped,
+            "per_minute": len(self._recent),
+            "avg_latency": self.latency_total / self.granted if self.granted else 0.0,
+        }
+
+
+_queue = None
+
+
+def get_verify_queue() -> VerifyQueue:
+    """プロセス共通の認証キュー（VerifyCog / TicketCog の両方のボタンから使う）"""
+    global _queue
+    if _queue is None:
+        _queue = VerifyQueue()
+    return _queue